@@ -0,0 +1,270 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from anomaly_detection.run_length import run_events
+from anomaly_detection.scoring import decision_scores
+from db import ENERGY_STORAGE_MODE, get_energy_bucket_collection, get_energy_collection
+from energy_buckets import bucket_match, unwind_stages
+from model_registry import load_model
+from rollups import load_energy_profiles
+
+# Alert rules evaluated by run_rules. Each rule names an evaluator ('kind')
+# and its parameters; 'severity' maps the rule's metric to a level, checked
+# in order (metric > cutoff), with None as the catch-all. 'message' is
+# formatted with the columns of each candidate row.
+ALERT_RULES = [
+    {
+        "type": "consecutive_anomalies",
+        "kind": "consecutive_anomalies",
+        "window_hours": 24,
+        "threshold": 2,                 # Minimum run of Isolation Forest anomalies
+        "severity": [("high", 2), ("medium", None)],
+        "message": "{count} successive anomalies detected on sensor {sensor_id} at {detected_at}",
+        "notification": "consecutive_anomalies",
+        "subject": "EMADS Alert: consecutive anomalies",
+    },
+    {
+        "type": "energy_spike",
+        "kind": "pct_change",
+        "window_hours": 24,
+        "threshold": 50,                # Percent increase over the previous reading
+        "severity": [("high", 100), ("medium", None)],
+        "message": "Energy spike detected: {pct_change:.1f}% increase on sensor {sensor_id}",
+        "notification": "energy_spike",
+        "subject": "EMADS Alert: Energy Spike Detected",
+    },
+    {
+        "type": "unusual_pattern",
+        "kind": "hourly_deviation",
+        "window_hours": 24,
+        "threshold": 2.0,               # Standard deviations from the hour-of-week baseline
+        "min_readings": 24,
+        "severity": [("medium", None)],
+        "message": ("Unusual energy pattern detected at hour {hour}: {value:.1f} Wh "
+                    "(expected {expected_mean:.1f} ± {band:.1f} Wh)"),
+        "notification": "unusual_pattern",
+        "subject": "EMADS Alert: Unusual Energy Pattern Detected",
+    },
+]
+
+# Projection of the shared window fetch
+WINDOW_PROJECTION = {"_id": 0, "sensor_id": 1, "timestamp": 1, "energy_wh": 1}
+
+def fetch_rule_window(hours, now=None, with_ids=False):
+    """
+    Readings of every sensor from the last `hours` hours, in one query.
+
+    Args:
+        hours (float): Length of the window
+        now (datetime): End of the window
+        with_ids (bool): Also return each reading's '_id' (flat storage only;
+            bucketed readings get None)
+
+    Returns:
+        pd.DataFrame: 'sensor_id', 'timestamp' and 'energy_wh' (plus '_id'),
+        sorted by sensor and timestamp
+    """
+    now = now or datetime.now()
+    columns = ["sensor_id", "timestamp", "energy_wh"] + (["_id"] if with_ids else [])
+    query = {"timestamp": {"$gte": now - timedelta(hours=hours)}}
+    if ENERGY_STORAGE_MODE == "bucketed":
+        docs = get_energy_bucket_collection().aggregate([
+            {"$match": bucket_match(query)},
+            *unwind_stages(),
+            {"$match": query},
+            {"$project": WINDOW_PROJECTION},
+        ])
+    else:
+        projection = {**WINDOW_PROJECTION, "_id": 1} if with_ids else WINDOW_PROJECTION
+        docs = get_energy_collection().find(query, projection)
+    window = pd.DataFrame(list(docs), columns=columns)
+    # Readings without a sensor_id form their own sensor, keyed None
+    window["sensor_id"] = window["sensor_id"].astype(object).where(window["sensor_id"].notna(), None)
+    window["timestamp"] = pd.to_datetime(window["timestamp"])
+    window["energy_wh"] = window["energy_wh"].astype("float64")
+    return window.sort_values(["sensor_id", "timestamp"], kind="mergesort").reset_index(drop=True)
+
+def _consecutive_anomalies(window, rule):
+    """Runs of at least `threshold` anomalous readings per sensor, one row per run"""
+    batches = []
+    for _, readings in window.groupby("sensor_id", sort=False, dropna=False):
+        events = run_events(readings["anomaly_score"].to_numpy() < 0, readings["timestamp"].to_numpy(),
+                            min_length=rule["threshold"])
+        if events.empty:
+            continue
+        batches.append(pd.DataFrame({
+            "sensor_id": readings["sensor_id"].to_numpy()[events["end_index"].to_numpy()],
+            "started_at": events["start_time"].to_numpy(),
+            "detected_at": events["end_time"].to_numpy(),
+            "value": readings["energy_wh"].to_numpy()[events["end_index"].to_numpy()],
+            "count": events["length"].to_numpy(),
+        }))
+    if not batches:
+        return pd.DataFrame(columns=["sensor_id", "started_at", "detected_at", "value", "count", "metric"])
+    runs = pd.concat(batches, ignore_index=True)
+    runs["metric"] = runs["count"]
+    return runs
+
+def _pct_change(window, rule):
+    """Readings whose increase over the sensor's previous reading exceeds `threshold` percent"""
+    pct_change = window.groupby("sensor_id", sort=False, dropna=False)["energy_wh"].pct_change().to_numpy() * 100
+    hits = pct_change > rule["threshold"]
+    return pd.DataFrame({
+        "sensor_id": window["sensor_id"].to_numpy()[hits],
+        "detected_at": window["timestamp"].to_numpy()[hits],
+        "value": window["energy_wh"].to_numpy()[hits],
+        "pct_change": pct_change[hits],
+        "metric": pct_change[hits],
+    })
+
+def _hourly_deviation(window, rule):
+    """
+    Readings more than `threshold` std away from their expected level.
+
+    The expected level is the sensor's persisted hour-of-week baseline
+    ('baseline_mean' and 'baseline_std', attached by run_rules). Sensors or
+    hours without a baseline fall back to the sensor's hour-of-day mean and
+    std within the window, computed with one grouped transform.
+    """
+    hour = window["timestamp"].dt.hour
+    mean = np.full(len(window), np.nan)
+    std = np.full(len(window), np.nan)
+    if "baseline_mean" in window.columns:
+        mean = window["baseline_mean"].to_numpy(dtype="float64").copy()
+        std = window["baseline_std"].to_numpy(dtype="float64").copy()
+    missing = np.isnan(mean) | np.isnan(std)
+    if missing.any():
+        counts = window.groupby("sensor_id", sort=False, dropna=False)["energy_wh"].transform("size").to_numpy()
+        grouped = window.groupby([window["sensor_id"], hour], sort=False, dropna=False)["energy_wh"]
+        enough = counts >= rule.get("min_readings", 0)
+        fallback = missing & enough
+        mean[fallback] = grouped.transform("mean").to_numpy()[fallback]
+        std[fallback] = grouped.transform("std").to_numpy()[fallback]
+
+    deviation = np.abs(window["energy_wh"].to_numpy() - mean)
+    with np.errstate(invalid="ignore"):
+        hits = deviation > rule["threshold"] * std
+    return pd.DataFrame({
+        "sensor_id": window["sensor_id"].to_numpy()[hits],
+        "detected_at": window["timestamp"].to_numpy()[hits],
+        "hour": hour.to_numpy()[hits],
+        "value": window["energy_wh"].to_numpy()[hits],
+        "expected_mean": mean[hits],
+        "band": rule["threshold"] * std[hits],
+        "metric": deviation[hits] / std[hits],
+    })
+
+# Evaluator for each rule 'kind'. An evaluator takes the shared window and
+# the rule and returns one row per candidate alert, with at least
+# 'sensor_id', 'detected_at', 'value' and 'metric'.
+EVALUATORS = {
+    "consecutive_anomalies": _consecutive_anomalies,
+    "pct_change": _pct_change,
+    "hourly_deviation": _hourly_deviation,
+}
+
+def _severity(metric, mapping):
+    conditions, levels, default = [], [], None
+    for level, cutoff in mapping:
+        if cutoff is None:
+            default = level
+            break
+        conditions.append(metric > cutoff)
+        levels.append(level)
+    if not conditions:
+        return np.full(len(metric), default, dtype=object)
+    return np.select(conditions, levels, default=default)
+
+def evaluate_rules(window, rules=ALERT_RULES, now=None):
+    """
+    Evaluate every rule over one window of readings.
+
+    Each rule only sees the rows inside its own window_hours, so rules with
+    shorter windows share the fetch of the longest one.
+
+    Args:
+        window (pd.DataFrame): Output of fetch_rule_window, plus 'anomaly_score'
+            when a consecutive_anomalies rule is present
+        rules (list): Rule definitions, see ALERT_RULES
+        now (datetime): End of the window
+
+    Returns:
+        pd.DataFrame: One row per candidate alert with 'type', 'sensor_id',
+        'detected_at', 'value', 'severity', 'message' and the rule's own columns
+    """
+    now = now or datetime.now()
+    batches = []
+    for rule in rules:
+        rule_window = window[window["timestamp"] >= now - timedelta(hours=rule["window_hours"])]
+        if rule_window.empty:
+            continue
+        candidates = EVALUATORS[rule["kind"]](rule_window, rule)
+        if candidates.empty:
+            continue
+        candidates.insert(0, "type", rule["type"])
+        candidates["severity"] = _severity(candidates["metric"].to_numpy(), rule["severity"])
+        candidates["message"] = [rule["message"].format(**row)
+                                 for row in candidates.to_dict("records")]
+        batches.append(candidates)
+    if not batches:
+        return pd.DataFrame(columns=["type", "sensor_id", "detected_at", "value", "metric",
+                                     "severity", "message"])
+    return pd.concat(batches, ignore_index=True)
+
+def attach_baselines(window, profiles):
+    """
+    Attach each sensor's hour-of-week baselines to a rule window.
+
+    Args:
+        window (pd.DataFrame): Output of fetch_rule_window
+        profiles (dict): sensor_id -> (mean, std) arrays indexed by hour of
+            week, as returned by rollups.load_energy_profiles; readings of
+            sensors without a profile get NaN
+
+    Returns:
+        pd.DataFrame: A copy of window with 'baseline_mean' and 'baseline_std'
+    """
+    hour_of_week = (window["timestamp"].dt.dayofweek * 24 + window["timestamp"].dt.hour).to_numpy()
+    sensors = window["sensor_id"].to_numpy()
+    baseline_mean = np.full(len(window), np.nan)
+    baseline_std = np.full(len(window), np.nan)
+    for sensor_id, (mean, std) in profiles.items():
+        rows = sensors == sensor_id
+        baseline_mean[rows] = np.asarray(mean, dtype="float64")[hour_of_week[rows]]
+        baseline_std[rows] = np.asarray(std, dtype="float64")[hour_of_week[rows]]
+    window = window.copy()
+    window["baseline_mean"] = baseline_mean
+    window["baseline_std"] = baseline_std
+    return window
+
+def score_window(window, model):
+    """Attach Isolation Forest decision scores to a rule window"""
+    window = window.copy()
+    window["anomaly_score"] = decision_scores(model, window["energy_wh"].to_numpy())
+    return window
+
+def run_rules(rules=ALERT_RULES, model=None, now=None):
+    """
+    Fetch the longest window any rule needs once and evaluate all rules on it.
+
+    The window is scored with the Isolation Forest and joined to the
+    persisted hour-of-week baselines only when a rule needs them.
+
+    Args:
+        rules (list): Rule definitions, see ALERT_RULES
+        model: Isolation Forest for rules that need anomaly scores; the
+            registry's current model when None
+        now (datetime): End of the window
+
+    Returns:
+        pd.DataFrame: Candidate alerts, see evaluate_rules
+    """
+    now = now or datetime.now()
+    window = fetch_rule_window(max(rule["window_hours"] for rule in rules), now)
+    if any(rule["kind"] == "consecutive_anomalies" for rule in rules) and not window.empty:
+        window = score_window(window, model if model is not None else load_model("isolation_forest"))
+    if any(rule["kind"] == "hourly_deviation" for rule in rules) and not window.empty:
+        window = attach_baselines(window, load_energy_profiles())
+    return evaluate_rules(window, rules, now)
@@ -0,0 +1,323 @@
+import argparse
+import bisect
+import signal
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from pymongo.errors import OperationFailure
+
+from alert_rules import ALERT_RULES, attach_baselines, evaluate_rules, fetch_rule_window, score_window
+from alerts import store_rule_alerts
+from anomaly_detection.scoring import decision_scores
+from db import (
+    ENERGY_STORAGE_MODE,
+    get_detector_state_collection,
+    get_energy_collection,
+    get_energy_collection_type,
+)
+from model_registry import load_model
+from rollups import load_energy_profiles
+
+# Only inserted readings matter; the projection keeps events small. The
+# reading's _id identifies replayed events.
+CHANGE_PIPELINE = [
+    {"$match": {"operationType": "insert"}},
+    {"$project": {
+        "fullDocument._id": 1,
+        "fullDocument.sensor_id": 1,
+        "fullDocument.timestamp": 1,
+        "fullDocument.energy_wh": 1,
+    }},
+]
+
+# Server errors meaning the checkpointed resume token can no longer be used
+# (ChangeStreamHistoryLost, ChangeStreamFatalError, InvalidResumeToken)
+RESUME_TOKEN_LOST = {286, 280, 260}
+
+class SensorWindow:
+    """
+    Readings of one sensor within the longest rule window, in timestamp order.
+
+    Each reading is held under a key (its _id) so a reading is held once.
+    Keys of readings delivered by the change stream are remembered as well,
+    so a replayed event is told apart from the first delivery of a reading
+    that was only loaded by warm_up.
+    """
+
+    def __init__(self):
+        self.timestamps = []
+        self.energy = []
+        self.scores = []
+        self.keys = []
+        self.held = set()
+        self.streamed = set()
+
+    @property
+    def last_timestamp(self):
+        return self.timestamps[-1] if self.timestamps else None
+
+    def add(self, key, timestamp, energy_wh, score=np.nan, streamed=True):
+        """
+        Insert a reading at its place in timestamp order.
+
+        Returns:
+            bool: False when the stream already delivered this reading
+        """
+        if key in self.streamed:
+            return False
+        if streamed:
+            self.streamed.add(key)
+        if key not in self.held:
+            at = bisect.bisect_right(self.timestamps, timestamp)
+            self.timestamps.insert(at, timestamp)
+            self.energy.insert(at, energy_wh)
+            self.scores.insert(at, score)
+            self.keys.insert(at, key)
+            self.held.add(key)
+        return True
+
+    def trim(self, since):
+        """Drop readings older than since"""
+        cut = bisect.bisect_left(self.timestamps, since)
+        for key in self.keys[:cut]:
+            self.held.discard(key)
+            self.streamed.discard(key)
+        del self.timestamps[:cut], self.energy[:cut], self.scores[:cut], self.keys[:cut]
+
+    def __len__(self):
+        return len(self.timestamps)
+
+def _reading_key(reading_id, timestamp, energy_wh):
+    """A reading's _id, or its timestamp and value for readings without one"""
+    return (timestamp, energy_wh) if pd.isna(reading_id) else reading_id
+
+class AlertWorker:
+    """
+    Evaluates the alert rules on readings as they are inserted.
+
+    The worker follows a change stream on energy_data and keeps, per sensor,
+    the readings of the longest rule window in memory together with their
+    Isolation Forest scores, so each reading is fetched and scored once. A
+    batch of new readings is evaluated on the windows of the sensors it
+    touches, each window ending at that sensor's newest reading, and only
+    alerts at or after a sensor's earliest new reading are stored.
+
+    After each batch the change stream's resume token is checkpointed in
+    detector_state. A restarted worker rebuilds its windows from MongoDB up
+    to the last processed reading and resumes the stream from the token, so
+    readings inserted while it was down are still evaluated, including late
+    ones older than a sensor's newest reading. Events are deduplicated on
+    the reading's _id, so a replayed event is skipped, and alerts are
+    deduplicated on insert (see alerts.upsert_alerts).
+    """
+
+    def __init__(self, rules=ALERT_RULES, name="alert_worker", max_batch=500, max_await_ms=1000):
+        self.rules = rules
+        self.name = name
+        self.max_batch = max_batch
+        self.max_await_ms = max_await_ms
+        self.window = timedelta(hours=max(rule["window_hours"] for rule in rules))
+        self.needs_scores = any(rule["kind"] == "consecutive_anomalies" for rule in rules)
+        self.needs_baselines = any(rule["kind"] == "hourly_deviation" for rule in rules)
+        self.sensors = {}
+        self.watermark = None       # Newest reading evaluated
+        self.processed = 0
+
+    def warm_up(self, until=None):
+        """
+        Fill the sensor windows from MongoDB with one query.
+
+        Readings loaded here are context only: if the stream delivers one of
+        them afterwards (e.g. a late reading inserted while the worker was
+        down) it is still evaluated as new.
+
+        Args:
+            until (datetime): Newest reading to load; readings after it are
+                left for the change stream to deliver. Defaults to now.
+        """
+        until = until or datetime.now()
+        window = fetch_rule_window(self.window / timedelta(hours=1), until, with_ids=True)
+        window = window[window["timestamp"] <= until]
+        if self.needs_scores and not window.empty:
+            window = score_window(window, load_model("isolation_forest"))
+        self.sensors = {}
+        for sensor_id, readings in window.groupby("sensor_id", sort=False, dropna=False):
+            state = self.sensors.setdefault(sensor_id, SensorWindow())
+            scores = readings["anomaly_score"] if self.needs_scores else np.full(len(readings), np.nan)
+            for reading_id, timestamp, energy_wh, score in zip(
+                    readings["_id"], readings["timestamp"], readings["energy_wh"], scores):
+                state.add(_reading_key(reading_id, timestamp, energy_wh), timestamp, energy_wh,
+                          score, streamed=False)
+        if not window.empty:
+            self.watermark = window["timestamp"].max().to_pydatetime()
+
+    def add_readings(self, readings):
+        """
+        Add readings delivered by the change stream to their sensor windows.
+
+        Readings are scored in one call. A reading the stream delivered
+        before is a replay and is skipped; a late reading is inserted at its
+        place in the window.
+
+        Args:
+            readings (list): Dicts with '_id', 'timestamp', 'energy_wh' and
+                optional 'sensor_id'
+
+        Returns:
+            dict: For each sensor that received readings, the timestamp of its
+            earliest new reading
+        """
+        new = pd.DataFrame(readings, columns=["_id", "sensor_id", "timestamp", "energy_wh"])
+        if new.empty:
+            return {}
+        new["timestamp"] = pd.to_datetime(new["timestamp"])
+        new["energy_wh"] = new["energy_wh"].astype("float64")
+        new = new.sort_values("timestamp", kind="mergesort")
+        scores = np.full(len(new), np.nan)
+        if self.needs_scores:
+            scores = decision_scores(load_model("isolation_forest"), new["energy_wh"].to_numpy())
+
+        first_new = {}
+        for reading_id, sensor_id, timestamp, energy_wh, score in zip(
+                new["_id"], new["sensor_id"], new["timestamp"], new["energy_wh"], scores):
+            state = self.sensors.setdefault(sensor_id, SensorWindow())
+            if not state.add(_reading_key(reading_id, timestamp, energy_wh), timestamp, energy_wh, score):
+                continue
+            first_new.setdefault(sensor_id, timestamp)
+            self.processed += 1
+        return first_new
+
+    def evaluate(self, first_new):
+        """
+        Evaluate the rules on the windows of the sensors with new readings.
+
+        Each sensor's rule windows end at that sensor's newest reading rather
+        than the wall clock, so a backlog replayed after downtime is judged
+        as it would have been live and a sensor lagging behind the others is
+        not cut out of its own window.
+
+        Args:
+            first_new (dict): Output of add_readings, not empty
+
+        Returns:
+            pd.DataFrame: Candidate alerts detected at or after a sensor's
+            earliest new reading, see alert_rules.evaluate_rules
+        """
+        profiles = load_energy_profiles() if self.needs_baselines else None
+        batches = []
+        candidates = None
+        for sensor_id, first_at in first_new.items():
+            state = self.sensors[sensor_id]
+            end = state.last_timestamp
+            state.trim(end - self.window)
+            window = pd.DataFrame({
+                "sensor_id": pd.Series([sensor_id] * len(state), dtype=object),
+                "timestamp": pd.to_datetime(state.timestamps),
+                "energy_wh": np.asarray(state.energy, dtype="float64"),
+                "anomaly_score": np.asarray(state.scores, dtype="float64"),
+            })
+            if profiles is not None:
+                window = attach_baselines(window, profiles)
+            candidates = evaluate_rules(window, self.rules, end)
+            candidates = candidates[pd.to_datetime(candidates["detected_at"]) >= first_at]
+            if not candidates.empty:
+                batches.append(candidates)
+            if self.watermark is None or end > self.watermark:
+                self.watermark = end.to_pydatetime()
+        if not batches:
+            return candidates.reset_index(drop=True)
+        return pd.concat(batches, ignore_index=True)
+
+    def process(self, readings):
+        """
+        Evaluate a batch of new readings and store the alerts they raise.
+
+        Returns:
+            int: Number of alerts that were newly created
+        """
+        first_new = self.add_readings(readings)
+        if not first_new:
+            return 0
+        return store_rule_alerts(self.evaluate(first_new), self.rules)
+
+    def load_checkpoint(self):
+        """Resume token and watermark of the last checkpoint, or (None, None)"""
+        state = get_detector_state_collection().find_one({"_id": self.name})
+        if state is None:
+            return None, None
+        return state.get("resume_token"), state.get("watermark")
+
+    def save_checkpoint(self, resume_token):
+        """Checkpoint the change stream position and the newest evaluated reading"""
+        get_detector_state_collection().update_one(
+            {"_id": self.name},
+            {"$set": {
+                "resume_token": resume_token,
+                "watermark": self.watermark,
+                "updated_at": datetime.now(),
+            }},
+            upsert=True
+        )
+
+    def _open_stream(self, resume_token):
+        collection = get_energy_collection()
+        try:
+            return collection.watch(CHANGE_PIPELINE, resume_after=resume_token,
+                                    max_await_time_ms=self.max_await_ms), resume_token
+        except OperationFailure as e:
+            if resume_token is None or e.code not in RESUME_TOKEN_LOST:
+                raise
+            # The oplog no longer reaches the checkpoint; start from now
+            return collection.watch(CHANGE_PIPELINE, max_await_time_ms=self.max_await_ms), None
+
+    def run(self, stop=None):
+        """
+        Follow energy_data inserts until stop is set.
+
+        Requires a replica set (a single node is enough) and the flat
+        storage layout: MongoDB has no change streams on standalone
+        servers or on time-series collections.
+
+        Args:
+            stop (threading.Event): Set to end the loop after the current batch
+        """
+        if ENERGY_STORAGE_MODE != "flat" or get_energy_collection_type() == "timeseries":
+            raise ValueError("The alert worker needs energy_data as a regular collection "
+                             "with ENERGY_STORAGE_MODE=flat")
+        stop = stop or threading.Event()
+        resume_token, watermark = self.load_checkpoint()
+        # Open the stream before warming up so no insert falls in between
+        stream, resume_token = self._open_stream(resume_token)
+        self.warm_up(watermark if resume_token is not None else None)
+        saved_token = resume_token
+        with stream:
+            while not stop.is_set() and stream.alive:
+                readings = []
+                while len(readings) < self.max_batch:
+                    change = stream.try_next()
+                    if change is None:
+                        break
+                    readings.append(change["fullDocument"])
+                if readings:
+                    self.process(readings)
+                # The token also advances while idle; only write when it moved
+                if stream.resume_token is not None and stream.resume_token != saved_token:
+                    self.save_checkpoint(stream.resume_token)
+                    saved_token = stream.resume_token
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate alert rules on energy readings as they are inserted")
+    parser.add_argument("--max-batch", type=int, default=500)
+    parser.add_argument("--max-await-ms", type=int, default=1000)
+    args = parser.parse_args()
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    worker = AlertWorker(max_batch=args.max_batch, max_await_ms=args.max_await_ms)
+    try:
+        worker.run(stop)
+    except KeyboardInterrupt:
+        pass
+    print(f"Alert worker stopped after {worker.processed} readings, watermark {worker.watermark}")
@@ -1,513 +1,515 @@
-import pandas as pd
-from datetime import datetime, timedelta
-from db import get_db, get_user_collection, get_alerts_collection
-from anomaly_detection.anomaly_detector import AnomalyDetector
-from email_utils import send_email
-from dotenv import load_dotenv
-import numpy as np
-
-load_dotenv()
-import os
-
-def get_notification_recipients(alert_type):
-    """Get recipients based on their notification preferences"""
-    users = get_user_collection()
-    recipients = []
-    
-    for user in users.find({"role": {"$in": ["admin", "manager"]}}):
-        prefs = user.get("preferences", {})
-        notifications = prefs.get("notifications", {})
-        
-        # Check if user has enabled notifications for this alert type
-        if notifications.get("alerts", True):  # Default to True if not set
-            if alert_type == "consecutive_anomalies" and notifications.get("alerts", True):
-                recipients.append(user["email"])
-            elif alert_type == "energy_spike" and notifications.get("alerts", True):
-                recipients.append(user["email"])
-            elif alert_type == "unusual_pattern" and notifications.get("alerts", True):
-                recipients.append(user["email"])
-    
-    return recipients
-
-def check_consecutive_anomalies(threshold=2):
-    db = get_db()
-    readings = db[os.getenv("MONGO_ALERTS_COLLECTION")]
-    alerts = get_alerts_collection()
-    users = get_user_collection()
-
-    # 1) Pull last 'threshold' readings
-    docs = list(readings.find()
-                .sort("timestamp", -1)
-                .limit(threshold))
-    if len(docs) < threshold:
-        return
-
-    # 2) Convert to DataFrame and check for anomalies
-    df = pd.DataFrame(docs)
-    
-    # If no anomaly scores exist, run anomaly detection
-    if "anomaly_score" not in df.columns:
-        detector = AnomalyDetector()
-        try:
-            # Run anomaly detection
-            results = detector.detect_anomalies(df)
-            df = results
-            
-            # Update readings with anomaly scores
-            for _, row in df.iterrows():
-                readings.update_one(
-                    {"_id": row["_id"]},
-                    {"$set": {
-                        "anomaly_score": row["anomaly_score"],
-                        "is_anomaly": row["is_anomaly"]
-                    }}
-                )
-        except Exception as e:
-            print(f"Error running anomaly detection: {e}")
-            return
-    
-    # Consider a reading anomalous if its score is below -0.5 (typical threshold for isolation forest)
-    if "is_anomaly" not in df.columns:
-        df["is_anomaly"] = df["anomaly_score"] < -0.5
-    
-    if not df["is_anomaly"].all():
-        return  # no run of anomalies
-
-    sensor = df.loc[0, "sensor_id"]
-    last_ts = df.loc[0, "timestamp"]
-
-    # 3) Has an alert already been created for this run?
-    exists = alerts.find_one({
-        "sensor_id": sensor,
-        "type": "consecutive_anomalies",
-        "detected_at": {"$gte": last_ts - timedelta(minutes=5)}  # 5-minute window
-    })
-
-    if exists:
-        return  # already alerted for this event
-
-    # 4) Create alert document
-    alert_doc = {
-        "sensor_id": sensor,
-        "detected_at": last_ts,
-        "type": "consecutive_anomalies",
-        "count": threshold,
-        "notified": False,
-        "message": f"{threshold} successive anomalies detected on sensor {sensor} at {last_ts}",
-        "severity": "high" if threshold >= 3 else "medium"
-    }
-
-    alerts.insert_one(alert_doc)
-
-    # 5) Notify via email based on user preferences
-    recipients = get_notification_recipients("consecutive_anomalies")
-    if recipients:
-        subject = f"EMADS Alert: {threshold} consecutive anomalies"
-        body = alert_doc["message"]
-        send_email(recipients, subject, body)
-
-        # 6) Mark notified
-        alerts.update_one(
-            {"_id": alert_doc["_id"]},
-            {"$set": {"notified": True}}
-        )
-
-def check_energy_spike(threshold_percent=50):
-    """Check for sudden spikes in energy consumption"""
-    db = get_db()
-    readings = db[os.getenv("MONGO_ALERTS_COLLECTION")]
-    alerts = get_alerts_collection()
-    users = get_user_collection()
-
-    # Get last 24 hours of readings
-    last_24h = datetime.now() - timedelta(hours=24)
-    docs = list(readings.find({"timestamp": {"$gte": last_24h}})
-                .sort("timestamp", -1))
-    
-    if len(docs) < 2:
-        return
-
-    df = pd.DataFrame(docs)
-    df = df.sort_values("timestamp")
-    
-    # Calculate percentage change
-    df["pct_change"] = df["energy_wh"].pct_change() * 100
-    
-    # Check for spikes
-    spikes = df[df["pct_change"] > threshold_percent]
-    
-    for _, spike in spikes.iterrows():
-        # Check if alert already exists
-        exists = alerts.find_one({
-            "sensor_id": spike["sensor_id"],
-            "type": "energy_spike",
-            "detected_at": {"$gte": spike["timestamp"] - timedelta(minutes=5)}
-        })
-        
-        if exists:
-            continue
-            
-        # Create alert
-        alert_doc = {
-            "sensor_id": spike["sensor_id"],
-            "detected_at": spike["timestamp"],
-            "type": "energy_spike",
-            "value": spike["energy_wh"],
-            "pct_change": spike["pct_change"],
-            "notified": False,
-            "message": f"Energy spike detected: {spike['pct_change']:.1f}% increase on sensor {spike['sensor_id']}",
-            "severity": "high" if spike["pct_change"] > 100 else "medium"
-        }
-        
-        alerts.insert_one(alert_doc)
-        
-        # Notify based on user preferences
-        recipients = get_notification_recipients("energy_spike")
-        if recipients:
-            subject = f"EMADS Alert: Energy Spike Detected"
-            body = alert_doc["message"]
-            send_email(recipients, subject, body)
-            
-            # Mark notified
-            alerts.update_one(
-                {"_id": alert_doc["_id"]},
-                {"$set": {"notified": True}}
-            )
-
-def check_unusual_patterns(window_hours=24):
-    """Check for unusual patterns in energy consumption"""
-    db = get_db()
-    readings = db[os.getenv("MONGO_ALERTS_COLLECTION")]
-    alerts = get_alerts_collection()
-    users = get_user_collection()
-
-    # Get readings for the window
-    window_start = datetime.now() - timedelta(hours=window_hours)
-    docs = list(readings.find({"timestamp": {"$gte": window_start}})
-                .sort("timestamp", -1))
-    
-    if len(docs) < 24:  # Need at least 24 readings for meaningful analysis
-        return
-
-    df = pd.DataFrame(docs)
-    df = df.sort_values("timestamp")
-    
-    # Calculate hourly statistics
-    df["hour"] = df["timestamp"].dt.hour
-    hourly_stats = df.groupby("hour")["energy_wh"].agg(["mean", "std"]).reset_index()
-    
-    # Check for unusual patterns
-    for hour in range(24):
-        hour_data = df[df["hour"] == hour]
-        if len(hour_data) == 0:
-            continue
-            
-        mean = hourly_stats.loc[hour, "mean"]
-        std = hourly_stats.loc[hour, "std"]
-        
-        # Check if current readings are significantly different
-        unusual = hour_data[abs(hour_data["energy_wh"] - mean) > 2 * std]
-        
-        for _, reading in unusual.iterrows():
-            # Check if alert already exists
-            exists = alerts.find_one({
-                "sensor_id": reading["sensor_id"],
-                "type": "unusual_pattern",
-                "detected_at": {"$gte": reading["timestamp"] - timedelta(minutes=5)}
-            })
-            
-            if exists:
-                continue
-                
-            # Create alert
-            alert_doc = {
-                "sensor_id": reading["sensor_id"],
-                "detected_at": reading["timestamp"],
-                "type": "unusual_pattern",
-                "value": reading["energy_wh"],
-                "expected_mean": mean,
-                "notified": False,
-                "message": f"Unusual energy pattern detected at hour {hour}: {reading['energy_wh']:.1f} Wh (expected {mean:.1f} ± {2*std:.1f} Wh)",
-                "severity": "medium"
-            }
-            
-            alerts.insert_one(alert_doc)
-            
-            # Notify based on user preferences
-            recipients = get_notification_recipients("unusual_pattern")
-            if recipients:
-                subject = f"EMADS Alert: Unusual Energy Pattern Detected"
-                body = alert_doc["message"]
-                send_email(recipients, subject, body)
-                
-                # Mark notified
-                alerts.update_one(
-                    {"_id": alert_doc["_id"]},
-                    {"$set": {"notified": True}}
-                )
-
-def create_alert(timestamp, energy_value, anomaly_score, severity, message):
-    """
-    Create an alert in the database and notify users.
-    
-    Args:
-        timestamp (datetime): When the anomaly was detected
-        energy_value (float): The energy value that triggered the alert
-        anomaly_score (float): The anomaly score from the model
-        severity (str): Alert severity ('high', 'medium', 'low')
-        message (str): Description of the alert
-    """
-    alerts_collection = get_alerts_collection()
-    communications_collection = get_db()["communications"]
-    
-    # Create alert document
-    alert = {
-        "timestamp": timestamp,
-        "energy_wh": energy_value,
-        "anomaly_score": anomaly_score,
-        "severity": severity,
-        "message": message,
-        "type": "anomaly_isolation_forest",
-        "resolved": False,
-        "created_at": datetime.now()
-    }
-    
-    # Insert alert
-    result = alerts_collection.insert_one(alert)
-    
-    # Get admin and manager users
-    users = get_user_collection()
-    recipients = []
-    for user in users.find({"role": {"$in": ["admin", "manager"]}}):
-        recipients.append(user["email"])
-        
-        # Add message to user's communication inbox
-        communication = {
-            "user_id": user["_id"],
-            "type": "alert",
-            "title": f"Anomaly Alert: {severity.capitalize()} Severity",
-            "message": message,
-            "timestamp": datetime.now(),
-            "read": False,
-            "alert_id": result.inserted_id
-        }
-        communications_collection.insert_one(communication)
-    
-    # Send email notifications
-    if recipients:
-        subject = f"EMADS Alert: {severity.capitalize()} Severity Anomaly Detected"
-        body = f"""
-        Anomaly Alert Details:
-        ---------------------
-        Severity: {severity.capitalize()}
-        Time: {timestamp}
-        Energy Value: {energy_value:.2f} Wh
-        Anomaly Score: {anomaly_score:.3f}
-        
-        Message: {message}
-        
-        Please check the EMADS system for more details.
-        """
-        
-        try:
-            send_email(recipients, subject, body)
-        except Exception as e:
-            print(f"Error sending email notification: {str(e)}")
-
-def determine_severity(anomaly_score):
-    """
-    Determine alert severity based on anomaly score.
-    
-    Args:
-        anomaly_score (float): The anomaly score from the model
-        
-    Returns:
-        str: Severity level ('high', 'medium', 'low')
-    """
-    # Use the same thresholds as the anomalies page
-    high_threshold = -0.35    # Top 0.5% most anomalous
-    medium_threshold = -0.25  # Top 1% most anomalous
-    low_threshold = -0.20     # Top 2% most anomalous
-    
-    if anomaly_score <= high_threshold:
-        return "high"
-    elif anomaly_score <= medium_threshold:
-        return "medium"
-    elif anomaly_score <= low_threshold:
-        return "low"
-    else:
-        return "normal"
-
-def generate_alert_message(energy_value, anomaly_score):
-    """
-    Generate a descriptive message for the alert.
-    
-    Args:
-        energy_value (float): The energy value that triggered the alert
-        anomaly_score (float): The anomaly score from the model
-        
-    Returns:
-        str: Alert message
-    """
-    severity = determine_severity(anomaly_score)
-    if severity == "high":
-        return f"Critical energy consumption detected: {energy_value:.2f} Wh (Anomaly Score: {anomaly_score:.2f})"
-    elif severity == "medium":
-        return f"Unusual energy consumption detected: {energy_value:.2f} Wh (Anomaly Score: {anomaly_score:.2f})"
-    else:
-        return f"Minor energy consumption anomaly detected: {energy_value:.2f} Wh (Anomaly Score: {anomaly_score:.2f})"
-
-def generate_anomaly_report(df, anomaly_scores):
-    """
-    Generate a comprehensive anomaly report.
-    
-    Args:
-        df (pd.DataFrame): DataFrame containing energy data
-        anomaly_scores (np.array): Array of anomaly scores
-        
-    Returns:
-        dict: Report containing anomaly statistics and details
-    """
-    # Calculate anomaly statistics
-    total_points = len(df)
-    anomaly_df = df[df['severity'] != 'Normal']
-    total_anomalies = len(anomaly_df)
-    anomaly_rate = (total_anomalies / total_points) * 100 if total_points > 0 else 0
-    
-    # Calculate severity distribution
-    severity_counts = anomaly_df['severity'].value_counts().to_dict()
-    
-    # Get most recent anomalies
-    recent_anomalies = anomaly_df.sort_values('timestamp', ascending=False).head(5)
-    
-    # Calculate average anomaly score
-    avg_anomaly_score = anomaly_df['anomaly_score'].mean() if not anomaly_df.empty else 0
-    
-    return {
-        "total_points": total_points,
-        "total_anomalies": total_anomalies,
-        "anomaly_rate": anomaly_rate,
-        "severity_distribution": severity_counts,
-        "recent_anomalies": recent_anomalies,
-        "avg_anomaly_score": avg_anomaly_score,
-        "timestamp": datetime.now()
-    }
-
-def send_anomaly_report(report, recipients):
-    """
-    Send anomaly report to all recipients.
-    
-    Args:
-        report (dict): Anomaly report data
-        recipients (list): List of recipient user documents
-    """
-    communications = get_db()["communications"]
-    
-    # Create email content
-    email_subject = f"EMADS Anomaly Report - {report['timestamp'].strftime('%Y-%m-%d %H:%M:%S')}"
-    
-    # Build email body
-    email_body = f"""
-    EMADS Anomaly Detection Report
-    =============================
-    Generated: {report['timestamp'].strftime('%Y-%m-%d %H:%M:%S')}
-    
-    Summary:
-    -------
-    Total Data Points Analyzed: {report['total_points']}
-    Total Anomalies Detected: {report['total_anomalies']}
-    Anomaly Rate: {report['anomaly_rate']:.1f}%
-    Average Anomaly Score: {report['avg_anomaly_score']:.3f}
-    
-    Severity Distribution:
-    --------------------
-    """
-    
-    for severity, count in report['severity_distribution'].items():
-        email_body += f"{severity}: {count} anomalies\n"
-    
-    email_body += "\nMost Recent Anomalies:\n-------------------\n"
-    for _, anomaly in report['recent_anomalies'].iterrows():
-        email_body += f"""
-        Time: {anomaly['timestamp'].strftime('%Y-%m-%d %H:%M:%S')}
-        Severity: {anomaly['severity']}
-        Energy Value: {anomaly['energy_wh']:.2f} Wh
-        Anomaly Score: {anomaly['anomaly_score']:.3f}
-        """
-    
-    email_body += "\nPlease check the EMADS system for more details."
-    
-    # Send to each recipient
-    for recipient in recipients:
-        # Add to communications inbox
-        communication = {
-            "username": recipient["username"],
-            "type": "anomaly_report",
-            "title": f"Anomaly Detection Report - {report['timestamp'].strftime('%Y-%m-%d %H:%M:%S')}",
-            "message": email_body,
-            "timestamp": datetime.now(),
-            "read": False
-        }
-        communications.insert_one(communication)
-        
-        # Send email notification
-        try:
-            send_email([recipient["email"]], email_subject, email_body)
-        except Exception as e:
-            print(f"Error sending email to {recipient['email']}: {str(e)}")
-
-def generate_anomaly_alerts(df, anomaly_scores):
-    """
-    Generate alerts for detected anomalies and send reports.
-    
-    Args:
-        df (pd.DataFrame): DataFrame containing energy data
-        anomaly_scores (np.array): Array of anomaly scores
-    """
-    # Get alerts collection
-    alerts_collection = get_alerts_collection()
-    
-    # Clear old alerts before generating new ones
-    alerts_collection.delete_many({
-        "type": "anomaly_isolation_forest",
-        "timestamp": {"$lt": df['timestamp'].min()}
-    })
-    
-    # Process each anomaly
-    for idx, (timestamp, energy_value, score) in enumerate(zip(df['timestamp'], df['energy_wh'], anomaly_scores)):
-        # Only create alerts for anomalies (score <= low_threshold)
-        if score <= -0.20:  # Low threshold from anomalies page
-            severity = determine_severity(score)
-            message = generate_alert_message(energy_value, score)
-            
-            # Check if alert already exists for this timestamp
-            existing_alert = alerts_collection.find_one({
-                "timestamp": timestamp,
-                "type": "anomaly_isolation_forest"
-            })
-            
-            if not existing_alert:
-                create_alert(timestamp, energy_value, score, severity, message)
-    
-    # Generate and send anomaly report
-    report = generate_anomaly_report(df, anomaly_scores)
-    
-    # Get all admin and manager users
-    users = get_user_collection()
-    recipients = list(users.find({"role": {"$in": ["admin", "manager"]}}))
-    
-    # Send report to all recipients
-    send_anomaly_report(report, recipients)
-
-def run_alert_checks():
-    """Run all alert checks"""
-    # Clear old alerts before running checks
-    alerts_collection = get_alerts_collection()
-    alerts_collection.delete_many({
-        "type": "anomaly_isolation_forest",
-        "timestamp": {"$lt": datetime.now() - timedelta(days=30)}  # Keep only last 30 days
-    })
-    
-    check_consecutive_anomalies(threshold=2)
-    check_energy_spike(threshold_percent=50)
-    check_unusual_patterns(window_hours=24)
\ No newline at end of file
+import pandas as pd
+from datetime import datetime, timedelta
+from db import get_db, get_user_collection, get_alerts_collection, get_communications_collection
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from score_store import load_scoring_model, score_readings, severity_cutoffs
+from alert_rules import ALERT_RULES, fetch_rule_window, run_rules
+from anomaly_detection.online_detector import run_online_detection
+from email_utils import send_email
+from dotenv import load_dotenv
+import numpy as np
+
+load_dotenv()
+
+# Alerts of one type and sensor within the same bucket are the same alert
+ALERT_DEDUP_BUCKET = timedelta(minutes=5)
+
+# Used by determine_severity until the score sketch has data
+FALLBACK_SEVERITY_CUTOFFS = {"high": -0.35, "medium": -0.25, "low": -0.20}
+
+def get_notification_recipients(alert_type):
+    """Get recipients based on their notification preferences"""
+    users = get_user_collection()
+    recipients = []
+    
+    for user in users.find({"role": {"$in": ["admin", "manager"]}}):
+        prefs = user.get("preferences", {})
+        notifications = prefs.get("notifications", {})
+        
+        # Check if user has enabled notifications for this alert type
+        if notifications.get("alerts", True):  # Default to True if not set
+            if alert_type == "consecutive_anomalies" and notifications.get("alerts", True):
+                recipients.append(user["email"])
+            elif alert_type == "energy_spike" and notifications.get("alerts", True):
+                recipients.append(user["email"])
+            elif alert_type == "unusual_pattern" and notifications.get("alerts", True):
+                recipients.append(user["email"])
+    
+    return recipients
+
+def _to_bson(value):
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+def check_alert_rules(rules=ALERT_RULES):
+    """
+    Evaluate the alert rules over one shared window of readings and store new alerts.
+    
+    Args:
+        rules (list): Rule definitions, see alert_rules.ALERT_RULES
+        
+    Returns:
+        int: Number of alerts that were newly created
+    """
+    return store_rule_alerts(run_rules(rules), rules)
+
+def store_rule_alerts(candidates, rules=ALERT_RULES):
+    """
+    Store candidate alerts from the rule evaluators and notify about new ones.
+    
+    Args:
+        candidates (pd.DataFrame): Output of alert_rules.evaluate_rules
+        rules (list): The rules that produced the candidates
+        
+    Returns:
+        int: Number of alerts that were newly created
+    """
+    if candidates.empty:
+        return 0
+    candidates = candidates.drop(columns="metric")
+    recipients = {rule["type"]: get_notification_recipients(rule["notification"]) for rule in rules}
+    alert_docs = []
+    for candidate in candidates.to_dict("records"):
+        # Rules add their own columns; drop the ones another rule left empty
+        alert = {key: _to_bson(value) for key, value in candidate.items() if not pd.isna(value)}
+        alert["timestamp"] = alert["detected_at"]
+        alert["notified"] = bool(recipients[alert["type"]])
+        alert_docs.append(alert)
+    new_alerts = upsert_alerts(alert_docs)
+    
+    # One email per rule about its new alerts
+    for rule in rules:
+        rule_alerts = [alert for alert in new_alerts if alert["type"] == rule["type"]]
+        if not rule_alerts or not recipients[rule["type"]]:
+            continue
+        if not send_email(recipients[rule["type"]], rule["subject"],
+                          "\n".join(alert["message"] for alert in rule_alerts)):
+            mark_unnotified(rule_alerts)
+    return len(new_alerts)
+
+def determine_severity(anomaly_score, cutoffs=None, model_version=None):
+    """
+    Determine alert severity based on anomaly score.
+    
+    Args:
+        anomaly_score (float): The anomaly score from the model
+        cutoffs (dict): 'high'/'medium'/'low' score thresholds; defaults to the
+            ones of model_version (see get_severity_cutoffs)
+        model_version (str): Version of the model that produced the score
+        
+    Returns:
+        str: Severity level ('high', 'medium', 'low')
+    """
+    cutoffs = cutoffs or get_severity_cutoffs(model_version)
+    
+    if anomaly_score <= cutoffs["high"]:
+        return "high"
+    elif anomaly_score <= cutoffs["medium"]:
+        return "medium"
+    elif anomaly_score <= cutoffs["low"]:
+        return "low"
+    else:
+        return "normal"
+
+def get_severity_cutoffs(model_version=None):
+    """
+    Severity cutoffs of the model version whose scores are graded, falling
+    back to fixed ones before that version has scored anything.
+
+    Args:
+        model_version (str): Version of the model that produced the scores;
+            the registry's current scoring model when None
+    """
+    if model_version is None:
+        model_version = load_scoring_model()[1]
+    return severity_cutoffs(model_version) or FALLBACK_SEVERITY_CUTOFFS
+
+def generate_alert_message(energy_value, anomaly_score, cutoffs=None, model_version=None):
+    """
+    Generate a descriptive message for the alert.
+    
+    Args:
+        energy_value (float): The energy value that triggered the alert
+        anomaly_score (float): The anomaly score from the model
+        cutoffs (dict): Severity cutoffs, see determine_severity
+        model_version (str): Version of the model that produced the score
+        
+    Returns:
+        str: Alert message
+    """
+    severity = determine_severity(anomaly_score, cutoffs, model_version)
+    if severity == "high":
+        return f"Critical energy consumption detected: {energy_value:.2f} Wh (Anomaly Score: {anomaly_score:.2f})"
+    elif severity == "medium":
+        return f"Unusual energy consumption detected: {energy_value:.2f} Wh (Anomaly Score: {anomaly_score:.2f})"
+    else:
+        return f"Minor energy consumption anomaly detected: {energy_value:.2f} Wh (Anomaly Score: {anomaly_score:.2f})"
+
+def generate_anomaly_report(df, anomaly_scores):
+    """
+    Generate a comprehensive anomaly report.
+    
+    Args:
+        df (pd.DataFrame): DataFrame containing energy data
+        anomaly_scores (np.array): Array of anomaly scores
+        
+    Returns:
+        dict: Report containing anomaly statistics and details
+    """
+    # Calculate anomaly statistics
+    total_points = len(df)
+    anomaly_df = df[df['severity'] != 'Normal']
+    total_anomalies = len(anomaly_df)
+    anomaly_rate = (total_anomalies / total_points) * 100 if total_points > 0 else 0
+    
+    # Calculate severity distribution
+    severity_counts = anomaly_df['severity'].value_counts().to_dict()
+    
+    # Get most recent anomalies
+    recent_anomalies = anomaly_df.sort_values('timestamp', ascending=False).head(5)
+    
+    # Calculate average anomaly score
+    avg_anomaly_score = anomaly_df['anomaly_score'].mean() if not anomaly_df.empty else 0
+    
+    return {
+        "total_points": total_points,
+        "total_anomalies": total_anomalies,
+        "anomaly_rate": anomaly_rate,
+        "severity_distribution": severity_counts,
+        "recent_anomalies": recent_anomalies,
+        "avg_anomaly_score": avg_anomaly_score,
+        "timestamp": datetime.now()
+    }
+
+def send_anomaly_report(report, recipients):
+    """
+    Send anomaly report to all recipients.
+    
+    Args:
+        report (dict): Anomaly report data
+        recipients (list): List of recipient user documents
+    """
+    communications = get_db()["communications"]
+    
+    # Create email content
+    email_subject = f"EMADS Anomaly Report - {report['timestamp'].strftime('%Y-%m-%d %H:%M:%S')}"
+    
+    # Build email body
+    email_body = f"""
+    EMADS Anomaly Detection Report
+    =============================
+    Generated: {report['timestamp'].strftime('%Y-%m-%d %H:%M:%S')}
+    
+    Summary:
+    -------
+    Total Data Points Analyzed: {report['total_points']}
+    Total Anomalies Detected: {report['total_anomalies']}
+    Anomaly Rate: {report['anomaly_rate']:.1f}%
+    Average Anomaly Score: {report['avg_anomaly_score']:.3f}
+    
+    Severity Distribution:
+    --------------------
+    """
+    
+    for severity, count in report['severity_distribution'].items():
+        email_body += f"{severity}: {count} anomalies\n"
+    
+    email_body += "\nMost Recent Anomalies:\n-------------------\n"
+    for _, anomaly in report['recent_anomalies'].iterrows():
+        email_body += f"""
+        Time: {anomaly['timestamp'].strftime('%Y-%m-%d %H:%M:%S')}
+        Severity: {anomaly['severity']}
+        Energy Value: {anomaly['energy_wh']:.2f} Wh
+        Anomaly Score: {anomaly['anomaly_score']:.3f}
+        """
+    
+    email_body += "\nPlease check the EMADS system for more details."
+    
+    # Send to each recipient
+    for recipient in recipients:
+        # Add to communications inbox
+        communication = {
+            "username": recipient["username"],
+            "type": "anomaly_report",
+            "title": f"Anomaly Detection Report - {report['timestamp'].strftime('%Y-%m-%d %H:%M:%S')}",
+            "message": email_body,
+            "timestamp": datetime.now(),
+            "read": False
+        }
+        communications.insert_one(communication)
+        
+        # Send email notification
+        try:
+            send_email([recipient["email"]], email_subject, email_body)
+        except Exception as e:
+            print(f"Error sending email to {recipient['email']}: {str(e)}")
+
+def generate_anomaly_alerts(df, anomaly_scores, model_version=None):
+    """
+    Generate alerts for detected anomalies and send reports.
+    
+    Args:
+        df (pd.DataFrame): DataFrame containing energy data
+        anomaly_scores (np.array): Array of anomaly scores
+        model_version (str): Version of the model that produced the scores,
+            whose severity cutoffs are applied; the current one when None
+    """
+    # Get alerts collection
+    alerts_collection = get_alerts_collection()
+    
+    # Clear old alerts before generating new ones
+    alerts_collection.delete_many({
+        "type": "anomaly_isolation_forest",
+        "timestamp": {"$lt": df['timestamp'].min()}
+    })
+    
+    cutoffs = get_severity_cutoffs(model_version)
+    
+    # Only create alerts for anomalies (score <= low_threshold)
+    scores = np.asarray(anomaly_scores, dtype="float64")
+    hits = scores <= cutoffs["low"]
+    created_at = datetime.now()
+    alert_docs = [
+        {
+            "timestamp": pd.Timestamp(timestamp).to_pydatetime(),
+            "energy_wh": float(energy_value),
+            "anomaly_score": float(score),
+            "severity": determine_severity(score, cutoffs),
+            "message": generate_alert_message(energy_value, score, cutoffs),
+            "type": "anomaly_isolation_forest",
+            "resolved": False,
+            "created_at": created_at
+        }
+        for timestamp, energy_value, score in zip(
+            df['timestamp'].to_numpy()[hits], df['energy_wh'].to_numpy()[hits], scores[hits])
+    ]
+    
+    # Get all admin and manager users
+    recipients = list(get_user_collection().find({"role": {"$in": ["admin", "manager"]}}))
+    emails = [user["email"] for user in recipients if user.get("email")]
+    new_alerts = upsert_alerts(alert_docs, bucket=None, notified=bool(emails))
+    
+    # Inbox messages and one email for the new alerts only
+    communications = [
+        {
+            "user_id": user["_id"],
+            "type": "alert",
+            "title": f"Anomaly Alert: {alert['severity'].capitalize()} Severity",
+            "message": alert["message"],
+            "timestamp": datetime.now(),
+            "read": False,
+            "alert_id": alert["_id"]
+        }
+        for alert in new_alerts
+        for user in recipients
+    ]
+    if communications:
+        get_communications_collection().insert_many(communications)
+    if new_alerts and emails:
+        body = "\n".join(
+            f"{alert['severity'].capitalize()} | {alert['timestamp']} | "
+            f"{alert['energy_wh']:.2f} Wh | score {alert['anomaly_score']:.3f} | {alert['message']}"
+            for alert in new_alerts
+        )
+        if not send_email(emails, "EMADS Alert: New Anomalies Detected", body):
+            mark_unnotified(new_alerts)
+    
+    # Generate and send anomaly report
+    report = generate_anomaly_report(df, anomaly_scores)
+    
+    # Send report to all recipients
+    send_anomaly_report(report, recipients)
+
+def check_rolling_zscore(window=24, std_threshold=4.0):
+    """Flag new readings that deviate from their sensor's rolling window, using the checkpointed online detectors"""
+    results, checkpoint = run_online_detection(window=window, std_threshold=std_threshold)
+    # A detector warming up sees up to two days of readings; only recent ones alert
+    recent = pd.to_datetime(results["timestamp"]) >= datetime.now() - timedelta(hours=24)
+    flagged = results[results["statistical_anomaly"].astype(bool) & recent]
+    
+    alert_docs = [
+        {
+            "timestamp": pd.Timestamp(row.timestamp).to_pydatetime(),
+            "sensor_id": row.sensor_id,
+            "type": "rolling_zscore",
+            "value": float(row.energy_wh),
+            "z_score": float(row.z_score),
+            "message": f"Energy reading {row.energy_wh:.1f} Wh is {abs(row.z_score):.1f} standard deviations from the last {window} readings on sensor {row.sensor_id}",
+            "severity": "high" if abs(row.z_score) > 2 * std_threshold else "medium"
+        }
+        for row in flagged.itertuples(index=False)
+    ]
+    recipients = get_notification_recipients("unusual_pattern")
+    new_alerts = upsert_alerts(alert_docs, bucket=None, notified=bool(recipients))
+    # Only now are the readings done with; a failure above feeds them again
+    checkpoint()
+    
+    if new_alerts and recipients:
+        if not send_email(recipients, "EMADS Alert: Rolling Z-Score Anomaly",
+                          "\n".join(alert["message"] for alert in new_alerts)):
+            mark_unnotified(new_alerts)
+    return len(new_alerts)
+
+def alert_dedup_key(alert, bucket=ALERT_DEDUP_BUCKET):
+    """
+    Identity of an alert: sensor, type and the time bucket it falls in.
+
+    With bucket=None the exact timestamp is used, for alerts about single readings.
+    """
+    ts = pd.Timestamp(alert["timestamp"])
+    if bucket is not None:
+        ts = ts.floor(bucket)
+    return f"{alert.get('sensor_id') or '-'}:{alert['type']}:{ts.isoformat()}"
+
+def upsert_alerts(alert_docs, bucket=ALERT_DEDUP_BUCKET, notified=False):
+    """
+    Insert alerts that are not stored yet, in one bulk write.
+
+    Each alert gets a dedup_key (see alert_dedup_key) backed by a unique
+    index, so sending an alert that already exists is a no-op and callers
+    can emit the same anomalies on every run. Alerts inserted by concurrent
+    runs lose the race on the index and count as existing.
+    
+    Args:
+        alert_docs (list): Alert documents, each with 'type' and 'timestamp'
+        bucket (timedelta): Dedup time bucket, or None for exact timestamps
+        notified (bool): notified flag stored with new alerts that do not set
+            their own; pass True when the caller will notify about them
+        
+    Returns:
+        list: The documents that were newly inserted, with their _id set
+    """
+    if not alert_docs:
+        return []
+    alert_docs = [
+        {"notified": notified, **alert, "dedup_key": alert_dedup_key(alert, bucket)}
+        for alert in alert_docs
+    ]
+    operations = [
+        UpdateOne({"dedup_key": alert["dedup_key"]}, {"$setOnInsert": alert}, upsert=True)
+        for alert in alert_docs
+    ]
+    try:
+        upserted = get_alerts_collection().bulk_write(operations, ordered=False).upserted_ids
+    except BulkWriteError as e:
+        if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+            raise
+        upserted = {item["index"]: item["_id"] for item in e.details["upserted"]}
+    
+    new_alerts = []
+    for index, alert_id in sorted(upserted.items()):
+        alert = dict(alert_docs[index])
+        alert["_id"] = alert_id
+        new_alerts.append(alert)
+    return new_alerts
+
+def mark_unnotified(alerts):
+    """Clear the notified flag of alerts whose notification could not be sent"""
+    if alerts:
+        get_alerts_collection().update_many(
+            {"_id": {"$in": [alert["_id"] for alert in alerts]}},
+            {"$set": {"notified": False}}
+        )
+
+def emit_anomaly_alerts(df):
+    """
+    Store alerts for scored anomalies and notify admins about new ones only.
+    
+    Args:
+        df (pd.DataFrame): Output of anomalies.detect_anomalies, with 'timestamp',
+            'energy_wh', 'anomaly_score' and 'severity' columns
+        
+    Returns:
+        int: Number of alerts that were newly created
+    """
+    anomalies = df[df['severity'].isin(['high', 'medium', 'low'])]
+    alert_docs = []
+    for row in anomalies.itertuples(index=False):
+        alert_docs.append({
+            'timestamp': row.timestamp,
+            'type': 'isolation_forest',
+            'severity': row.severity,
+            'message': f"""
+                    Anomaly detected in energy consumption:
+                    - Time: {row.timestamp.strftime('%Y-%m-%d %H:%M:%S')}
+                    - Energy Consumption: {row.energy_wh:.2f} kWh
+                    - Anomaly Score: {abs(row.anomaly_score):.3f}
+                    - Severity: {row.severity.capitalize()}
+                    - Type: Isolation Forest
+                    """,
+            'energy_consumption': float(row.energy_wh),
+            'anomaly_score': float(abs(row.anomaly_score)),
+            'resolved': False
+        })
+    
+    admin_users = list(get_user_collection().find({"role": {"$in": ["admin", "manager"]}}))
+    admin_emails = [user['email'] for user in admin_users if user.get('email')]
+    new_alerts = upsert_alerts(alert_docs, bucket=None, notified=bool(admin_emails))
+    if not new_alerts:
+        return 0
+    
+    # Notify admins and managers once, about the new alerts only
+    notifications = [
+        {
+            'username': user['username'],
+            'title': f"New Anomaly Alert: {alert['severity'].capitalize()} Severity",
+            'message': alert['message'],
+            'type': 'system_message',
+            'timestamp': datetime.now(),
+            'read': False
+        }
+        for alert in new_alerts
+        for user in admin_users
+    ]
+    if notifications:
+        get_communications_collection().insert_many(notifications)
+    
+    if admin_emails and not send_email(admin_emails, "EMADS: New Anomaly Alerts",
+                                       "\n\n".join(alert['message'] for alert in new_alerts)):
+        mark_unnotified(new_alerts)
+    
+    return len(new_alerts)
+
+def check_anomaly_alerts(hours=24, now=None):
+    """
+    Score the last `hours` hours of the combined series and store alerts for its anomalies.
+
+    Scores are persisted per reading (see score_store.score_readings), so a
+    run only scores readings that arrived since the previous one, and alerts
+    that are already stored are skipped by their dedup key. Severity uses the
+    cutoffs of the scoring model's version, as on the anomalies page.
+
+    Returns:
+        int: Number of alerts that were newly created
+    """
+    window = fetch_rule_window(hours, now)
+    if window.empty:
+        return 0
+    df = window.sort_values("timestamp", kind="mergesort")[["timestamp", "energy_wh"]].reset_index(drop=True)
+    model, version, model_path = load_scoring_model()
+    df = score_readings(df, model, version, model_path=model_path)
+    cutoffs = get_severity_cutoffs(version)
+    scores = df["anomaly_score"].to_numpy()
+    df["severity"] = np.select(
+        [scores <= cutoffs["high"], scores <= cutoffs["medium"], scores <= cutoffs["low"]],
+        ["high", "medium", "low"],
+        default="normal"
+    )
+    return emit_anomaly_alerts(df)
+
+def run_alert_checks():
+    """Run all alert checks"""
+    # Clear old alerts before running checks
+    alerts_collection = get_alerts_collection()
+    alerts_collection.delete_many({
+        "type": "anomaly_isolation_forest",
+        "timestamp": {"$lt": datetime.now() - timedelta(days=30)}  # Keep only last 30 days
+    })
+    
+    check_alert_rules()
+    check_anomaly_alerts()
+    check_rolling_zscore(window=24, std_threshold=4.0)
\ No newline at end of file
@@ -4,8 +4,11 @@ import streamlit as st
 import plotly.graph_objects as go 
 import plotly.express as px
 
+from datetime import datetime, timedelta
+
 from require_login import require_login
-from db import load_energy_data 
+from energy_repository import load_energy_data, aggregate_energy_data 
+from rollups import ROLLUPS_MISSING_MESSAGE, load_rollups, rollups_built
 
 def analytics_page():
     require_login()
@@ -27,17 +30,15 @@ def analytics_page():
         max_value=max_date
     )
     df = df[(df["timestamp"].dt.date >= start_date) & (df["timestamp"].dt.date <= end_date)]
+    range_start = datetime.combine(start_date, datetime.min.time())
+    range_end = datetime.combine(end_date, datetime.min.time()) + timedelta(days=1)
 
     # 2) Aggregated View
     st.subheader("Aggregated Consumption")
     agg_level = st.selectbox("Aggregation level", ["Daily", "Weekly", "Monthly"])
-    freq_map = {"Daily": "D", "Weekly": "W", "Monthly": "M"}
-    df_agg = (
-        df.set_index("timestamp")
-          .resample(freq_map[agg_level])["energy_wh"]
-          .sum()
-          .reset_index()
-    )
+    bucket_map = {"Daily": "day", "Weekly": "week", "Monthly": "month"}
+    df_agg = aggregate_energy_data(range_start, range_end, bucket_map[agg_level], ("sum",))
+    df_agg = df_agg.rename(columns={"sum": "energy_wh"})
     df_agg["timestamp"] = df_agg["timestamp"].dt.date
     st.bar_chart(df_agg.rename(columns={"timestamp": "index"}).set_index("index")["energy_wh"],
                  use_container_width=True)
@@ -54,11 +55,18 @@ def analytics_page():
 
     # 4) Comparison: Hourly Profiles by Weekday
     st.subheader("Hourly Profiles by Weekday")
-    df["hour"] = df["timestamp"].dt.hour
-    df["weekday"] = df["timestamp"].dt.day_name()
+    # Hourly sums/counts come from the rollups; the weekday × hour mean is
+    # recombined from them so it matches the mean over the raw readings.
+    if not rollups_built():
+        st.warning(ROLLUPS_MISSING_MESSAGE)
+        return
+    df_hourly = load_rollups("hour", range_start, range_end)
+    df_hourly["hour"] = df_hourly["timestamp"].dt.hour
+    df_hourly["weekday"] = df_hourly["timestamp"].dt.day_name()
+    profile = df_hourly.groupby(["weekday", "hour"])[["sum", "count"]].sum()
     hourly = (
-        df.groupby(["weekday", "hour"])["energy_wh"]
-          .mean()
+        (profile["sum"] / profile["count"])
+          .rename("energy_wh")
           .reindex(index=["Monday","Tuesday","Wednesday","Thursday","Friday","Saturday","Sunday"], level=0)
           .reset_index()
     )
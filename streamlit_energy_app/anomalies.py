@@ -1,62 +1,24 @@
 import streamlit as st
 from require_login import require_login
-from db import get_energy_collection, get_alerts_collection, get_user_collection, get_communications_collection, load_energy_data
+from energy_repository import energy_fingerprint, load_energy_range
+from fingerprint_cache import cache_by_fingerprint, dataset_fingerprint
+from time_ranges import TIME_RANGE_OPTIONS, resolve_time_range
+from anomaly_detection.run_length import mark_runs
+from anomaly_detection.scoring import decision_scores, labels_from_scores
 from datetime import datetime, timedelta
-import pandas as pd
 import numpy as np
-from sklearn.ensemble import IsolationForest
-import plotly.express as px
 import plotly.graph_objects as go
-from email_utils import send_email
-import joblib
-import os
-from sklearn.preprocessing import StandardScaler
+from score_store import load_scoring_model, score_readings, severity_cutoffs
+from training_jobs import latest_job, start_training_job
 
-# Cache the model loading
-@st.cache_resource(ttl=3600)  # Cache for 1 hour
-def load_model():
-    """Load and cache the Isolation Forest model"""
-    try:
-        model_path = os.path.join(os.path.dirname(__file__), 'new_models', 'IF_model.joblib')
-        return joblib.load(model_path)
-    except FileNotFoundError:
-        st.error("Error: 'IF_model.joblib' not found in new_models directory.")
-        st.stop()
-
-# Load the model once and cache it
-loaded_if_model = load_model()
-
-# Cache the data loading function with a shorter TTL
-@st.cache_data(ttl=60)  # Cache for 1 minute
-def load_energy_data(start_time, end_time):
-    """Load energy data from MongoDB with caching"""
-    energy_collection = get_energy_collection()
-    # Optimize query by only fetching needed fields and using proper sort
-    energy_data = list(energy_collection.find(
-        {
-            "timestamp": {
-                "$gte": start_time,
-                "$lte": end_time
-            }
-        },
-        {
-            "_id": 0,
-            "timestamp": 1,
-            "energy_wh": 1
-        }
-    ).sort("timestamp", 1))
-    
-    if not energy_data:
-        return None
-    
-    df = pd.DataFrame(energy_data)
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-    return df
-
-# Cache the anomaly detection functions
-@st.cache_data(ttl=300)
+# The detection functions return new frames and leave their input untouched.
+# Passing fingerprint=... caches a result on the dataset fingerprint instead of
+# hashing the frame (see fingerprint_cache).
+@cache_by_fingerprint
 def detect_statistical_anomalies(df, window=24, std_threshold=4):
     """Detect anomalies using statistical methods (rolling mean and standard deviation)"""
+    df = df.copy()
+
     # Calculate rolling statistics
     df['rolling_mean'] = df['energy_wh'].rolling(window=window).mean()
     df['rolling_std'] = df['energy_wh'].rolling(window=window).std()
@@ -72,29 +34,21 @@ def detect_statistical_anomalies(df, window=24, std_threshold=4):
     
     return df
 
-@st.cache_data(ttl=300)
+@cache_by_fingerprint
 def detect_consecutive_anomalies(df, min_consecutive=8):
     """Detect periods of consecutive anomalies"""
-    # Initialize consecutive anomaly column
-    df['consecutive_anomaly'] = False
-    
-    # Find consecutive anomalies (increased minimum consecutive points)
-    anomaly_mask = df['statistical_anomaly']
-    consecutive_count = 0
-    
-    for i in range(len(df)):
-        if anomaly_mask.iloc[i]:
-            consecutive_count += 1
-            if consecutive_count >= min_consecutive:
-                df.loc[df.index[i-min_consecutive+1:i+1], 'consecutive_anomaly'] = True
-        else:
-            consecutive_count = 0
+    df = df.copy()
+
+    # Flag every point of each run of at least min_consecutive statistical anomalies
+    df['consecutive_anomaly'] = mark_runs(df['statistical_anomaly'].to_numpy(), min_consecutive)
     
     return df
 
-@st.cache_data(ttl=300)
+@cache_by_fingerprint
 def detect_energy_spikes(df, spike_threshold=3.0):
     """Detect sudden spikes in energy consumption"""
+    df = df.copy()
+
     # Calculate percentage change
     df['pct_change'] = df['energy_wh'].pct_change()
     
@@ -106,227 +60,119 @@ def detect_energy_spikes(df, spike_threshold=3.0):
     
     return df
 
-# Remove caching from detect_anomalies since it uses an unhashable model parameter
-def detect_anomalies(df, _model):
-    """Detect anomalies using the Isolation Forest model with severity levels"""
-    try:
-        # Get anomaly scores
-        scores = _model.decision_function(df[['energy_wh']].values)
-        
-        # Calculate thresholds based on score distribution
-        high_threshold = np.percentile(scores, 0.5)    # Top 0.5% most anomalous
-        medium_threshold = np.percentile(scores, 1.0)  # Top 1% most anomalous
-        low_threshold = np.percentile(scores, 2.0)     # Top 2% most anomalous
-        
-        # Categorize anomalies
-        df['anomaly_score'] = scores
-        df['anomaly'] = _model.predict(df[['energy_wh']].values)
-        
-        # Add severity levels
-        df['severity'] = 'normal'
-        df.loc[df['anomaly_score'] <= high_threshold, 'severity'] = 'high'
-        df.loc[(df['anomaly_score'] > high_threshold) & 
-               (df['anomaly_score'] <= medium_threshold), 'severity'] = 'medium'
-        df.loc[(df['anomaly_score'] > medium_threshold) & 
-               (df['anomaly_score'] <= low_threshold), 'severity'] = 'low'
-        
-        # Additional filtering to ensure anomalies are significant
-        df['z_score'] = (df['energy_wh'] - df['energy_wh'].mean()) / df['energy_wh'].std()
-        df.loc[abs(df['z_score']) < 2.0, 'anomaly'] = 1
-        df.loc[abs(df['z_score']) < 2.0, 'severity'] = 'normal'
-        
-        # Process anomalies - include all severity levels
-        anomalies = df[df['severity'].isin(['high', 'medium', 'low'])].copy()
-        
-        if not anomalies.empty:
-            # Get collections once
-            alerts_collection = get_alerts_collection()
-            users = get_user_collection()
-            communications = get_communications_collection()
-            
-            # Get admin/manager users once
-            admin_users = list(users.find({"role": {"$in": ["admin", "manager"]}}))
-            admin_emails = [user['email'] for user in admin_users if user.get('email')]
-            
-            # Clear old alerts before creating new ones
-            alerts_collection.delete_many({
-                "type": "isolation_forest",
-                "timestamp": {"$lt": df['timestamp'].min()}
-            })
-            
-            # Prepare alerts in batch
-            alerts = []
-            notifications = []
-            
-            for _, row in anomalies.iterrows():
-                severity = row['severity']
-                alert = {
-                    'timestamp': row['timestamp'],
-                    'type': 'isolation_forest',
-                    'severity': severity,
-                    'message': f"""
-                    Anomaly detected in energy consumption:
-                    - Time: {row['timestamp'].strftime('%Y-%m-%d %H:%M:%S')}
-                    - Energy Consumption: {row['energy_wh']:.2f} kWh
-                    - Anomaly Score: {abs(row['anomaly_score']):.3f}
-                    - Severity: {severity.capitalize()}
-                    - Type: Isolation Forest
-                    """,
-                    'energy_consumption': float(row['energy_wh']),
-                    'anomaly_score': float(abs(row['anomaly_score'])),
-                    'resolved': False
-                }
-                alerts.append(alert)
-                
-                # Prepare notifications for each admin user
-                for user in admin_users:
-                    notifications.append({
-                        'username': user['username'],
-                        'title': f'New Anomaly Alert: {severity.capitalize()} Severity',
-                        'message': alert['message'],
-                        'type': 'system_message',
-                        'timestamp': datetime.now(),
-                        'read': False
-                    })
-            
-            # Batch insert alerts and notifications
-            if alerts:
-                alerts_collection.insert_many(alerts)
-            if notifications:
-                communications.insert_many(notifications)
-            
-            # Send email notifications in batch if there are any admin emails
-            if admin_emails:
-                email_subject = "EMADS: New Anomaly Alerts"
-                email_body = "\n\n".join([alert['message'] for alert in alerts])
-                send_email(admin_emails, email_subject, email_body)
-        
-        return df
-    except Exception as e:
-        st.error(f"Error detecting anomalies: {str(e)}")
-        return df
+# _model is not hashed; model_version stands in for it in the cache key
+@cache_by_fingerprint
+def detect_anomalies(df, _model, model_version=None, cutoffs=None):
+    """
+    Score readings with the Isolation Forest model and assign severity levels.
 
-def generate_alerts(df):
-    """Generate alerts for detected anomalies"""
-    try:
-        # Process anomalies - include all severity levels
-        anomalies = df[df['severity'].isin(['high', 'medium', 'low'])].copy()
-        
-        if not anomalies.empty:
-            # Get collections once
-            alerts_collection = get_alerts_collection()
-            users = get_user_collection()
-            communications = get_communications_collection()
-            
-            # Get admin/manager users once
-            admin_users = list(users.find({"role": {"$in": ["admin", "manager"]}}))
-            admin_emails = [user['email'] for user in admin_users if user.get('email')]
-            
-            # Clear old alerts before creating new ones
-            alerts_collection.delete_many({
-                "type": "isolation_forest",
-                "timestamp": {"$lt": df['timestamp'].min()}
-            })
-            
-            # Prepare alerts in batch
-            alerts = []
-            notifications = []
-            
-            for _, row in anomalies.iterrows():
-                severity = row['severity']
-                alert = {
-                    'timestamp': row['timestamp'],
-                    'type': 'isolation_forest',
-                    'severity': severity,
-                    'message': f"""
-                    Anomaly detected in energy consumption:
-                    - Time: {row['timestamp'].strftime('%Y-%m-%d %H:%M:%S')}
-                    - Energy Consumption: {row['energy_wh']:.2f} kWh
-                    - Anomaly Score: {abs(row['anomaly_score']):.3f}
-                    - Severity: {severity.capitalize()}
-                    - Type: Isolation Forest
-                    """,
-                    'energy_consumption': float(row['energy_wh']),
-                    'anomaly_score': float(abs(row['anomaly_score'])),
-                    'resolved': False
-                }
-                alerts.append(alert)
-                
-                # Prepare notifications for each admin user
-                for user in admin_users:
-                    notifications.append({
-                        'username': user['username'],
-                        'title': f'New Anomaly Alert: {severity.capitalize()} Severity',
-                        'message': alert['message'],
-                        'type': 'system_message',
-                        'timestamp': datetime.now(),
-                        'read': False
-                    })
-            
-            # Batch insert alerts and notifications
-            if alerts:
-                alerts_collection.insert_many(alerts)
-            if notifications:
-                communications.insert_many(notifications)
-            
-            # Send email notifications in batch if there are any admin emails
-            if admin_emails:
-                email_subject = "EMADS: New Anomaly Alerts"
-                email_body = "\n\n".join([alert['message'] for alert in alerts])
-                send_email(admin_emails, email_subject, email_body)
-            
-            return len(alerts)
-        return 0
-    except Exception as e:
-        st.error(f"Error generating alerts: {str(e)}")
-        return 0
+    Pure function: the input frame is not modified and nothing is written to
+    the database. Use alerts.emit_anomaly_alerts to store and notify.
 
-def load_anomaly_model():
-    """Load the Isolation Forest model with caching"""
-    @st.cache_resource(ttl=3600)  # Cache for 1 hour
-    def load_model():
-        try:
-            models_dir = os.path.join(os.path.dirname(__file__), "new_models")
-            model_path = os.path.join(models_dir, "isolation_forest_model.joblib")
-            
-            if not os.path.exists(model_path):
-                return None
-                
-            return joblib.load(model_path)
-        except Exception as e:
-            st.error(f"Error loading anomaly model: {str(e)}")
-            return None
+    cutoffs maps 'high'/'medium'/'low' to score thresholds, normally
+    score_store.severity_cutoffs(); when None they are taken as percentiles
+    of the scores in df.
+    """
+    df = df.copy()
+
+    # Reuse scores attached by score_store.score_readings, otherwise score here
+    if 'anomaly_score' in df.columns:
+        scores = df['anomaly_score'].to_numpy()
+    else:
+        scores = decision_scores(_model, df['energy_wh'].values)
+    
+    # Thresholds shared with the alerts, or from this score distribution
+    if cutoffs is None:
+        cutoffs = {
+            'high': np.percentile(scores, 0.5),    # Top 0.5% most anomalous
+            'medium': np.percentile(scores, 1.0),  # Top 1% most anomalous
+            'low': np.percentile(scores, 2.0),     # Top 2% most anomalous
+        }
+    high_threshold = cutoffs['high']
+    medium_threshold = cutoffs['medium']
+    low_threshold = cutoffs['low']
+    
+    # Categorize anomalies
+    df['anomaly_score'] = scores
+    df['anomaly'] = labels_from_scores(scores)
     
-    return load_model()
+    # Add severity levels
+    df['severity'] = 'normal'
+    df.loc[df['anomaly_score'] <= high_threshold, 'severity'] = 'high'
+    df.loc[(df['anomaly_score'] > high_threshold) & 
+           (df['anomaly_score'] <= medium_threshold), 'severity'] = 'medium'
+    df.loc[(df['anomaly_score'] > medium_threshold) & 
+           (df['anomaly_score'] <= low_threshold), 'severity'] = 'low'
+    
+    # Additional filtering to ensure anomalies are significant
+    df['z_score'] = (df['energy_wh'] - df['energy_wh'].mean()) / df['energy_wh'].std()
+    df.loc[abs(df['z_score']) < 2.0, 'anomaly'] = 1
+    df.loc[abs(df['z_score']) < 2.0, 'severity'] = 'normal'
+    
+    return df
+
+@cache_by_fingerprint
+def calculate_metrics(df):
+    """Anomaly counts and rate for the metrics row of the anomalies page"""
+    total_points = len(df)
+    anomalies = (df['anomaly'] == -1).sum()
+    high_severity = (df['severity'] == 'high').sum()
+    medium_severity = (df['severity'] == 'medium').sum()
+    low_severity = (df['severity'] == 'low').sum()
+    total_anomalies = high_severity + medium_severity + low_severity
+    anomaly_rate = (total_anomalies / total_points * 100) if total_points > 0 else 0
+    return {
+        'total_points': total_points,
+        'total_anomalies': total_anomalies,
+        'high_severity': high_severity,
+        'medium_severity': medium_severity,
+        'low_severity': low_severity,
+        'anomaly_rate': anomaly_rate
+    }
+
+@cache_by_fingerprint
+def prepare_visualization_data(df):
+    """Normal points, anomalies per severity and the severity distribution"""
+    # Prepare data for time series plot
+    normal_df = df[df['anomaly'] == 1]
+    anomaly_dfs = {
+        'high': df[(df['anomaly'] == -1) & (df['severity'] == 'high')],
+        'medium': df[(df['anomaly'] == -1) & (df['severity'] == 'medium')],
+        'low': df[(df['anomaly'] == -1) & (df['severity'] == 'low')]
+    }
+    
+    # Prepare distribution data
+    distribution = df['severity'].value_counts()
+    
+    return normal_df, anomaly_dfs, distribution
+
+# _model is not hashed; model_version stands in for it in the cache key. A
+# cache hit skips reading the stored scores of the range again.
+@cache_by_fingerprint
+def score_range(df, _model, model_version, _model_path=None, _progress=None):
+    """Persisted Isolation Forest scores for the readings, see score_store.score_readings"""
+    return score_readings(df, _model, model_version, model_path=_model_path, progress=_progress)
 
-def train_anomaly_model(df):
-    """Train a new Isolation Forest model with optimized parameters"""
+def get_model():
+    """
+    Load the current Isolation Forest model and its version.
+
+    The registry resolves the newest trained artifact, so every session
+    switches to a retrained model on its next rerun. When no model exists at
+    all a training job is started in the background (unless the last one
+    failed within the hour) and (None, None, None) is returned.
+
+    Returns:
+        tuple: (model, model_version, model_path)
+    """
     try:
-        # Prepare data
-        data = df[['energy_wh']].values
-        
-        # Initialize model with more balanced parameters
-        model = IsolationForest(
-            n_estimators=200,      # Increased number of trees for better accuracy
-            contamination=0.005,   # 0.5% expected anomalies
-            random_state=42,       # For reproducibility
-            n_jobs=-1,            # Use all available cores
-            max_samples='auto'     # Use all samples for better detection
-        )
-        
-        # Train the model
-        model.fit(data)
-        
-        # Save the model
-        models_dir = os.path.join(os.path.dirname(__file__), "new_models")
-        os.makedirs(models_dir, exist_ok=True)
-        model_path = os.path.join(models_dir, "isolation_forest_model.joblib")
-        joblib.dump(model, model_path)
-        
-        return model
-    except Exception as e:
-        st.error(f"Error training anomaly model: {str(e)}")
-        return None
+        return load_scoring_model("isolation_forest")
+    except FileNotFoundError:
+        job = latest_job()
+        if (job is None or job["status"] != "failed"
+                or job["finished_at"] < datetime.now() - timedelta(hours=1)):
+            start_training_job()
+        return None, None, None
 
 def anomalies_page():
     require_login()
@@ -340,81 +186,54 @@ def anomalies_page():
     st.markdown("### Select Time Range")
     time_range = st.selectbox(
         "Choose a time range",
-        ["Last 24 hours", "Last 7 days", "Last 30 days", "Last 90 days", "All time"],
+        TIME_RANGE_OPTIONS,
         index=4  # Default to "All time"
     )
 
-    # Calculate time range
-    now = datetime.now()
-    if time_range == "Last 24 hours":
-        start_time = now - timedelta(days=1)
-        end_time = now
-    elif time_range == "Last 7 days":
-        start_time = now - timedelta(days=7)
-        end_time = now
-    elif time_range == "Last 30 days":
-        start_time = now - timedelta(days=30)
-        end_time = now
-    elif time_range == "Last 90 days":
-        start_time = now - timedelta(days=90)
-        end_time = now
-    else:  # All time
-        start_time = datetime.min
-        end_time = now
+    # Resolve to minute-aligned boundaries
+    start_time, end_time = resolve_time_range(time_range)
 
-    # Load data with caching
-    @st.cache_data(ttl=300)  # Cache for 5 minutes
-    def load_data(start_time, end_time):
-        return load_energy_data(start_time, end_time)
-
-    # Load model with caching
-    @st.cache_resource(ttl=3600)  # Cache for 1 hour
-    def get_model():
-        model = load_anomaly_model()
-        if model is None:
-            df = load_data(start_time, end_time)
-            if df is not None and not df.empty:
-                model = train_anomaly_model(df)
-        return model
-
-    # Load data and model
+    # Load data (held prefix plus a cached tail, see load_energy_range) and model
     with st.spinner('Loading data and model...'):
-        df = load_data(start_time, end_time)
-        if df is None or df.empty:
+        df = load_energy_range(start_time, end_time)
+        if df.empty:
             st.warning("No energy data available for the selected time range.")
             return
 
-        model = get_model()
+        model, model_version, model_path = get_model()
         if model is None:
-            st.error("Failed to load or train the anomaly detection model.")
+            job = latest_job()
+            if job is not None and job["status"] == "failed":
+                st.error(f"Training the anomaly detection model failed: {job.get('error')}")
+            else:
+                st.info("The anomaly detection model is being trained in the background. "
+                        "Reload this page in a few minutes.")
             return
 
-    # Detect anomalies and generate alerts
-    with st.spinner('Detecting anomalies and generating alerts...'):
-        df = detect_anomalies(df, model)
-
-    # Cache the metrics calculation
-    @st.cache_data(ttl=60)  # Cache for 1 minute
-    def calculate_metrics(df):
-        total_points = len(df)
-        anomalies = (df['anomaly'] == -1).sum()
-        high_severity = (df['severity'] == 'high').sum()
-        medium_severity = (df['severity'] == 'medium').sum()
-        low_severity = (df['severity'] == 'low').sum()
-        total_anomalies = high_severity + medium_severity + low_severity
-        anomaly_rate = (total_anomalies / total_points * 100) if total_points > 0 else 0
-        return {
-            'total_points': total_points,
-            'total_anomalies': total_anomalies,
-            'high_severity': high_severity,
-            'medium_severity': medium_severity,
-            'low_severity': low_severity,
-            'anomaly_rate': anomaly_rate
-        }
+    # Score anomalies. Scores are persisted per reading, so only readings new
+    # to this model are scored; alerts are stored by the alert_checks job
+    # (alerts.check_anomaly_alerts), so rendering never notifies anyone.
+    with st.spinner('Detecting anomalies...'):
+        try:
+            # Range, watermark, the frame's size and last reading (which
+            # cover the uncached tail) and the model identify the result;
+            # the frame is never hashed
+            data_fingerprint = dataset_fingerprint(start_time, end_time, energy_fingerprint(),
+                                                   len(df), df["timestamp"].iloc[-1], model_version)
+            progress_bar = st.progress(0.0, text="Scoring readings...")
+            df = score_range(df, model, model_version, model_path, progress_bar.progress,
+                             fingerprint=data_fingerprint)
+            progress_bar.empty()
+            cutoffs = severity_cutoffs(model_version)
+            fingerprint = dataset_fingerprint(data_fingerprint, cutoffs)
+            df = detect_anomalies(df, model, model_version, cutoffs, fingerprint=fingerprint)
+        except Exception as e:
+            st.error(f"Error detecting anomalies: {str(e)}")
+            return
 
     # Display metrics
     st.subheader("Anomaly Detection Metrics")
-    metrics = calculate_metrics(df)
+    metrics = calculate_metrics(df, fingerprint=fingerprint)
     col1, col2, col3, col4, col5 = st.columns(5)
     with col1:
         st.metric("Total Data Points", metrics['total_points'])
@@ -430,25 +249,9 @@ def anomalies_page():
     # Add a small note about the metrics
     st.caption("Note: Anomalies are categorized by severity level based on their deviation from normal patterns.")
 
-    # Cache the visualization data
-    @st.cache_data(ttl=60)  # Cache for 1 minute
-    def prepare_visualization_data(df):
-        # Prepare data for time series plot
-        normal_df = df[df['anomaly'] == 1]
-        anomaly_dfs = {
-            'high': df[(df['anomaly'] == -1) & (df['severity'] == 'high')],
-            'medium': df[(df['anomaly'] == -1) & (df['severity'] == 'medium')],
-            'low': df[(df['anomaly'] == -1) & (df['severity'] == 'low')]
-        }
-        
-        # Prepare distribution data
-        distribution = df['severity'].value_counts()
-        
-        return normal_df, anomaly_dfs, distribution
-
     # Generate visualizations
     with st.spinner('Generating visualizations...'):
-        normal_df, anomaly_dfs, distribution = prepare_visualization_data(df)
+        normal_df, anomaly_dfs, distribution = prepare_visualization_data(df, fingerprint=fingerprint)
 
         # Plot results
         fig = go.Figure()
@@ -534,12 +337,3 @@ def anomalies_page():
             }
         )
         st.dataframe(anomalies_display, use_container_width=True)
-
-    # Generate alerts after showing results
-    if st.button("Generate Alerts for Detected Anomalies"):
-        with st.spinner('Generating alerts...'):
-            num_alerts = generate_alerts(df)
-            if num_alerts > 0:
-                st.success(f"Successfully generated {num_alerts} alerts!")
-            else:
-                st.info("No new alerts were generated.")
@@ -0,0 +1,220 @@
+# online_detector.py
+
+import math
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+class RollingZScoreDetector:
+    """
+    Incremental rolling z-score detector with O(1) work per reading.
+
+    Keeps the last `window` readings in a ring buffer together with their
+    running mean and sum of squared deviations (Welford's update, extended
+    to remove the reading that leaves the window). A reading is flagged when
+    |z| > std_threshold, where z uses the mean and sample std of the window
+    that ends at that reading - the same definition as
+    anomalies.detect_statistical_anomalies. z is NaN until the window is full.
+
+    The running sums are recomputed exactly from the buffer once per window
+    of updates, so rounding errors cannot accumulate.
+    """
+
+    def __init__(self, window=24, std_threshold=4.0):
+        self.window = window
+        self.std_threshold = std_threshold
+        self.buffer = np.zeros(window, dtype="float64")
+        self.head = 0          # Next slot to write
+        self.count = 0         # Readings currently held (<= window)
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.updates_since_resync = 0
+        self.last_timestamp = None
+        self.last_ids = []     # _ids of the readings fed at last_timestamp
+
+    def _resync(self):
+        values = self.buffer[:self.count] if self.count < self.window else self.buffer
+        self.mean = float(values.mean()) if self.count else 0.0
+        self.m2 = float(((values - self.mean) ** 2).sum()) if self.count else 0.0
+        self.updates_since_resync = 0
+
+    def update(self, value, timestamp=None):
+        """
+        Feed one reading.
+
+        Returns:
+            tuple: (z_score, is_anomaly)
+        """
+        value = float(value)
+        if self.count < self.window:
+            self.count += 1
+            delta = value - self.mean
+            self.mean += delta / self.count
+            self.m2 += delta * (value - self.mean)
+        else:
+            old = self.buffer[self.head]
+            old_mean = self.mean
+            self.mean += (value - old) / self.window
+            self.m2 += (value - old) * (value - self.mean + old - old_mean)
+        self.buffer[self.head] = value
+        self.head = (self.head + 1) % self.window
+        if timestamp is not None:
+            self.last_timestamp = timestamp
+
+        self.updates_since_resync += 1
+        if self.updates_since_resync >= self.window:
+            self._resync()
+
+        if self.count < self.window or self.window < 2:
+            return float("nan"), False
+        std = math.sqrt(max(self.m2, 0.0) / (self.window - 1))
+        if std == 0:
+            return float("nan"), False
+        z = (value - self.mean) / std
+        return z, abs(z) > self.std_threshold
+
+    def update_many(self, values, timestamps=None):
+        """
+        Feed readings in order.
+
+        Returns:
+            pd.DataFrame: 'z_score' and 'statistical_anomaly', one row per reading
+        """
+        values = np.asarray(values, dtype="float64")
+        z_scores = np.empty(len(values), dtype="float64")
+        flags = np.zeros(len(values), dtype=bool)
+        for i, value in enumerate(values):
+            z_scores[i], flags[i] = self.update(value)
+        if timestamps is not None and len(timestamps):
+            self.last_timestamp = pd.Timestamp(timestamps[-1]).to_pydatetime()
+        return pd.DataFrame({"z_score": z_scores, "statistical_anomaly": flags})
+
+    def to_state(self):
+        """Serialisable checkpoint of the detector"""
+        # Store the buffer oldest-first so it can be restored without the head index
+        if self.count < self.window:
+            ordered = self.buffer[:self.count]
+        else:
+            ordered = np.roll(self.buffer, -self.head)
+        return {
+            "window": self.window,
+            "std_threshold": self.std_threshold,
+            "values": ordered.tolist(),
+            "last_timestamp": self.last_timestamp,
+            "last_ids": list(self.last_ids),
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        detector = cls(state["window"], state["std_threshold"])
+        values = np.asarray(state["values"], dtype="float64")
+        detector.count = len(values)
+        detector.buffer[:len(values)] = values
+        detector.head = len(values) % detector.window
+        detector.last_timestamp = state.get("last_timestamp")
+        detector.last_ids = list(state.get("last_ids", []))
+        detector._resync()
+        return detector
+
+    def save(self, collection, name):
+        """Checkpoint the detector to MongoDB under name"""
+        collection.update_one(
+            {"_id": name},
+            {"$set": {**self.to_state(), "updated_at": datetime.now()}},
+            upsert=True
+        )
+
+    @classmethod
+    def load(cls, collection, name, window=24, std_threshold=4.0):
+        """Resume a checkpointed detector, or start a fresh one with the given settings"""
+        state = collection.find_one({"_id": name})
+        if state is None or state["window"] != window or state["std_threshold"] != std_threshold:
+            return cls(window, std_threshold)
+        return cls.from_state(state)
+
+def _feed_new_readings(detector, collection, sensor_id, since):
+    """
+    Feed one sensor's readings that the detector has not seen yet.
+
+    Readings are read from the detector's last timestamp on ($gte) and the
+    ones already fed at that timestamp are skipped by _id, so a reading that
+    shares the last timestamp but was inserted after the previous run is not
+    lost. A fresh detector starts at `since`. Readings older than the last
+    timestamp cannot enter the rolling window and are ignored.
+    """
+    start = since if detector.last_timestamp is None else detector.last_timestamp
+    seen = set(detector.last_ids)
+    docs = [
+        doc for doc in collection.find(
+            {"sensor_id": sensor_id, "timestamp": {"$gte": start}},
+            {"_id": 1, "timestamp": 1, "energy_wh": 1}
+        ).sort([("timestamp", 1), ("_id", 1)])
+        if doc["_id"] not in seen and doc.get("energy_wh") is not None
+    ]
+    timestamps = np.array([doc["timestamp"] for doc in docs], dtype="datetime64[ns]")
+    energy = np.array([doc["energy_wh"] for doc in docs], dtype="float64")
+
+    results = detector.update_many(energy, timestamps)
+    if docs:
+        last = docs[-1]["timestamp"]
+        new_ids = [doc["_id"] for doc in docs if doc["timestamp"] == last]
+        detector.last_ids = (detector.last_ids if start == last else []) + new_ids
+        detector.last_timestamp = last
+    results.insert(0, "sensor_id", sensor_id)
+    results.insert(1, "timestamp", timestamps)
+    results.insert(2, "energy_wh", energy)
+    return results
+
+def run_online_detection(name="energy_rolling_zscore", window=24, std_threshold=4.0, sensor_id=None,
+                         warmup=timedelta(hours=48), now=None):
+    """
+    Feed readings that arrived since the last checkpoint, one detector per sensor.
+
+    Each sensor's detector is checkpointed under "<name>:<sensor_id>". A
+    sensor without a checkpoint, or whose checkpoint is older than `warmup`,
+    starts from the readings of the last `warmup` only, so no run replays
+    the full history.
+
+    The new states are not saved here: call the returned checkpoint once the
+    results have been acted on (e.g. their alerts stored), so that a failure
+    in between feeds the same readings again on the next run.
+
+    Args:
+        name (str): Prefix of the checkpoint ids
+        window (int): Readings in each rolling window
+        std_threshold (float): |z| above which a reading is flagged
+        sensor_id: Only run this sensor's detector; every sensor when None
+        warmup (timedelta): Longest history a detector is (re)started from
+        now (datetime): Current time, for the warm-up start
+
+    Returns:
+        tuple: (pd.DataFrame of the new readings with 'sensor_id',
+        'timestamp', 'energy_wh', 'z_score' and 'statistical_anomaly',
+        checkpoint callable saving every detector)
+    """
+    from columnar import sensor_ids
+    from db import get_detector_state_collection, get_energy_collection
+
+    states = get_detector_state_collection()
+    readings = get_energy_collection()
+    since = (now or datetime.now()) - warmup
+    sensors = sensor_ids(readings) if sensor_id is None else [sensor_id]
+
+    detectors = {}
+    batches = []
+    for sensor in sensors:
+        key = f"{name}:{sensor}"
+        detector = RollingZScoreDetector.load(states, key, window, std_threshold)
+        if detector.last_timestamp is not None and detector.last_timestamp < since:
+            detector = RollingZScoreDetector(window, std_threshold)
+        batches.append(_feed_new_readings(detector, readings, sensor, since))
+        detectors[key] = detector
+
+    def checkpoint():
+        for key, detector in detectors.items():
+            detector.save(states, key)
+
+    results = pd.concat(batches, ignore_index=True) if batches else pd.DataFrame(
+        columns=["sensor_id", "timestamp", "energy_wh", "z_score", "statistical_anomaly"])
+    return results, checkpoint
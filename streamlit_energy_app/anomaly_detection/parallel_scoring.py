@@ -0,0 +1,89 @@
+# parallel_scoring.py
+
+import multiprocessing
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import joblib
+import numpy as np
+
+from .scoring import DEFAULT_CHUNK_SIZE, decision_scores
+
+# Worker processes used for large scoring runs. main.py pins torch to one
+# thread per process, so one worker per core does not oversubscribe.
+SCORING_WORKERS = int(os.getenv("SCORING_WORKERS", os.cpu_count() or 1))
+
+# Below this many rows the pool start-up costs more than it saves
+PARALLEL_MIN_ROWS = int(os.getenv("SCORING_PARALLEL_MIN_ROWS", 200_000))
+
+_worker_model = None
+
+def _init_worker(model_path):
+    """Load the model once per worker; joblib memory-maps its arrays read-only"""
+    global _worker_model
+    _worker_model = joblib.load(model_path, mmap_mode="r")
+
+def _score_chunk(start, X):
+    return start, decision_scores(_worker_model, X)
+
+def parallel_decision_scores(model, X, model_path=None, workers=SCORING_WORKERS,
+                             chunk_size=DEFAULT_CHUNK_SIZE, min_rows=PARALLEL_MIN_ROWS,
+                             progress=None):
+    """
+    Score a long series across a process pool, reassembling results in order.
+
+    Each worker memory-maps the same joblib file, so the forest is shared
+    through the page cache instead of being pickled to every process. Small
+    inputs, or workers <= 1, are scored in this process.
+
+    Args:
+        model: Fitted IsolationForest (used directly when scoring in-process)
+        X (array-like): Readings, shape (n,) or (n, n_features)
+        model_path (str): Uncompressed joblib file holding model; when None the
+            model is dumped to a temporary file for the run
+        workers (int): Number of worker processes
+        chunk_size (int): Rows per task
+        min_rows (int): Smallest input that is worth a pool
+        progress (callable): Called with the completed fraction (0-1) after each chunk
+
+    Returns:
+        np.ndarray: Decision scores in input order, identical to decision_scores(model, X)
+    """
+    X = np.asarray(X, dtype="float64")
+    n = len(X)
+    scores = np.empty(n, dtype="float64")
+    starts = list(range(0, n, chunk_size))
+
+    if workers <= 1 or n < min_rows:
+        for done, start in enumerate(starts, 1):
+            scores[start:start + chunk_size] = decision_scores(model, X[start:start + chunk_size])
+            if progress:
+                progress(done / len(starts))
+        return scores
+
+    tmp_dir = None
+    if model_path is None:
+        tmp_dir = tempfile.mkdtemp(prefix="if_model_")
+        model_path = os.path.join(tmp_dir, "model.joblib")
+        joblib.dump(model, model_path)
+
+    try:
+        # spawn: forking a process that runs Streamlit's threads is unsafe
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(starts)),
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(model_path,)
+        ) as pool:
+            futures = [pool.submit(_score_chunk, start, X[start:start + chunk_size]) for start in starts]
+            for done, future in enumerate(as_completed(futures), 1):
+                start, chunk_scores = future.result()
+                scores[start:start + len(chunk_scores)] = chunk_scores
+                if progress:
+                    progress(done / len(starts))
+    finally:
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    return scores
@@ -0,0 +1,71 @@
+# run_length.py
+
+import numpy as np
+import pandas as pd
+
+RUN_EVENT_COLUMNS = ["start_index", "end_index", "length", "start_time", "end_time"]
+
+def run_lengths(mask):
+    """
+    Label the runs of True values in a boolean mask.
+
+    Args:
+        mask (array-like): Boolean flags, e.g. per-reading anomaly flags
+
+    Returns:
+        tuple: (starts, ends, lengths) integer arrays, one entry per run.
+        ends are exclusive, so mask[starts[i]:ends[i]] is the i-th run.
+    """
+    flags = np.asarray(mask, dtype=bool)
+    edges = np.diff(np.concatenate(([0], flags.view(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    return starts, ends, ends - starts
+
+def mark_runs(mask, min_length):
+    """
+    Flag every position that belongs to a run of at least min_length True values.
+
+    Returns:
+        np.ndarray: Boolean array the same length as mask
+    """
+    starts, ends, lengths = run_lengths(mask)
+    keep = lengths >= min_length
+    delta = np.zeros(len(np.asarray(mask)) + 1, dtype=np.int8)
+    delta[starts[keep]] = 1
+    delta[ends[keep]] = -1
+    return np.cumsum(delta[:-1]).astype(bool)
+
+def longest_run(mask):
+    """Length of the longest run of True values, 0 when there is none."""
+    _, _, lengths = run_lengths(mask)
+    return int(lengths.max()) if len(lengths) else 0
+
+def run_events(mask, timestamps=None, min_length=1):
+    """
+    Runs of True values as an event table.
+
+    Args:
+        mask (array-like): Boolean flags
+        timestamps (array-like): Optional timestamps aligned with mask
+        min_length (int): Drop runs shorter than this
+
+    Returns:
+        pd.DataFrame: One row per run with 'start_index', 'end_index'
+        (inclusive), 'length' and, when timestamps are given, 'start_time'
+        and 'end_time'
+    """
+    starts, ends, lengths = run_lengths(mask)
+    keep = lengths >= min_length
+    starts, ends, lengths = starts[keep], ends[keep], lengths[keep]
+
+    events = pd.DataFrame({
+        "start_index": starts,
+        "end_index": ends - 1,
+        "length": lengths,
+    })
+    if timestamps is not None:
+        times = np.asarray(timestamps)
+        events["start_time"] = times[starts]
+        events["end_time"] = times[ends - 1]
+    return events
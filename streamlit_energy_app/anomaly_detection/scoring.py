@@ -0,0 +1,54 @@
+# scoring.py
+
+import numpy as np
+import pandas as pd
+
+# Rows scored per call; bounds the temporary per-chunk arrays
+DEFAULT_CHUNK_SIZE = 100_000
+
+def as_features(model, X):
+    """Shape a feature array the way the model was fitted (with or without feature names)"""
+    X = np.asarray(X, dtype="float64")
+    if X.ndim == 1:
+        X = X.reshape(-1, 1)
+    names = getattr(model, "feature_names_in_", None)
+    if names is not None:
+        return pd.DataFrame(X, columns=names)
+    return X
+
+def decision_scores(model, X, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Isolation Forest decision_function scores in one pass over the trees.
+
+    Equivalent to model.decision_function(X) (score_samples minus offset_),
+    computed chunk by chunk into a preallocated output array.
+
+    Args:
+        model: Fitted IsolationForest
+        X (array-like): Readings, shape (n,) or (n, n_features)
+        chunk_size (int): Maximum rows per scoring call
+
+    Returns:
+        np.ndarray: One score per row; below zero means anomalous
+    """
+    X = np.asarray(X, dtype="float64")
+    n = len(X)
+    scores = np.empty(n, dtype="float64")
+    for start in range(0, n, chunk_size):
+        stop = min(start + chunk_size, n)
+        scores[start:stop] = model.score_samples(as_features(model, X[start:stop])) - model.offset_
+    return scores
+
+def labels_from_scores(scores):
+    """Labels as model.predict returns them: -1 for anomalies (score < 0), 1 otherwise"""
+    return np.where(np.asarray(scores) < 0, -1, 1)
+
+def score_and_label(model, X, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Scores and labels from a single walk of the forest.
+
+    Returns:
+        tuple: (decision scores, labels), matching decision_function and predict
+    """
+    scores = decision_scores(model, X, chunk_size)
+    return scores, labels_from_scores(scores)
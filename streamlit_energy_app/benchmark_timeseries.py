@@ -0,0 +1,125 @@
+"""
+Compare energy_data query latency in a regular and a time-series collection.
+
+Loads the same synthetic minute-level readings into both layouts in a
+scratch database on a local mongod, then times the app's query shapes:
+a columnar range scan (as the repository loads series), a single-sensor
+range scan and a daily $group. The scratch database is dropped at the end.
+
+    python benchmark_timeseries.py --rows 1000000 --sensors 4
+"""
+import argparse
+import statistics
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from pymongo import ASCENDING, IndexModel, MongoClient
+
+from columnar import fetch_energy_columns
+from db import energy_timeseries_options
+
+def generate_readings(rows, sensors, start):
+    """Minute-level readings with a daily cycle, round-robin across sensors."""
+    minutes = np.arange(rows) // sensors
+    hours = (minutes % 1440) / 60
+    energy = 200 + 150 * np.sin((hours - 6) * np.pi / 12) + np.random.default_rng(0).normal(0, 20, rows)
+    for i in range(rows):
+        yield {
+            "timestamp": start + timedelta(minutes=int(minutes[i])),
+            "sensor_id": f"sensor_{i % sensors}",
+            "energy_wh": float(energy[i]),
+        }
+
+def load(collection, readings, batch_size=10000):
+    batch = []
+    for doc in readings:
+        batch.append(doc)
+        if len(batch) == batch_size:
+            collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        collection.insert_many(batch, ordered=False)
+
+def timed(fn, repeat):
+    """Median wall time in milliseconds over repeat runs, after one warm-up."""
+    fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+def query_shapes(start, end):
+    week_start = end - timedelta(days=7)
+    daily_group = [
+        {"$match": {"timestamp": {"$gte": start, "$lt": end}}},
+        {"$group": {
+            "_id": {"$dateTrunc": {"date": "$timestamp", "unit": "day"}},
+            "sum": {"$sum": "$energy_wh"},
+            "count": {"$sum": 1},
+        }},
+        {"$sort": {"_id": 1}},
+    ]
+    return {
+        "range scan (7 days, columnar)": lambda c: fetch_energy_columns(
+            c, {"timestamp": {"$gte": week_start, "$lt": end}}),
+        "range scan (full, columnar)": lambda c: fetch_energy_columns(
+            c, {"timestamp": {"$gte": start, "$lt": end}}),
+        "sensor range scan (7 days)": lambda c: list(c.find(
+            {"sensor_id": "sensor_0", "timestamp": {"$gte": week_start, "$lt": end}},
+            {"_id": 0, "timestamp": 1, "energy_wh": 1}).sort("timestamp", 1)),
+        "$group by day": lambda c: list(c.aggregate(daily_group, allowDiskUse=True)),
+    }
+
+def storage_size(db, name):
+    return db.command("collStats", name)["storageSize"]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark regular vs time-series energy_data")
+    parser.add_argument("--uri", default="mongodb://localhost:27017")
+    parser.add_argument("--db", default="energy_benchmark")
+    parser.add_argument("--rows", type=int, default=500000)
+    parser.add_argument("--sensors", type=int, default=4)
+    parser.add_argument("--granularity", choices=["seconds", "minutes", "hours"], default="minutes")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch database")
+    args = parser.parse_args()
+
+    client = MongoClient(args.uri)
+    db = client[args.db]
+    client.drop_database(args.db)
+
+    start = datetime(2024, 1, 1)
+    end = start + timedelta(minutes=args.rows // args.sensors + 1)
+
+    flat = db["energy_flat"]
+    flat.create_indexes([
+        IndexModel([("timestamp", ASCENDING)], name="timestamp"),
+        IndexModel([("sensor_id", ASCENDING), ("timestamp", ASCENDING)], name="sensor_timestamp"),
+    ])
+    db.create_collection("energy_timeseries", timeseries=energy_timeseries_options(args.granularity))
+    timeseries = db["energy_timeseries"]
+
+    for collection in (flat, timeseries):
+        started = time.perf_counter()
+        load(collection, generate_readings(args.rows, args.sensors, start))
+        print(f"Loaded {args.rows} rows into {collection.name} in {time.perf_counter() - started:.1f}s")
+
+    print()
+    print(f"{'query':34} {'regular ms':>12} {'timeseries ms':>14}")
+    for label, run in query_shapes(start, end).items():
+        flat_ms = timed(lambda: run(flat), args.repeat)
+        ts_ms = timed(lambda: run(timeseries), args.repeat)
+        print(f"{label:34} {flat_ms:12.1f} {ts_ms:14.1f}")
+
+    print()
+    print(f"Storage size: regular {storage_size(db, flat.name) / 1e6:.1f} MB, "
+          f"timeseries {storage_size(db, timeseries.name) / 1e6:.1f} MB")
+
+    if not args.keep:
+        client.drop_database(args.db)
+
+if __name__ == "__main__":
+    main()
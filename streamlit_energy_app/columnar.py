@@ -0,0 +1,157 @@
+import bson
+import numpy as np
+
+# Projection used by every columnar energy read
+ENERGY_PROJECTION = {"_id": 0, "timestamp": 1, "energy_wh": 1}
+
+# Documents per raw batch; large batches amortize the per-batch overhead
+RAW_BATCH_SIZE = 50000
+
+BSON_DATETIME = 0x09
+BSON_DOUBLE = 0x01
+
+def _field_dtype(first, second):
+    """Structured dtype for {first: <8 bytes>, second: <8 bytes>} BSON documents."""
+    return np.dtype([
+        ("length", "<i4"),
+        ("type_a", "u1"), ("name_a", "S10"), (first, "<i8" if first == "timestamp" else "<f8"),
+        ("type_b", "u1"), ("name_b", "S10"), (second, "<i8" if second == "timestamp" else "<f8"),
+        ("terminator", "u1"),
+    ])
+
+# The two layouts a projected {timestamp: date, energy_wh: double} document
+# can have, depending on field order in the stored document. Both are 43 bytes.
+_LAYOUTS = [
+    (_field_dtype("timestamp", "energy_wh"), (BSON_DATETIME, b"timestamp", BSON_DOUBLE, b"energy_wh")),
+    (_field_dtype("energy_wh", "timestamp"), (BSON_DOUBLE, b"energy_wh", BSON_DATETIME, b"timestamp")),
+]
+
+def decode_energy_batch(raw):
+    """
+    Decode a raw BSON batch of projected energy documents into arrays.
+
+    When every document has the same fixed layout (a date and a double) the
+    batch is reinterpreted in place with a NumPy structured dtype, without
+    creating any Python objects. Anything else (int readings, missing
+    fields, extra fields) falls back to bson.decode_all.
+
+    Returns:
+        tuple: (timestamps as datetime64[ns], energy_wh as float64)
+    """
+    for dtype, (type_a, name_a, type_b, name_b) in _LAYOUTS:
+        if len(raw) % dtype.itemsize:
+            continue
+        docs = np.frombuffer(raw, dtype=dtype)
+        if ((docs["length"] == dtype.itemsize).all()
+                and (docs["type_a"] == type_a).all() and (docs["name_a"] == name_a).all()
+                and (docs["type_b"] == type_b).all() and (docs["name_b"] == name_b).all()
+                and (docs["terminator"] == 0).all()):
+            return (
+                docs["timestamp"].astype("datetime64[ms]").astype("datetime64[ns]"),
+                docs["energy_wh"].astype("float64"),
+            )
+
+    return docs_to_columns(bson.decode_all(raw))
+
+def docs_to_columns(docs):
+    """
+    Convert decoded energy documents into arrays.
+
+    Documents without a timestamp are skipped; a missing or null energy_wh
+    becomes NaN, as it does in the DataFrame loaders.
+
+    Returns:
+        tuple: (timestamps as datetime64[ns], energy_wh as float64)
+    """
+    docs = [doc for doc in docs if doc.get("timestamp") is not None]
+    return (
+        np.array([doc["timestamp"] for doc in docs], dtype="datetime64[ns]"),
+        np.array([np.nan if doc.get("energy_wh") is None else doc["energy_wh"] for doc in docs],
+                 dtype="float64"),
+    )
+
+def fetch_energy_columns(collection, query, expected=None):
+    """
+    Fetch readings matching query, sorted by timestamp, as NumPy arrays.
+
+    Raw BSON batches are decoded straight into preallocated datetime64[ns]
+    and float64 arrays instead of building one dict per reading. The arrays
+    grow with the batches, so no separate count is needed. Falls back to a
+    regular cursor if the driver has no raw batch support.
+
+    Args:
+        collection: The energy_data collection
+        query (dict): MongoDB filter
+        expected (int): Row count to preallocate for, when known
+
+    Returns:
+        tuple: (timestamps, energy_wh)
+    """
+    if not hasattr(collection, "find_raw_batches"):
+        return docs_to_columns(collection.find(query, ENERGY_PROJECTION).sort("timestamp", 1))
+
+    capacity = RAW_BATCH_SIZE if expected is None else expected
+    timestamps = np.empty(capacity, dtype="datetime64[ns]")
+    energy = np.empty(capacity, dtype="float64")
+    size = 0
+
+    batches = collection.find_raw_batches(
+        query, ENERGY_PROJECTION, sort=[("timestamp", 1)], batch_size=RAW_BATCH_SIZE)
+    for raw in batches:
+        batch_ts, batch_energy = decode_energy_batch(raw)
+        end = size + len(batch_ts)
+        if end > len(timestamps):
+            # More documents than expected
+            capacity = max(end, 2 * len(timestamps))
+            timestamps = np.resize(timestamps, capacity)
+            energy = np.resize(energy, capacity)
+        timestamps[size:end] = batch_ts
+        energy[size:end] = batch_energy
+        size = end
+
+    if size < len(timestamps):
+        return timestamps[:size].copy(), energy[:size].copy()
+    return timestamps, energy
+
+def sensor_ids(collection):
+    """
+    Sensors with readings in collection, None (no sensor_id) last.
+
+    distinct() on sensor_id is answered from the sensor_id index.
+    """
+    found = [sensor for sensor in collection.distinct("sensor_id") if sensor is not None]
+    return sorted(found, key=str) + [None]
+
+def fetch_sensor_columns(collection, query, fetch=fetch_energy_columns, expected=None):
+    """
+    Fetch readings matching query for every sensor, merged by timestamp.
+
+    Each sensor is read with its own fetch call, so the fast fixed-layout
+    decoding still applies, and the sorted per-sensor columns are merged
+    with a stable sort. Readings sharing a timestamp keep sensor order.
+
+    Args:
+        collection: The readings collection
+        query (dict): MongoDB filter without sensor_id
+        fetch (callable): fetch_energy_columns or energy_buckets.fetch_bucketed_columns
+        expected (int): Row count to preallocate for per sensor, when known
+
+    Returns:
+        tuple: (timestamps, energy_wh, codes as int32, sensors), where
+        sensors[code] is the sensor_id of a reading
+    """
+    sensors = sensor_ids(collection)
+    timestamp_parts, energy_parts, code_parts = [], [], []
+    for code, sensor in enumerate(sensors):
+        timestamps, energy = fetch(collection, {**query, "sensor_id": sensor}, expected=expected)
+        timestamp_parts.append(timestamps)
+        energy_parts.append(energy)
+        code_parts.append(np.full(len(timestamps), code, dtype="int32"))
+
+    timestamps = np.concatenate(timestamp_parts)
+    energy = np.concatenate(energy_parts)
+    codes = np.concatenate(code_parts)
+    if len(sensors) > 1:
+        order = np.argsort(timestamps, kind="stable")
+        timestamps, energy, codes = timestamps[order], energy[order], codes[order]
+    return timestamps, energy, codes, sensors
@@ -1,39 +1,9 @@
 import streamlit as st 
 from require_login import require_login
-from db import get_energy_collection
+from energy_repository import load_energy_range, aggregate_energy_data
+from time_ranges import TIME_RANGE_OPTIONS, resolve_time_range
 import plotly.express as px
 import plotly.graph_objects as go
-from datetime import datetime, timedelta
-import pandas as pd
-import joblib
-import numpy as np
-
-# Cache the data loading function with a shorter TTL
-@st.cache_data(ttl=60)  # Cache for 1 minute
-def load_energy_data(start_time, end_time):
-    """Load energy data from MongoDB with caching"""
-    energy_collection = get_energy_collection()
-    # Optimize query by only fetching needed fields and using proper sort
-    energy_data = list(energy_collection.find(
-        {
-            "timestamp": {
-                "$gte": start_time,
-                "$lte": end_time
-            }
-        },
-        {
-            "_id": 0,
-            "timestamp": 1,
-            "energy_wh": 1
-        }
-    ).sort("timestamp", 1))
-    
-    if not energy_data:
-        return None
-    
-    df = pd.DataFrame(energy_data)
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-    return df
 
 def dashboard_page():
     require_login()
@@ -49,31 +19,16 @@ def dashboard_page():
         st.markdown("### Select Time Range")
         time_range = st.selectbox(
             "Choose a time range",
-            ["Last 24 hours", "Last 7 days", "Last 30 days", "Last 90 days", "All time"],
+            TIME_RANGE_OPTIONS,
             index=4
         )
     
-    # Calculate time range
-    now = datetime.now()
-    if time_range == "Last 24 hours":
-        start_time = now - timedelta(days=1)
-        end_time = now
-    elif time_range == "Last 7 days":
-        start_time = now - timedelta(days=7)
-        end_time = now
-    elif time_range == "Last 30 days":
-        start_time = now - timedelta(days=30)
-        end_time = now
-    elif time_range == "Last 90 days":
-        start_time = now - timedelta(days=90)
-        end_time = now
-    else:  # All time
-        start_time = datetime.min
-        end_time = now
+    # Resolve to minute-aligned boundaries so reruns hit the cache
+    start_time, end_time = resolve_time_range(time_range)
 
     # Load and filter data using the same function as anomalies page
-    df = load_energy_data(start_time, end_time)
-    if df is None or df.empty:
+    df = load_energy_range(start_time, end_time)
+    if df.empty:
         st.warning("No energy data available.")
         return
 
@@ -143,15 +98,14 @@ def dashboard_page():
     )
     st.plotly_chart(fig, use_container_width=True)
 
-    # Daily summary and patterns
+    # Daily summary and patterns, bucketed on the server
+    daily = aggregate_energy_data(start_time, end_time, "day", ("sum", "count"))
+
     col1, col2 = st.columns(2)
     
     with col1:
         st.markdown("### Daily Energy Summary")
-        # Fix for resampling issue
-        df_daily = df.copy()
-        df_daily.set_index('timestamp', inplace=True)
-        daily_summary = df_daily.resample('D')['energy_wh'].sum().reset_index()
+        daily_summary = daily[['timestamp', 'sum']].copy()
         daily_summary['timestamp'] = daily_summary['timestamp'].dt.date
         daily_summary.columns = ['Date', 'Total Energy (kWh)']
         daily_summary['Total Energy (kWh)'] = daily_summary['Total Energy (kWh)'] / 1000
@@ -172,8 +126,8 @@ def dashboard_page():
 
     with col2:
         st.markdown("### Weekly Patterns")
-        df["day_of_week"] = df["timestamp"].dt.day_name()
-        avg_by_day = df.groupby("day_of_week")["energy_wh"].mean()
+        by_day = daily.groupby(daily["timestamp"].dt.day_name())[["sum", "count"]].sum()
+        avg_by_day = by_day["sum"] / by_day["count"]
         avg_by_day = avg_by_day.reindex(["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"])
         
         fig = px.bar(
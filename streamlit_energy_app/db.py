@@ -1,42 +1,130 @@
-from dotenv import load_dotenv
-from pymongo import MongoClient 
-import streamlit as st
-import pandas as pd 
-import os
-
-load_dotenv()
-
-@st.cache_resource
-def get_mongo_client():
-    return MongoClient(os.getenv('MONGO_URI'))
-
-
-def get_db():
-    return get_mongo_client()[os.getenv("MONGO_DB")]
-
-def get_user_collection():
-    return get_db()[os.getenv("MONGO_USERS_COLLECTION", "users")]
-
-def get_alerts_collection():
-    return get_db()[os.getenv("MONGO_ALERTS_COLLECTION", "alerts")]
-
-def get_messages_collection():
-    return get_db()[os.getenv("MONGO_MESSAGES_COLLECTION", "messages")]
-
-def get_communications_collection():
-    return get_db()[os.getenv("MONGO_COMMUNICATIONS_COLLECTION", "communications")]
-
-def get_energy_collection():
-    """Get energy data collection"""
-    return get_db()[os.getenv("MONGO_ENERGY_COLLECTION", "energy_data")]
-
-@st.cache_data(ttl = 300)
-def load_energy_data():
-    """Load energy data from MongoDB and return as a DataFrame."""
-    col = get_db()[os.getenv("MONGO_ENERGY_COLLECTION")]
-    cursor = col.find({}, {"_id":0, "timestamp": 1, "energy_wh": 1})
-    df = pd.DataFrame(list(cursor))
-    if not df.empty:
-        df["timestamp"] = pd.to_datetime(df["timestamp"])
-        df = df.sort_values("timestamp").reset_index(drop = True)
-    return df 
+from dotenv import load_dotenv
+from pymongo import MongoClient 
+import streamlit as st
+import os
+
+load_dotenv()
+
+@st.cache_resource
+def get_mongo_client():
+    return MongoClient(os.getenv('MONGO_URI'))
+
+
+def get_db():
+    return get_mongo_client()[os.getenv("MONGO_DB")]
+
+def get_user_collection():
+    return get_db()[os.getenv("MONGO_USERS_COLLECTION", "users")]
+
+def get_alerts_collection():
+    return get_db()[os.getenv("MONGO_ALERTS_COLLECTION", "alerts")]
+
+def get_messages_collection():
+    return get_db()[os.getenv("MONGO_MESSAGES_COLLECTION", "messages")]
+
+def get_communications_collection():
+    return get_db()[os.getenv("MONGO_COMMUNICATIONS_COLLECTION", "communications")]
+
+def get_energy_collection():
+    """Get energy data collection"""
+    return get_db()[os.getenv("MONGO_ENERGY_COLLECTION", "energy_data")]
+
+# Rollup collections maintained by rollups.refresh_rollups
+ROLLUP_COLLECTIONS = {
+    "hour": ("MONGO_ENERGY_HOURLY_COLLECTION", "energy_hourly"),
+    "day": ("MONGO_ENERGY_DAILY_COLLECTION", "energy_daily"),
+    "month": ("MONGO_ENERGY_MONTHLY_COLLECTION", "energy_monthly"),
+    # Per-sensor hours, the level every combined rollup is built from
+    "sensor_hour": ("MONGO_ENERGY_SENSOR_HOURLY_COLLECTION", "energy_sensor_hourly"),
+}
+
+def get_rollup_collection(granularity):
+    """Get the per-sensor hourly, hourly, daily or monthly energy rollup collection"""
+    env_name, default = ROLLUP_COLLECTIONS[granularity]
+    return get_db()[os.getenv(env_name, default)]
+
+def get_energy_profile_collection():
+    """Get the per-sensor hour-of-week energy baselines built from the hourly rollups"""
+    return get_db()[os.getenv("MONGO_ENERGY_PROFILE_COLLECTION", "energy_profiles")]
+
+def get_rollup_state_collection():
+    return get_db()[os.getenv("MONGO_ROLLUP_STATE_COLLECTION", "energy_rollup_state")]
+
+# "flat" stores one document per reading in energy_data; "bucketed" packs
+# readings into per-sensor hour or day documents (see energy_buckets.py)
+ENERGY_STORAGE_MODE = os.getenv("ENERGY_STORAGE_MODE", "flat")
+ENERGY_BUCKET_GRANULARITY = os.getenv("ENERGY_BUCKET_GRANULARITY", "hour")
+
+def get_energy_bucket_collection():
+    """Get the bucketed energy readings collection"""
+    return get_db()[os.getenv("MONGO_ENERGY_BUCKET_COLLECTION", "energy_buckets")]
+
+# Native time-series layout for energy_data (MongoDB 5.0+). Opt-in: "true"
+# creates the collection as time-series when it does not exist yet and the
+# server supports it; the default "false" always uses a regular collection.
+# Time-series collections have no _id index and no change streams, so the
+# _id checkpoints (rollups, snapshots) scan and alert_worker cannot run.
+ENERGY_TIMESERIES = os.getenv("ENERGY_TIMESERIES", "false")
+ENERGY_TIMESERIES_GRANULARITY = os.getenv("ENERGY_TIMESERIES_GRANULARITY", "minutes")
+
+def energy_timeseries_options(granularity=ENERGY_TIMESERIES_GRANULARITY):
+    """Time-series options used for energy_data"""
+    return {"timeField": "timestamp", "metaField": "sensor_id", "granularity": granularity}
+
+def server_supports_timeseries(client=None):
+    """True when the MongoDB server is 5.0 or newer"""
+    client = client or get_mongo_client()
+    version = client.server_info()["versionArray"]
+    return tuple(version[:2]) >= (5, 0)
+
+def get_energy_collection_type():
+    """Return 'timeseries' or 'collection' for energy_data, or None if it does not exist"""
+    name = get_energy_collection().name
+    for info in get_db().list_collections(filter={"name": name}):
+        return info.get("type", "collection")
+    return None
+
+def setup_energy_collection():
+    """
+    Create energy_data as a time-series collection when ENERGY_TIMESERIES=true.
+
+    Must run before anything writes to energy_data or creates an index on
+    it, since either would create a regular collection implicitly. An
+    existing regular collection is left alone; convert it with
+    `python timeseries_migration.py`.
+
+    Returns:
+        str: 'timeseries' or 'collection', the layout energy_data now has
+    """
+    existing = get_energy_collection_type()
+    if existing is not None:
+        return existing
+    if ENERGY_TIMESERIES != "true" or not server_supports_timeseries():
+        return "collection"
+    get_db().create_collection(
+        get_energy_collection().name, timeseries=energy_timeseries_options())
+    return "timeseries"
+
+def get_anomaly_scores_collection():
+    """Get the persisted per-reading anomaly scores"""
+    return get_db()[os.getenv("MONGO_ANOMALY_SCORES_COLLECTION", "anomaly_scores")]
+
+def get_score_sketch_collection():
+    """Get the per-model-version anomaly score quantile sketches"""
+    return get_db()[os.getenv("MONGO_SCORE_SKETCH_COLLECTION", "anomaly_score_sketches")]
+
+def get_detector_state_collection():
+    """Get checkpoints of the online anomaly detectors"""
+    return get_db()[os.getenv("MONGO_DETECTOR_STATE_COLLECTION", "detector_state")]
+
+def get_training_jobs_collection():
+    """Get the Isolation Forest training job records"""
+    return get_db()[os.getenv("MONGO_TRAINING_JOBS_COLLECTION", "training_jobs")]
+
+def get_job_locks_collection():
+    """Get the scheduler's per-job lease documents"""
+    return get_db()[os.getenv("MONGO_JOB_LOCKS_COLLECTION", "job_locks")]
+
+def get_job_runs_collection():
+    """Get the history of scheduled job runs"""
+    return get_db()[os.getenv("MONGO_JOB_RUNS_COLLECTION", "job_runs")]
@@ -0,0 +1,220 @@
+import argparse
+from datetime import datetime, timedelta
+
+import bson
+import numpy as np
+from pymongo import ASCENDING, IndexModel, ReplaceOne, UpdateOne
+
+from db import (
+    ENERGY_BUCKET_GRANULARITY,
+    get_energy_collection,
+    get_energy_bucket_collection,
+)
+
+# Indexes the bucket collection needs; the unique key is also the $merge key
+BUCKET_INDEXES = [
+    IndexModel([("sensor_id", ASCENDING), ("bucket_start", ASCENDING)],
+               name="sensor_bucket_start", unique=True),
+    IndexModel([("bucket_start", ASCENDING)], name="bucket_start"),
+    IndexModel([("updated_at", ASCENDING)], name="updated_at"),
+]
+
+BUCKET_PROJECTION = {"_id": 0, "timestamp": 1, "energy_wh": 1}
+
+def bucket_start(ts, granularity=ENERGY_BUCKET_GRANULARITY):
+    """Start of the hour or day bucket containing ts."""
+    if granularity == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def is_aligned(ts, granularity=ENERGY_BUCKET_GRANULARITY):
+    """True when ts is None or falls exactly on a bucket boundary."""
+    return ts is None or bucket_start(ts, granularity) == ts
+
+def bucket_match(query, granularity=ENERGY_BUCKET_GRANULARITY):
+    """
+    Translate a flat-schema reading filter into a bucket filter.
+
+    Supports the filters the loaders issue: an optional sensor_id and a
+    timestamp range using $gt/$gte/$lt. The result selects every bucket that
+    may contain a matching reading; readings still need exact filtering.
+    """
+    match = {}
+    if "sensor_id" in query:
+        match["sensor_id"] = query["sensor_id"]
+    time_filter = query.get("timestamp", {})
+    lower = time_filter.get("$gte", time_filter.get("$gt"))
+    start_filter = {}
+    if lower is not None:
+        start_filter["$gte"] = bucket_start(lower, granularity)
+    if "$lt" in time_filter:
+        start_filter["$lt"] = time_filter["$lt"]
+    if start_filter:
+        match["bucket_start"] = start_filter
+    return match
+
+def unwind_stages():
+    """Pipeline stages turning bucket documents back into one document per reading."""
+    return [
+        {"$project": {
+            "sensor_id": 1,
+            "readings": {"$zip": {"inputs": ["$timestamp", "$energy_wh"]}},
+        }},
+        {"$unwind": "$readings"},
+        {"$project": {
+            "sensor_id": 1,
+            "timestamp": {"$arrayElemAt": ["$readings", 0]},
+            "energy_wh": {"$arrayElemAt": ["$readings", 1]},
+        }},
+    ]
+
+def fetch_bucketed_columns(collection, query, expected=None):
+    """
+    Bucket-schema counterpart of columnar.fetch_energy_columns.
+
+    Reads the buckets that overlap the query, concatenates their arrays and
+    applies the exact timestamp filter in NumPy.
+
+    Returns:
+        tuple: (timestamps as datetime64[ns], energy_wh as float64), sorted
+    """
+    time_filter = query.get("timestamp", {})
+    timestamp_parts = []
+    energy_parts = []
+    batches = collection.find_raw_batches(
+        bucket_match(query), BUCKET_PROJECTION, sort=[("bucket_start", ASCENDING)])
+    for raw in batches:
+        for doc in bson.decode_all(raw):
+            timestamp_parts.append(np.array(doc["timestamp"], dtype="datetime64[ns]"))
+            energy_parts.append(np.array(doc["energy_wh"], dtype="float64"))
+    if not timestamp_parts:
+        return np.empty(0, dtype="datetime64[ns]"), np.empty(0, dtype="float64")
+
+    timestamps = np.concatenate(timestamp_parts)
+    energy = np.concatenate(energy_parts)
+
+    keep = np.ones(len(timestamps), dtype=bool)
+    if "$gte" in time_filter:
+        keep &= timestamps >= np.datetime64(time_filter["$gte"], "ns")
+    if "$gt" in time_filter:
+        keep &= timestamps > np.datetime64(time_filter["$gt"], "ns")
+    if "$lt" in time_filter:
+        keep &= timestamps < np.datetime64(time_filter["$lt"], "ns")
+    timestamps = timestamps[keep]
+    energy = energy[keep]
+
+    # Buckets from different sensors interleave and late readings are
+    # appended at the end of their bucket
+    order = np.argsort(timestamps, kind="stable")
+    return timestamps[order], energy[order]
+
+def insert_readings(readings, granularity=ENERGY_BUCKET_GRANULARITY):
+    """
+    Append readings to their buckets with one bulk write.
+
+    Args:
+        readings (list): Dicts with 'timestamp', 'energy_wh' and optional 'sensor_id'
+
+    Returns:
+        int: Number of buckets touched
+    """
+    now = datetime.now()
+    operations = []
+    for reading in readings:
+        value = float(reading["energy_wh"])
+        operations.append(UpdateOne(
+            {"sensor_id": reading.get("sensor_id"),
+             "bucket_start": bucket_start(reading["timestamp"], granularity)},
+            {
+                "$push": {"timestamp": reading["timestamp"], "energy_wh": value},
+                "$inc": {"count": 1, "sum": value},
+                "$min": {"min": value},
+                "$max": {"max": value},
+                "$set": {"updated_at": now},
+            },
+            upsert=True
+        ))
+    if not operations:
+        return 0
+    result = get_energy_bucket_collection().bulk_write(operations, ordered=True)
+    return result.upserted_count + result.modified_count
+
+def _migration_pipeline(match, granularity):
+    """
+    Stages packing the flat readings matching match into bucket documents.
+
+    A reading without a sensor_id is grouped under sensor_id None, as
+    insert_readings and the rollups do.
+    """
+    return [
+        {"$match": match},
+        {"$sort": {"timestamp": 1}},
+        {"$group": {
+            "_id": {
+                "sensor_id": {"$ifNull": ["$sensor_id", None]},
+                "bucket_start": {"$dateTrunc": {"date": "$timestamp", "unit": granularity}},
+            },
+            "timestamp": {"$push": "$timestamp"},
+            "energy_wh": {"$push": {"$toDouble": "$energy_wh"}},
+            "count": {"$sum": 1},
+            "sum": {"$sum": "$energy_wh"},
+            "min": {"$min": "$energy_wh"},
+            "max": {"$max": "$energy_wh"},
+        }},
+        {"$project": {
+            "_id": 0,
+            "sensor_id": "$_id.sensor_id",
+            "bucket_start": "$_id.bucket_start",
+            "timestamp": 1, "energy_wh": 1,
+            "count": 1, "sum": 1, "min": 1, "max": 1,
+            "updated_at": {"$literal": datetime.now()},
+        }},
+    ]
+
+def migrate_flat_to_buckets(granularity=ENERGY_BUCKET_GRANULARITY, start_time=None, end_time=None):
+    """
+    Pack flat energy_data documents into bucket documents on the server.
+
+    Existing buckets for the same (sensor_id, bucket_start) are replaced, so
+    the migration can be rerun for a range. $merge rejects a null or missing
+    'on' field, so buckets of readings without a sensor_id are built by the
+    same pipeline but written with a bulk upsert instead.
+    """
+    buckets = get_energy_bucket_collection()
+    buckets.create_indexes(BUCKET_INDEXES)
+
+    match = {}
+    if start_time is not None:
+        match.setdefault("timestamp", {})["$gte"] = start_time
+    if end_time is not None:
+        match.setdefault("timestamp", {})["$lt"] = end_time
+
+    readings = get_energy_collection()
+    readings.aggregate(_migration_pipeline({**match, "sensor_id": {"$ne": None}}, granularity) + [
+        {"$merge": {
+            "into": buckets.name,
+            "on": ["sensor_id", "bucket_start"],
+            "whenMatched": "replace",
+            "whenNotMatched": "insert",
+        }},
+    ], allowDiskUse=True)
+
+    operations = [
+        ReplaceOne({"sensor_id": None, "bucket_start": doc["bucket_start"]}, doc, upsert=True)
+        for doc in readings.aggregate(_migration_pipeline({**match, "sensor_id": None}, granularity),
+                                      allowDiskUse=True)
+    ]
+    if operations:
+        buckets.bulk_write(operations, ordered=False)
+    return buckets.count_documents({})
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate flat energy_data documents into time buckets")
+    parser.add_argument("command", choices=["migrate"])
+    parser.add_argument("--granularity", choices=["hour", "day"], default=ENERGY_BUCKET_GRANULARITY)
+    parser.add_argument("--days", type=int, help="Only migrate the last N days")
+    args = parser.parse_args()
+
+    start = datetime.now() - timedelta(days=args.days) if args.days else None
+    total = migrate_flat_to_buckets(args.granularity, start_time=start)
+    print(f"{total} bucket documents in {get_energy_bucket_collection().name}")
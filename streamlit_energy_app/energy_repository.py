@@ -0,0 +1,299 @@
+import pandas as pd
+import streamlit as st
+
+from db import (
+    ENERGY_BUCKET_GRANULARITY,
+    ENERGY_STORAGE_MODE,
+    get_energy_bucket_collection,
+    get_energy_collection,
+    get_energy_collection_type,
+)
+from columnar import fetch_energy_columns
+from energy_buckets import bucket_match, fetch_bucketed_columns, is_aligned, unwind_stages
+from energy_snapshot import EnergySnapshot
+from energy_store import EnergySeriesStore
+from rollups import combine_moments, sample_std
+from time_ranges import split_range
+
+# Bucket sizes accepted by aggregate_energy_data, mapped to $dateTrunc units
+AGGREGATE_BUCKETS = {
+    "hour": "hour",
+    "day": "day",
+    "week": "week",
+    "month": "month",
+}
+
+# Statistics accepted by aggregate_energy_data, mapped to $group accumulators
+AGGREGATE_STATS = {
+    "sum": {"$sum": "$energy_wh"},
+    "mean": {"$avg": "$energy_wh"},
+    "min": {"$min": "$energy_wh"},
+    "max": {"$max": "$energy_wh"},
+    "std": {"$stdDevSamp": "$energy_wh"},
+    "count": {"$sum": 1},
+}
+
+# Bucket sizes that can be answered from the per-document stats of hour or
+# day storage buckets without unwinding the reading arrays
+STORED_STATS_BUCKETS = {
+    "hour": {"hour", "day", "week", "month"},
+    "day": {"day", "week", "month"},
+}
+
+# Accumulators over stored bucket stats; mean and std are derived afterwards
+STORED_STATS = {
+    "sum": {"$sum": "$sum"},
+    "count": {"$sum": "$count"},
+    "min": {"$min": "$min"},
+    "max": {"$max": "$max"},
+}
+
+def build_energy_match(start_time=None, end_time=None, sensor_id=None):
+    """Build the filter for readings in [start_time, end_time), optionally for one sensor."""
+    match = {}
+    if sensor_id is not None:
+        match["sensor_id"] = sensor_id
+    time_filter = {}
+    if start_time is not None:
+        time_filter["$gte"] = start_time
+    if end_time is not None:
+        time_filter["$lt"] = end_time
+    if time_filter:
+        match["timestamp"] = time_filter
+    return match
+
+def _date_trunc(field, bucket):
+    date_trunc = {"date": field, "unit": AGGREGATE_BUCKETS[bucket]}
+    if bucket == "week":
+        date_trunc["startOfWeek"] = "monday"
+    return {"$dateTrunc": date_trunc}
+
+def _reading_pipeline(start_time, end_time, bucket, stats, sensor_id):
+    """Group individual readings, unwinding bucket documents first in bucketed mode."""
+    match = build_energy_match(start_time, end_time, sensor_id)
+    group = {"_id": _date_trunc("$timestamp", bucket)}
+    for stat in stats:
+        group[stat] = AGGREGATE_STATS[stat]
+
+    if ENERGY_STORAGE_MODE == "bucketed":
+        stages = [{"$match": bucket_match(match)}, *unwind_stages(), {"$match": match}]
+    else:
+        stages = [{"$match": match}]
+    return stages + [{"$group": group}, {"$sort": {"_id": 1}}]
+
+def _stored_stats_pipeline(start_time, end_time, bucket, stats, sensor_id):
+    """
+    Combine the count/sum/min/max kept on each storage bucket.
+
+    For std each bucket contributes its mean and squared deviations (from
+    its own readings), which are merged with rollups.combine_moments.
+    """
+    group = {"_id": _date_trunc("$bucket_start", bucket)}
+    group.update(STORED_STATS)
+
+    derived = {stat: 1 for stat in stats if stat in STORED_STATS}
+    if "mean" in stats:
+        derived["mean"] = {"$divide": ["$sum", "$count"]}
+    if "std" in stats:
+        bucket_std = {"$stdDevPop": "$energy_wh"}
+        group["parts"] = {"$push": {
+            "count": "$count",
+            "mean": {"$divide": ["$sum", "$count"]},
+            "m2": {"$multiply": [bucket_std, bucket_std, "$count"]},
+        }}
+        derived["std"] = {"$let": {
+            "vars": {"moments": combine_moments("$parts")},
+            "in": sample_std("$$moments.m2", "$$moments.count"),
+        }}
+
+    return [
+        {"$match": bucket_match(build_energy_match(start_time, end_time, sensor_id))},
+        {"$group": group},
+        {"$project": derived},
+        {"$sort": {"_id": 1}},
+    ]
+
+def _uses_stored_stats(start_time, end_time, bucket):
+    """True when whole storage buckets cover the range and nest in the output bucket."""
+    return (
+        ENERGY_STORAGE_MODE == "bucketed"
+        and bucket in STORED_STATS_BUCKETS[ENERGY_BUCKET_GRANULARITY]
+        and is_aligned(start_time) and is_aligned(end_time)
+    )
+
+@st.cache_data(ttl = 60)
+def _load_energy_tail(tail_start, tail_end, sensor_id):
+    """Readings in the current, still-filling hour, straight from MongoDB."""
+    query = build_energy_match(tail_start, tail_end, sensor_id)
+    if ENERGY_STORAGE_MODE == "bucketed":
+        timestamps, energy = fetch_bucketed_columns(get_energy_bucket_collection(), query)
+    else:
+        timestamps, energy = fetch_energy_columns(get_energy_collection(), query, expected=0)
+    return pd.DataFrame({"timestamp": timestamps, "energy_wh": energy})
+
+@st.cache_data(ttl = 300)
+def _aggregate(start_time, end_time, bucket, stats, sensor_id, change_marker):
+    """Run the bucket pipeline; change_marker is only part of the cache key."""
+    if _uses_stored_stats(start_time, end_time, bucket):
+        pipeline = _stored_stats_pipeline(start_time, end_time, bucket, stats, sensor_id)
+        collection = get_energy_bucket_collection()
+    else:
+        pipeline = _reading_pipeline(start_time, end_time, bucket, stats, sensor_id)
+        collection = (get_energy_bucket_collection() if ENERGY_STORAGE_MODE == "bucketed"
+                      else get_energy_collection())
+    rows = list(collection.aggregate(pipeline, allowDiskUse=True))
+
+    df = pd.DataFrame(rows, columns=["_id", *stats])
+    df = df.rename(columns={"_id": "timestamp"})
+    df["timestamp"] = pd.to_datetime(df["timestamp"])
+    return df
+
+class EnergyRepository:
+    """
+    Single access point for energy readings.
+
+    Raw series are held once per process, in one EnergySeriesStore for all
+    sensors (seeded from the Parquet snapshot); a sensor's series is a
+    filter over it. Range queries slice the held arrays after an
+    incremental refresh; bucket queries run on the MongoDB server and are
+    cached on the collection's change marker, which one indexed find_one
+    reads without touching the store.
+
+    With ENERGY_STORAGE_MODE=bucketed the store reads the energy_buckets
+    collection instead and the Parquet snapshot is not used.
+    """
+
+    def __init__(self, storage_mode=ENERGY_STORAGE_MODE):
+        self.storage_mode = storage_mode
+        if storage_mode == "bucketed":
+            source = {"fetch": fetch_bucketed_columns,
+                      "change_field": "updated_at", "change_time_field": "bucket_start"}
+            snapshot = None
+        else:
+            # Time-series collections have no _id index to find late readings with
+            timeseries = get_energy_collection_type() == "timeseries"
+            source = {"fetch": fetch_energy_columns,
+                      "change_field": None if timeseries else "_id"}
+            snapshot = EnergySnapshot()
+        # Field whose newest value changes with every write, for cache keys
+        self._marker_field = source["change_field"] or "timestamp"
+        self._store = EnergySeriesStore(snapshot=snapshot, **source)
+
+    def _collection(self):
+        if self.storage_mode == "bucketed":
+            return get_energy_bucket_collection()
+        return get_energy_collection()
+
+    def refresh(self):
+        """Fetch readings newer than the ones held."""
+        self._store.refresh(self._collection())
+        return self._store
+
+    def change_marker(self):
+        """
+        Newest _id (flat), updated_at (bucketed) or timestamp (time-series) on the server.
+
+        One find_one on an index; it changes whenever readings are written,
+        so it keys caches of server-side results without loading any series.
+        """
+        doc = self._collection().find_one(
+            {}, {self._marker_field: 1}, sort=[(self._marker_field, -1)])
+        return str(doc[self._marker_field]) if doc else None
+
+    def fingerprint(self):
+        """
+        Cheap identity of the held series: watermark, row count and revision.
+
+        It changes whenever readings are added or replaced or the store
+        reloads, so it can stand in for the data in cache keys. It does not
+        refresh; take it after loading the data it stands for.
+        """
+        store = self._store
+        return f"{store.watermark}:{len(store)}:{store.revision}"
+
+    def get_series(self, start_time=None, end_time=None, sensor_id=None):
+        """
+        Readings in [start_time, end_time), sorted by timestamp.
+
+        Args:
+            sensor_id (str): Only this sensor's readings, or None for all
+
+        Returns:
+            pd.DataFrame: 'timestamp' and 'energy_wh' columns, owned by the caller
+        """
+        return self.refresh().to_frame(start_time, end_time, sensor_id)
+
+    def get_range(self, start_time, end_time, sensor_id=None):
+        """
+        Readings in [start_time, end_time) as a held prefix plus a cached tail.
+
+        The range is split with time_ranges.split_range. The hour-aligned
+        prefix is sliced from the held series, which is only refreshed when
+        it does not reach the prefix end yet (at most once an hour for a
+        sliding range). The tail, the current hour up to end_time, is a small
+        query cached for a minute, so repeated renders of the same resolved
+        range (see time_ranges.resolve_time_range) run no query at all.
+
+        Returns:
+            pd.DataFrame: 'timestamp' and 'energy_wh' columns, owned by the caller
+        """
+        prefix_start, prefix_end, tail_start, tail_end = split_range(start_time, end_time)
+        store = self._store
+        if store.watermark is None or store.watermark < prefix_end:
+            store = self.refresh()
+        df = pd.concat(
+            [store.to_frame(prefix_start, prefix_end, sensor_id),
+             _load_energy_tail(tail_start, tail_end, sensor_id)],
+            ignore_index=True
+        )
+        if start_time is not None:
+            df = df[df["timestamp"] >= start_time].reset_index(drop=True)
+        return df
+
+    def get_buckets(self, start_time=None, end_time=None, bucket="day", stats=("sum",), sensor_id=None):
+        """
+        Aggregate readings into time buckets on the MongoDB server.
+
+        The grouping runs as a $group/$dateTrunc pipeline (MongoDB 5.0+), so
+        only one row per bucket crosses the wire. Results are cached until
+        the collection's change marker moves.
+
+        Args:
+            start_time (datetime): Inclusive range start, or None for no lower bound
+            end_time (datetime): Exclusive range end, or None for no upper bound
+            bucket (str): One of 'hour', 'day', 'week' (starting Monday) or 'month'
+            stats (tuple): Any of 'sum', 'mean', 'min', 'max', 'std', 'count'
+            sensor_id (str): Restrict to one sensor, or None for all
+
+        Returns:
+            pd.DataFrame: A 'timestamp' column holding each bucket start plus one
+            column per requested stat, sorted by timestamp. Empty buckets are omitted.
+        """
+        if bucket not in AGGREGATE_BUCKETS:
+            raise ValueError(f"Unknown bucket: {bucket}")
+        unknown = [stat for stat in stats if stat not in AGGREGATE_STATS]
+        if unknown:
+            raise ValueError(f"Unknown stats: {', '.join(unknown)}")
+        return _aggregate(start_time, end_time, bucket, tuple(stats), sensor_id,
+                          self.change_marker())
+
+@st.cache_resource
+def get_energy_repository():
+    """Process-wide repository shared by every session."""
+    return EnergyRepository()
+
+def load_energy_data(start_time=None, end_time=None, sensor_id=None):
+    """Load readings in [start_time, end_time) as a DataFrame."""
+    return get_energy_repository().get_series(start_time, end_time, sensor_id)
+
+def load_energy_range(start_time, end_time, sensor_id=None):
+    """Load readings in a resolved [start_time, end_time); see EnergyRepository.get_range."""
+    return get_energy_repository().get_range(start_time, end_time, sensor_id)
+
+def energy_fingerprint():
+    """Watermark, row count and revision of the held readings; see EnergyRepository.fingerprint."""
+    return get_energy_repository().fingerprint()
+
+def aggregate_energy_data(start_time=None, end_time=None, bucket="day", stats=("sum",), sensor_id=None):
+    """Bucketed statistics for [start_time, end_time); see EnergyRepository.get_buckets."""
+    return get_energy_repository().get_buckets(start_time, end_time, bucket, stats, sensor_id)
@@ -0,0 +1,246 @@
+import argparse
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from bson import ObjectId
+
+from columnar import fetch_sensor_columns
+
+SNAPSHOT_DIR = os.getenv(
+    "ENERGY_SNAPSHOT_DIR",
+    os.path.join(os.path.dirname(__file__), "snapshots", "energy")
+)
+
+MANIFEST_NAME = "manifest.json"
+
+# Bumped when the partition layout changes; older snapshots are rebuilt
+MANIFEST_VERSION = 2
+
+def month_start(ts):
+    """First instant of the month containing ts."""
+    return datetime(ts.year, ts.month, 1)
+
+def next_month(ts):
+    """First instant of the month after the one containing ts."""
+    return datetime(ts.year + ts.month // 12, ts.month % 12 + 1, 1)
+
+def month_key(ts):
+    return ts.strftime("%Y-%m")
+
+class EnergySnapshot:
+    """
+    Local Parquet snapshot of closed months of energy_data.
+
+    Each closed month is written to its own partition file with a sensor
+    code column. The manifest records which months are covered, their row
+    counts and sensor_id per code, and the newest _id
+    seen when the snapshot was last checked; any document inserted after
+    that _id whose timestamp falls in a closed month marks that month stale.
+    The still-open month is never snapshotted and always comes from MongoDB.
+    """
+
+    def __init__(self, directory=SNAPSHOT_DIR, memory_map=True):
+        self.directory = directory
+        self.memory_map = memory_map
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.directory, MANIFEST_NAME)
+
+    def partition_path(self, key):
+        return os.path.join(self.directory, f"energy_{key}.parquet")
+
+    def exists(self):
+        """True once compact() has written a manifest."""
+        return os.path.exists(self.manifest_path)
+
+    def signature(self):
+        """Modification time of the manifest, or None; changes with every compact()."""
+        try:
+            return os.stat(self.manifest_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def read_manifest(self):
+        """The manifest, or an empty one when missing or written in an older layout."""
+        empty = {"version": MANIFEST_VERSION, "partitions": {}, "covered_until": None, "max_id": None}
+        if not self.exists():
+            return empty
+        with open(self.manifest_path) as f:
+            manifest = json.load(f)
+        return manifest if manifest.get("version") == MANIFEST_VERSION else empty
+
+    def _write_manifest(self, manifest):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def write_partition(self, collection, start):
+        """
+        Write one closed month from MongoDB to its partition file.
+
+        Returns:
+            dict: The partition's manifest entry, its row count and sensors
+        """
+        end = next_month(start)
+        timestamps, energy, codes, sensors = fetch_sensor_columns(
+            collection, {"timestamp": {"$gte": start, "$lt": end}})
+        table = pa.table({
+            "timestamp": pa.array(timestamps, type=pa.timestamp("ns")),
+            "energy_wh": pa.array(energy),
+            "sensor": pa.array(codes, type=pa.int32()),
+        })
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.partition_path(month_key(start))
+        tmp_path = path + ".tmp"
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, path)
+        return {"rows": len(timestamps), "sensors": sensors}
+
+    def _newest_id(self, collection):
+        doc = collection.find_one({}, {"_id": 1}, sort=[("_id", -1)])
+        return doc["_id"] if doc else None
+
+    def stale_partitions(self, collection, manifest=None):
+        """
+        Closed months that received documents since the snapshot was checked.
+
+        Uses the _id index: only documents inserted after the manifest's
+        max_id are examined.
+        """
+        manifest = manifest or self.read_manifest()
+        if not manifest["max_id"] or not manifest["covered_until"]:
+            return []
+        covered_until = datetime.fromisoformat(manifest["covered_until"])
+        pipeline = [
+            {"$match": {
+                "_id": {"$gt": ObjectId(manifest["max_id"])},
+                "timestamp": {"$lt": covered_until},
+            }},
+            {"$group": {"_id": {"$dateTrunc": {"date": "$timestamp", "unit": "month"}}}},
+        ]
+        return sorted(row["_id"] for row in collection.aggregate(pipeline))
+
+    def compact(self, collection, now=None):
+        """
+        Bring the snapshot up to date.
+
+        Writes every closed month that has no partition yet, rewrites months
+        that received late data and records the new coverage in the manifest.
+
+        Returns:
+            list: Month keys that were (re)written
+        """
+        now = now or datetime.now()
+        manifest = self.read_manifest()
+        covered_until = month_start(now)
+        # Read the newest _id before writing so that anything inserted while
+        # compacting is re-examined on the next check.
+        newest_id = self._newest_id(collection)
+        if newest_id is None:
+            return []
+
+        months = set(self.stale_partitions(collection, manifest))
+        first = collection.find_one(
+            {"timestamp": {"$lt": covered_until}},
+            {"_id": 0, "timestamp": 1},
+            sort=[("timestamp", 1)]
+        )
+        if first:
+            start = month_start(first["timestamp"])
+            while start < covered_until:
+                if month_key(start) not in manifest["partitions"]:
+                    months.add(start)
+                start = next_month(start)
+
+        written = []
+        for start in sorted(months):
+            manifest["partitions"][month_key(start)] = self.write_partition(collection, start)
+            written.append(month_key(start))
+
+        manifest["covered_until"] = covered_until.isoformat()
+        manifest["max_id"] = str(newest_id)
+        self._write_manifest(manifest)
+        return written
+
+    def load(self):
+        """
+        Read every partition into sorted timestamp, energy and sensor code arrays.
+
+        The timestamp and energy columns are converted to NumPy once,
+        without a further cast, so the store can hold them as they are.
+        Sensor codes are renumbered into one list across partitions.
+
+        Returns:
+            tuple: (timestamps as datetime64[ns], energy_wh as float64, codes
+            as int32, sensor_id per code, covered_until as an ISO string or None)
+        """
+        manifest = self.read_manifest()
+        sensors, sensor_codes, tables, code_parts = [], {}, [], []
+        for key in sorted(manifest["partitions"]):
+            table = pq.read_table(self.partition_path(key), memory_map=self.memory_map)
+            lookup = []
+            for sensor in manifest["partitions"][key]["sensors"]:
+                if sensor not in sensor_codes:
+                    sensor_codes[sensor] = len(sensors)
+                    sensors.append(sensor)
+                lookup.append(sensor_codes[sensor])
+            codes = table.column("sensor").to_numpy()
+            code_parts.append(np.asarray(lookup, dtype="int32")[codes] if len(codes) else codes)
+            tables.append(table)
+        if not tables:
+            return (np.empty(0, dtype="datetime64[ns]"), np.empty(0, dtype="float64"),
+                    np.empty(0, dtype="int32"), sensors, manifest["covered_until"])
+        table = pa.concat_tables(tables)
+        return (
+            np.asarray(table.column("timestamp").to_numpy(), dtype="datetime64[ns]"),
+            np.asarray(table.column("energy_wh").to_numpy(), dtype="float64"),
+            np.concatenate(code_parts).astype("int32", copy=False),
+            sensors,
+            manifest["covered_until"],
+        )
+
+def compact_snapshot():
+    """
+    Compact the default snapshot from energy_data; run by the scheduler.
+
+    Only flat storage uses the snapshot, so this does nothing in bucketed mode.
+
+    Returns:
+        list: Month keys that were (re)written
+    """
+    from db import ENERGY_STORAGE_MODE, get_energy_collection
+
+    if ENERGY_STORAGE_MODE != "flat":
+        return []
+    return EnergySnapshot().compact(get_energy_collection())
+
+def main():
+    from db import get_energy_collection
+
+    parser = argparse.ArgumentParser(description="Manage the local energy_data Parquet snapshot")
+    parser.add_argument("command", choices=["compact", "status"])
+    parser.add_argument("--dir", default=SNAPSHOT_DIR, help="Snapshot directory")
+    args = parser.parse_args()
+
+    snapshot = EnergySnapshot(args.dir)
+    if args.command == "compact":
+        written = snapshot.compact(get_energy_collection())
+        print(f"Wrote {len(written)} partition(s): {', '.join(written) or 'none'}")
+    else:
+        manifest = snapshot.read_manifest()
+        rows = sum(p["rows"] for p in manifest["partitions"].values())
+        print(f"Partitions: {len(manifest['partitions'])}, rows: {rows}, "
+              f"covered until: {manifest['covered_until']}")
+        stale = snapshot.stale_partitions(get_energy_collection(), manifest)
+        print(f"Stale partitions: {', '.join(month_key(s) for s in stale) or 'none'}")
+
+if __name__ == "__main__":
+    main()
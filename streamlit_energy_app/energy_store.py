@@ -0,0 +1,246 @@
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from columnar import fetch_energy_columns, fetch_sensor_columns
+
+class EnergySeriesStore:
+    """
+    Process-wide, append-only in-memory copy of the energy series.
+
+    Timestamps, readings and sensor codes (indexes into sensors) are kept in
+    sorted NumPy arrays with spare capacity at the end. Every sensor lives
+    in the same arrays, so the series is held once per process and a
+    sensor's readings are a filter over it.
+
+    A refresh only asks MongoDB for documents at or after the last
+    timestamp already held (the watermark): the readings held at the
+    watermark are dropped and fetched again together with the new ones, so
+    a reading that shares the watermark's timestamp but arrived after the
+    last refresh (e.g. from another sensor) is not lost, and nothing is
+    held twice. Its cost scales with new data rather than with history size.
+
+    Late readings (timestamp before the watermark) are found through
+    change_field, a field that grows with every write: '_id' for flat
+    readings, 'updated_at' for storage buckets. Documents changed since the
+    last refresh are grouped for their earliest change_time_field value and
+    everything held from that point on is fetched again. With change_field
+    None late readings only appear after reset().
+
+    fetch reads (timestamps, energy) columns for a query and is called once
+    per sensor (see columnar.fetch_sensor_columns); it defaults to the
+    flat-schema reader and is swapped for the bucket reader in bucketed mode.
+    When an EnergySnapshot is attached, the closed months it covers are held
+    as a read-only base segment straight from its Parquet partitions and
+    only later readings are read from MongoDB. A refresh never writes the
+    snapshot; it reloads the base when the manifest changes, i.e. after
+    `python energy_snapshot.py compact` or the scheduled compaction. Late
+    readings in snapshotted months appear after that compaction.
+    """
+
+    def __init__(self, refresh_interval=30, initial_capacity=1024, snapshot=None,
+                 fetch=fetch_energy_columns, change_field=None, change_time_field="timestamp"):
+        self.refresh_interval = refresh_interval
+        self.snapshot = snapshot
+        self.fetch = fetch
+        self.change_field = change_field
+        self.change_time_field = change_time_field
+        self.revision = 0
+        self._lock = threading.Lock()
+        self._timestamps = np.empty(initial_capacity, dtype="datetime64[ns]")
+        self._energy = np.empty(initial_capacity, dtype="float64")
+        self._codes = np.empty(initial_capacity, dtype="int32")
+        self._size = 0
+        self.sensors = []
+        self._sensor_codes = {}
+        self._last_refresh = None
+        self._change_marker = None
+        self._clear_base()
+
+    def _clear_base(self):
+        self._base_timestamps = np.empty(0, dtype="datetime64[ns]")
+        self._base_energy = np.empty(0, dtype="float64")
+        self._base_codes = np.empty(0, dtype="int32")
+        self._base_until = None
+        self._snapshot_signature = None
+
+    def __len__(self):
+        return len(self._base_timestamps) + self._size
+
+    @property
+    def watermark(self):
+        """Timestamp of the newest reading held, or None when empty."""
+        if self._size:
+            return pd.Timestamp(self._timestamps[self._size - 1]).to_pydatetime()
+        if len(self._base_timestamps):
+            return pd.Timestamp(self._base_timestamps[-1]).to_pydatetime()
+        return None
+
+    def reset(self):
+        """Drop everything held so the next refresh reloads the full history."""
+        with self._lock:
+            self._size = 0
+            self._last_refresh = None
+            self._change_marker = None
+            self._clear_base()
+            self.revision += 1
+
+    def _sensor_code(self, sensor_id):
+        if sensor_id not in self._sensor_codes:
+            self._sensor_codes[sensor_id] = len(self.sensors)
+            self.sensors.append(sensor_id)
+        return self._sensor_codes[sensor_id]
+
+    def _store_codes(self, codes, sensors):
+        """Translate codes indexing sensors into this store's sensor codes."""
+        lookup = np.array([self._sensor_code(sensor) for sensor in sensors], dtype="int32")
+        return lookup[np.asarray(codes, dtype="intp")] if len(lookup) else np.empty(0, dtype="int32")
+
+    def append(self, timestamps, energy, codes=None, sensors=(None,)):
+        """
+        Append readings that are sorted and not older than the watermark.
+
+        Args:
+            timestamps, energy: Reading columns
+            codes: Index into sensors for each reading; all sensors[0] when None
+            sensors (list): sensor_id of each code
+        """
+        timestamps = np.asarray(timestamps, dtype="datetime64[ns]")
+        energy = np.asarray(energy, dtype="float64")
+        n = len(timestamps)
+        if n == 0:
+            return
+        codes = np.zeros(n, dtype="int32") if codes is None else codes
+        needed = self._size + n
+        if needed > len(self._timestamps):
+            capacity = max(needed, 2 * len(self._timestamps))
+            self._timestamps = np.resize(self._timestamps, capacity)
+            self._energy = np.resize(self._energy, capacity)
+            self._codes = np.resize(self._codes, capacity)
+        self._timestamps[self._size:needed] = timestamps
+        self._energy[self._size:needed] = energy
+        self._codes[self._size:needed] = self._store_codes(codes, sensors)
+        self._size = needed
+
+    def _sync_snapshot(self):
+        """Adopt the snapshot's arrays as the base when its manifest changed."""
+        signature = self.snapshot.signature()
+        if signature == self._snapshot_signature:
+            return
+        self._clear_base()
+        if signature is not None:
+            timestamps, energy, codes, sensors, covered_until = self.snapshot.load()
+            self._base_timestamps, self._base_energy = timestamps, energy
+            self._base_codes = self._store_codes(codes, sensors)
+            self._base_until = datetime.fromisoformat(covered_until) if covered_until else None
+        self._snapshot_signature = signature
+        # The readings after the new base are loaded again
+        self._size = 0
+        self._change_marker = None
+        self.revision += 1
+
+    def _truncate(self, timestamp):
+        """Drop held readings at or after timestamp (all when None) and return them."""
+        cut = 0 if timestamp is None else int(np.searchsorted(
+            self._timestamps[:self._size], np.datetime64(timestamp, "ns"), side="left"))
+        dropped = tuple(column[cut:self._size].copy()
+                        for column in (self._timestamps, self._energy, self._codes))
+        self._size = cut
+        return dropped
+
+    def _late_start(self, collection):
+        """
+        Earliest reading time among documents changed since the last refresh.
+
+        Returns:
+            tuple: (earliest change_time_field value or None, new change marker)
+        """
+        if self.change_field is None:
+            return None, None
+        newest = collection.find_one({}, {self.change_field: 1}, sort=[(self.change_field, -1)])
+        marker = newest[self.change_field] if newest else None
+        if self._change_marker is None or marker is None or marker == self._change_marker:
+            return None, marker
+        rows = list(collection.aggregate([
+            {"$match": {self.change_field: {"$gt": self._change_marker, "$lte": marker}}},
+            {"$group": {"_id": None, "first": {"$min": f"${self.change_time_field}"}}},
+        ]))
+        return (rows[0]["first"] if rows else None), marker
+
+    def refresh(self, collection, force=False):
+        """
+        Fetch readings from the watermark (or the earliest late reading) on.
+
+        Args:
+            collection: The collection fetch reads from
+            force (bool): Ignore refresh_interval and always query
+
+        Returns:
+            int: Net number of readings added
+        """
+        with self._lock:
+            now = time.monotonic()
+            if (not force and self._last_refresh is not None
+                    and now - self._last_refresh < self.refresh_interval):
+                return 0
+
+            # Read the change marker first, so that anything written while
+            # fetching is examined again on the next refresh
+            late_start, marker = self._late_start(collection)
+            if self.snapshot is not None:
+                self._sync_snapshot()
+
+            query = {}
+            full_load = self._size == 0
+            start = None
+            if not full_load:
+                start = pd.Timestamp(self._timestamps[self._size - 1]).to_pydatetime()
+                if late_start is not None:
+                    start = min(start, late_start)
+            if self._base_until is not None:
+                # Readings before the base's end are the snapshot's
+                start = self._base_until if start is None else max(start, self._base_until)
+            held = self._truncate(start)
+            if start is not None:
+                query["timestamp"] = {"$gte": start}
+            timestamps, energy, codes, sensors = fetch_sensor_columns(
+                collection, query, self.fetch, expected=None if full_load else 0)
+
+            self.append(timestamps, energy, codes, sensors)
+            self._change_marker = marker
+            self._last_refresh = now
+            if not (np.array_equal(held[0], timestamps)
+                    and np.array_equal(held[1], energy, equal_nan=True)
+                    and np.array_equal(held[2], self._codes[self._size - len(timestamps):self._size])):
+                self.revision += 1
+            return len(timestamps) - len(held[0])
+
+    def to_frame(self, start_time=None, end_time=None, sensor_id=None):
+        """
+        Return held readings in [start_time, end_time) as a new DataFrame.
+
+        With a sensor_id only that sensor's readings are returned. The
+        returned frame owns its data, so callers may modify it freely.
+        """
+        with self._lock:
+            parts = []
+            code = self._sensor_codes.get(sensor_id, -1)
+            for timestamps, energy, codes in (
+                    (self._base_timestamps, self._base_energy, self._base_codes),
+                    (self._timestamps[:self._size], self._energy[:self._size], self._codes[:self._size])):
+                lo = 0 if start_time is None else np.searchsorted(
+                    timestamps, np.datetime64(start_time, "ns"), side="left")
+                hi = len(timestamps) if end_time is None else np.searchsorted(
+                    timestamps, np.datetime64(end_time, "ns"), side="left")
+                if sensor_id is None:
+                    parts.append((timestamps[lo:hi], energy[lo:hi]))
+                else:
+                    keep = codes[lo:hi] == code
+                    parts.append((timestamps[lo:hi][keep], energy[lo:hi][keep]))
+            return pd.DataFrame({
+                "timestamp": np.concatenate([part[0] for part in parts]),
+                "energy_wh": np.concatenate([part[1] for part in parts]),
+            })
@@ -0,0 +1,53 @@
+import functools
+import inspect
+
+import streamlit as st
+
+def dataset_fingerprint(*parts):
+    """
+    Cheap identity of a dataset, built from what determines its contents.
+
+    Typically the resolved time range, the repository watermark and row
+    count, and the model version, e.g.
+    dataset_fingerprint(start_time, end_time, energy_fingerprint(), model_version).
+    """
+    return "|".join("" if part is None else str(part) for part in parts)
+
+@st.cache_data(ttl=300, show_spinner=False)
+def _cached_call(name, fingerprint, hashed_args, _func, _unhashed_args):
+    """Only name, fingerprint and the small arguments form the cache key."""
+    return _func(**_unhashed_args, **dict(hashed_args))
+
+def cache_by_fingerprint(func):
+    """
+    Cache a DataFrame function on a fingerprint instead of hashing the frame.
+
+    The decorated function takes an extra keyword argument `fingerprint`.
+    When it is given, the first parameter (the dataset) and any parameter
+    whose name starts with an underscore are left out of the cache key, and
+    the remaining small arguments plus the fingerprint identify the result.
+    Without a fingerprint the function simply runs uncached.
+
+    Results come back through st.cache_data, so every caller gets its own
+    copy; decorated functions must not modify their inputs either.
+    """
+    signature = inspect.signature(func)
+    data_param = next(iter(signature.parameters))
+    name = f"{func.__module__}.{func.__qualname__}"
+
+    @functools.wraps(func)
+    def wrapper(*args, fingerprint=None, **kwargs):
+        if fingerprint is None:
+            return func(*args, **kwargs)
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        unhashed = {}
+        hashed = []
+        for param, value in bound.arguments.items():
+            if param == data_param or param.startswith("_"):
+                unhashed[param] = value
+            else:
+                hashed.append((param, value))
+        return _cached_call(name, fingerprint, tuple(hashed), func, unhashed)
+
+    return wrapper
@@ -6,7 +6,7 @@ import numpy as np
 import plotly.graph_objects as go
 from sklearn.metrics import mean_absolute_error, mean_squared_error
 from require_login import require_login
-from db import load_energy_data
+from energy_repository import load_energy_data
 import math
 import torch
 from models.train_lstm import LSTMModel
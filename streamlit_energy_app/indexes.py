@@ -0,0 +1,230 @@
+import argparse
+import logging
+import sys
+from datetime import datetime, timedelta
+
+import streamlit as st
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from energy_buckets import BUCKET_INDEXES
+
+from db import (
+    ENERGY_STORAGE_MODE,
+    get_anomaly_scores_collection,
+    get_energy_bucket_collection,
+    get_job_runs_collection,
+    get_rollup_collection,
+    get_training_jobs_collection,
+    get_user_collection,
+    setup_energy_collection,
+    get_alerts_collection,
+    get_communications_collection,
+    get_energy_collection,
+)
+
+logger = logging.getLogger(__name__)
+
+# Collections the app queries, by the name used in INDEX_SPECS and QUERY_SHAPES
+COLLECTIONS = {
+    "users": get_user_collection,
+    "alerts": get_alerts_collection,
+    "communications": get_communications_collection,
+    "energy_data": get_energy_collection,
+    "anomaly_scores": get_anomaly_scores_collection,
+    "training_jobs": get_training_jobs_collection,
+    "job_runs": get_job_runs_collection,
+    "energy_sensor_hourly": lambda: get_rollup_collection("sensor_hour"),
+}
+
+# Indexes each collection needs. Creating an index that already exists with
+# the same keys and options is a no-op, so ensure_indexes is idempotent.
+INDEX_SPECS = {
+    "users": [
+        IndexModel([("username", ASCENDING)], name="username_unique", unique=True),
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        IndexModel([("role", ASCENDING)], name="role"),
+        IndexModel([("status", ASCENDING), ("requested_role", ASCENDING)], name="status_requested_role"),
+        IndexModel([("reset_token", ASCENDING)], name="reset_token", sparse=True),
+    ],
+    "alerts": [
+        IndexModel([("timestamp", DESCENDING)], name="timestamp"),
+        IndexModel([("type", ASCENDING), ("timestamp", ASCENDING)], name="type_timestamp"),
+        # One alert per sensor, type and time bucket (see alerts.alert_dedup_key)
+        IndexModel([("dedup_key", ASCENDING)], name="dedup_key_unique", unique=True, sparse=True),
+    ],
+    "communications": [
+        IndexModel([("username", ASCENDING), ("timestamp", DESCENDING)], name="username_timestamp"),
+        IndexModel([("user_id", ASCENDING), ("timestamp", DESCENDING)], name="user_id_timestamp"),
+    ],
+    "energy_data": [
+        IndexModel([("timestamp", ASCENDING)], name="timestamp"),
+        IndexModel([("sensor_id", ASCENDING), ("timestamp", ASCENDING)], name="sensor_timestamp"),
+    ],
+    "anomaly_scores": [
+        IndexModel([("model_version", ASCENDING), ("sensor_id", ASCENDING),
+                    ("timestamp", ASCENDING), ("seq", ASCENDING)],
+                   name="version_sensor_timestamp_seq", unique=True),
+    ],
+    "training_jobs": [
+        # Only one job may be queued or running at a time
+        IndexModel([("active", ASCENDING)], name="active_unique", unique=True,
+                   partialFilterExpression={"active": True}),
+        IndexModel([("status", ASCENDING), ("finished_at", DESCENDING)], name="status_finished_at"),
+        IndexModel([("created_at", DESCENDING)], name="created_at"),
+    ],
+    "job_runs": [
+        IndexModel([("job", ASCENDING), ("started_at", DESCENDING)], name="job_started_at"),
+    ],
+    "energy_sensor_hourly": [
+        # Incremental hourly rebuilds and the profile window select by start
+        IndexModel([("start", ASCENDING)], name="start"),
+    ],
+}
+
+if ENERGY_STORAGE_MODE == "bucketed":
+    COLLECTIONS["energy_buckets"] = get_energy_bucket_collection
+    INDEX_SPECS["energy_buckets"] = BUCKET_INDEXES
+
+def query_shapes():
+    """
+    Representative versions of every query shape the app issues.
+
+    Values are placeholders; only the shape matters to the query planner.
+    """
+    now = datetime.now()
+    shapes = [
+        ("users", "login / preferences lookup", {"username": "user"}, None),
+        ("users", "forgot password lookup", {"email": "user@example.com"}, None),
+        ("users", "registration duplicate check",
+         {"$or": [{"username": "user"}, {"email": "user@example.com"}]}, None),
+        ("users", "admin/manager recipients", {"role": {"$in": ["admin", "manager"]}}, None),
+        ("users", "pending role requests",
+         {"requested_role": {"$in": ["admin", "manager"]}, "status": "pending"}, None),
+        ("users", "reset token lookup",
+         {"reset_token": "token", "reset_token_expires": {"$gt": now}}, None),
+        ("communications", "inbox", {"username": "user"}, [("timestamp", DESCENDING)]),
+        ("alerts", "alerts page", {"timestamp": {"$gte": now - timedelta(days=30)}},
+         [("timestamp", DESCENDING)]),
+        ("alerts", "alert dedup upsert", {"dedup_key": "sensor:energy_spike:2024-01-01T00:00:00"}, None),
+        ("alerts", "old alert cleanup",
+         {"type": "isolation_forest", "timestamp": {"$lt": now}}, None),
+        ("energy_data", "time range scan",
+         {"timestamp": {"$gte": now - timedelta(days=7), "$lt": now}}, [("timestamp", ASCENDING)]),
+        ("energy_data", "tail fetch", {"timestamp": {"$gt": now}}, [("timestamp", ASCENDING)]),
+        ("energy_data", "sensor range scan",
+         {"sensor_id": "sensor", "timestamp": {"$gte": now - timedelta(days=1)}},
+         [("timestamp", ASCENDING)]),
+        ("anomaly_scores", "stored scores for a range",
+         {"model_version": "version", "sensor_id": None,
+          "timestamp": {"$gte": now - timedelta(days=7), "$lte": now}}, None),
+        ("training_jobs", "current model",
+         {"status": "succeeded"}, [("finished_at", DESCENDING)]),
+        ("training_jobs", "latest job", {}, [("created_at", DESCENDING)]),
+        ("job_runs", "recent runs of a job", {"job": "alert_checks"}, [("started_at", DESCENDING)]),
+        ("energy_sensor_hourly", "hours touched since the last rollup",
+         {"start": {"$gte": now - timedelta(hours=1), "$lt": now}}, None),
+    ]
+    if ENERGY_STORAGE_MODE == "bucketed":
+        shapes += [
+            ("energy_buckets", "bucket range scan",
+             {"bucket_start": {"$gte": now - timedelta(days=7), "$lt": now}},
+             [("bucket_start", ASCENDING)]),
+            ("energy_buckets", "rollup change scan", {"updated_at": {"$gt": now}}, None),
+        ]
+    return shapes
+
+def ensure_indexes():
+    """
+    Create every index in INDEX_SPECS.
+
+    energy_data is set up first, so that a fresh database gets it as a
+    time-series collection rather than having create_indexes create a
+    regular one.
+
+    Returns:
+        dict: Collection name -> list of error messages (empty when all good)
+    """
+    errors = {}
+    try:
+        setup_energy_collection()
+    except OperationFailure as e:
+        errors["energy_data"] = [f"time-series setup: {e}"]
+    for name, indexes in INDEX_SPECS.items():
+        collection = COLLECTIONS[name]()
+        errors.setdefault(name, [])
+        for index in indexes:
+            try:
+                collection.create_indexes([index])
+            except OperationFailure as e:
+                errors[name].append(f"{index.document['name']}: {e}")
+    return errors
+
+@st.cache_resource
+def bootstrap_indexes():
+    """Run ensure_indexes once per process at app startup."""
+    errors = ensure_indexes()
+    for name, messages in errors.items():
+        for message in messages:
+            logger.warning("Index bootstrap failed on %s: %s", name, message)
+    return errors
+
+def _plan_stages(plan):
+    """Yield every stage name in an explain() plan tree."""
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from _plan_stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from _plan_stages(item)
+
+def verify_query_shapes():
+    """
+    Explain every query shape and report the ones no index covers.
+
+    Returns:
+        list: (collection, description, problem) for each uncovered shape,
+        where problem is 'COLLSCAN' or 'in-memory SORT'
+    """
+    problems = []
+    for name, description, query, sort in query_shapes():
+        cursor = COLLECTIONS[name]().find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        stages = set(_plan_stages(cursor.explain()["queryPlanner"]["winningPlan"]))
+        if "COLLSCAN" in stages:
+            problems.append((name, description, "COLLSCAN"))
+        elif "SORT" in stages:
+            problems.append((name, description, "in-memory SORT"))
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description="Create and verify MongoDB indexes")
+    parser.add_argument("--verify", action="store_true",
+                        help="Also explain() every app query shape and report uncovered ones")
+    args = parser.parse_args()
+
+    errors = ensure_indexes()
+    failed = False
+    for name, messages in errors.items():
+        for message in messages:
+            failed = True
+            print(f"[{name}] index error: {message}")
+    if not failed:
+        print("All indexes present.")
+
+    if args.verify:
+        problems = verify_query_shapes()
+        for name, description, problem in problems:
+            print(f"[{name}] {description}: {problem}")
+        if problems:
+            failed = True
+        else:
+            print("Every query shape is covered by an index.")
+
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
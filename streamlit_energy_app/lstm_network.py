@@ -1,6 +1,8 @@
 import streamlit as st
 from require_login import require_login
-from db import load_energy_data
+from energy_repository import load_energy_data
+from rollups import ROLLUPS_MISSING_MESSAGE, load_rollups, rollups_built
+from model_registry import MODEL_DIR, MODEL_SPECS, load_model
 import torch
 import torch.nn as nn
 import numpy as np
@@ -59,40 +61,33 @@ def create_and_save_scaler(data, scaler_path):
         st.error(f"Error creating scaler: {str(e)}")
         return None
 
+@st.cache_resource
+def build_lstm_model(version=None):
+    """Build the LSTM once per process from the registry's state dict"""
+    # Single layer architecture to match the saved model
+    model = LSTMModel(input_size=1, hidden_size=50, num_layers=1, dropout=0.0)
+    model.load_state_dict(load_model("lstm", version))
+    model.eval()
+    return model
+
 def load_model_and_scaler():
     """Load the LSTM model and scaler with proper error handling"""
     try:
-        # Define paths
-        models_dir = os.path.join(os.path.dirname(__file__), "new_models")
-        model_path = os.path.join(models_dir, "lstm_model_state_dict.pth")
-        scaler_path = os.path.join(models_dir, "lstm_scaler.joblib")
-        
-        # Create models directory if it doesn't exist
-        os.makedirs(models_dir, exist_ok=True)
-        
         # Load or create scaler
-        if os.path.exists(scaler_path):
-            scaler = joblib.load(scaler_path)
-        else:
+        try:
+            scaler = load_model("lstm_scaler")
+        except FileNotFoundError:
             # Load data to create scaler
             df = load_energy_data()
             if df.empty:
                 raise ValueError("No data available to create scaler")
             data = df['energy_wh'].values.reshape(-1, 1)
+            scaler_path = os.path.join(MODEL_DIR, MODEL_SPECS["lstm_scaler"]["file"])
             scaler = create_and_save_scaler(data, scaler_path)
             if scaler is None:
                 raise ValueError("Failed to create scaler")
         
-        # Load model
-        if not os.path.exists(model_path):
-            raise FileNotFoundError("LSTM model file not found")
-            
-        # Initialize model with single layer architecture to match saved model
-        model = LSTMModel(input_size=1, hidden_size=50, num_layers=1, dropout=0.0)
-        model.load_state_dict(torch.load(model_path))
-        model.eval()
-        
-        return model, scaler
+        return build_lstm_model(), scaler
     except Exception as e:
         st.error(f"Error loading model or scaler: {str(e)}")
         return None, None
@@ -188,22 +183,20 @@ def lstm_network_page():
             help="Select how many days ahead you want to forecast"
         )
 
-    # Load and filter data
-    df = load_energy_data()
-    if df.empty:
+    # Load hourly means from the rollups
+    if not rollups_built():
+        st.warning(ROLLUPS_MISSING_MESSAGE)
+        return
+    hourly = load_rollups("hour")
+    if hourly.empty:
         st.warning("No energy data available.")
         return
 
-    # Resample data to hourly intervals
-    df.set_index('timestamp', inplace=True)
-    # Create a new DataFrame with only the energy_wh column for resampling
-    energy_df = df[['energy_wh']].copy()
-    # Resample the energy data
-    energy_resampled = energy_df.resample('H').mean().fillna(method='ffill')
+    # Fill hours without readings from the previous hour
+    full_index = pd.date_range(hourly['timestamp'].min(), hourly['timestamp'].max(), freq='h')
+    energy_resampled = hourly.set_index('timestamp')['mean'].reindex(full_index).ffill()
     # Create the final resampled DataFrame
-    df_resampled = pd.DataFrame(index=energy_resampled.index)
-    df_resampled['energy_wh'] = energy_resampled['energy_wh']
-    df_resampled.reset_index(inplace=True)
+    df_resampled = pd.DataFrame({'timestamp': full_index, 'energy_wh': energy_resampled.values})
     
     # Check for complete days in resampled data
     df_resampled['date'] = df_resampled['timestamp'].dt.date
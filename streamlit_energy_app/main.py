@@ -16,6 +16,8 @@ st.set_page_config(
 import os
 from dotenv import load_dotenv
 from db import get_mongo_client, get_db
+from indexes import bootstrap_indexes
+from scheduler import start_scheduler
 import pandas as pd
 import asyncio
 import torch
@@ -85,6 +87,12 @@ load_dotenv()
 # Initialize MongoDB connection
 get_mongo_client()
 
+# Make sure every queried collection is indexed (runs once per process)
+bootstrap_indexes()
+
+# Scheduled jobs, when EMADS_SCHEDULER=app (starts once per process)
+start_scheduler()
+
 def main():    
     st.sidebar.title("Navigation")
 
@@ -0,0 +1,259 @@
+import argparse
+import glob
+import mmap
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+
+import joblib
+import numpy as np
+import streamlit as st
+
+from db import get_training_jobs_collection
+
+MODEL_DIR = os.getenv("MODEL_DIR", os.path.join(os.path.dirname(__file__), "new_models"))
+
+# Every model artifact the app loads, by name. 'file' is the unversioned
+# artifact; versioned artifacts are named '<prefix>_<version><suffix>'.
+# 'mmap' memory-maps the arrays of an uncompressed joblib file read-only,
+# so every process shares one copy through the page cache.
+MODEL_SPECS = {
+    "isolation_forest": {
+        "file": "isolation_forest_model.joblib",
+        "prefix": "isolation_forest",
+        "suffix": ".joblib",
+        "loader": "joblib",
+        "mmap": True,
+        "trained": True,        # Latest version comes from training_jobs
+    },
+    "isolation_forest_report": {
+        "file": "IF_model.joblib",
+        "loader": "joblib",
+        "mmap": True,
+    },
+    "prophet": {
+        "file": "prophet_model.pkl",
+        "loader": "joblib",
+        "mmap": False,          # Prophet keeps pandas frames it writes to
+    },
+    "lstm": {
+        "file": "lstm_model_state_dict.pth",
+        "loader": "torch_state_dict",
+    },
+    "lstm_scaler": {
+        "file": "lstm_scaler.joblib",
+        "loader": "joblib",
+        "mmap": False,
+    },
+}
+
+@dataclass
+class LoadedModel:
+    """An artifact held by the registry, with what it cost to load"""
+    name: str
+    version: str
+    path: str
+    model: object
+    load_seconds: float
+    file_bytes: int
+    memory_bytes: int       # Array data copied into this process
+    mapped_bytes: int       # Array data memory-mapped from the file
+    loaded_at: datetime
+
+def versioned_path(name, version, model_dir=MODEL_DIR):
+    """Path of a versioned artifact of a model"""
+    spec = MODEL_SPECS[name]
+    if "prefix" not in spec:
+        raise ValueError(f"Model {name} is not versioned")
+    return os.path.join(model_dir, f"{spec['prefix']}_{version}{spec['suffix']}")
+
+def available_versions(name, model_dir=MODEL_DIR):
+    """Versions of a model present in model_dir, oldest first"""
+    spec = MODEL_SPECS[name]
+    if "prefix" not in spec:
+        return []
+    pattern = os.path.join(model_dir, f"{spec['prefix']}_*{spec['suffix']}")
+    paths = sorted((path for path in glob.glob(pattern)
+                    if os.path.basename(path) != spec["file"]), key=os.path.getmtime)
+    start = len(spec["prefix"]) + 1
+    return [os.path.basename(path)[start:-len(spec["suffix"])] for path in paths]
+
+@st.cache_data(ttl=30)
+def latest_trained_version():
+    """
+    Version and path of the newest successful training job.
+
+    Returns:
+        tuple: (version, path), or (None, None) when no job has succeeded
+    """
+    job = get_training_jobs_collection().find_one(
+        {"status": "succeeded"}, {"model_path": 1, "model_version": 1}, sort=[("finished_at", -1)])
+    if job is None or not os.path.exists(job["model_path"]):
+        return None, None
+    return job["model_version"], job["model_path"]
+
+def resolve_model(name, version=None, model_dir=MODEL_DIR):
+    """
+    Resolve a model name and version to an artifact.
+
+    With version=None, trained models resolve to the newest successful
+    training job and fall back to the bundled file; other models resolve
+    to their single file.
+
+    Returns:
+        tuple: (version, path), where version is 'bundled' for the unversioned file
+
+    Raises:
+        KeyError: Unknown model name
+        FileNotFoundError: No artifact for this name and version
+    """
+    spec = MODEL_SPECS[name]
+    if version is not None and version != "bundled":
+        path = versioned_path(name, version, model_dir)
+    else:
+        if version is None and spec.get("trained"):
+            trained_version, trained_path = latest_trained_version()
+            if trained_path is not None:
+                return trained_version, trained_path
+        version, path = "bundled", os.path.join(model_dir, spec["file"])
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No artifact for model {name} version {version}: {path}")
+    return version, path
+
+def _is_mapped(array):
+    """True when an array's data lives in a memory-mapped file"""
+    while array is not None:
+        if isinstance(array, (np.memmap, mmap.mmap)):
+            return True
+        array = getattr(array, "base", None)
+    return False
+
+def _array_bytes(obj, seen=None):
+    """(in-memory, memory-mapped) bytes of the arrays and tensors reachable from obj"""
+    if seen is None:
+        seen = {}
+    if id(obj) in seen or isinstance(obj, (str, bytes, int, float, bool, type(None))):
+        return 0, 0
+    # Keep a reference so temporary pickling state cannot free and reuse the id
+    seen[id(obj)] = obj
+    if isinstance(obj, np.ndarray):
+        return (0, obj.nbytes) if _is_mapped(obj) else (obj.nbytes, 0)
+    if hasattr(obj, "element_size") and hasattr(obj, "nelement"):   # torch.Tensor
+        return obj.nelement() * obj.element_size(), 0
+    if isinstance(obj, dict):
+        children = obj.values()
+    elif isinstance(obj, (list, tuple, set)):
+        children = obj
+    elif hasattr(obj, "__dict__"):
+        children = vars(obj).values()
+    else:
+        # Extension types such as sklearn's Tree expose their arrays through pickling
+        try:
+            reduced = obj.__reduce_ex__(2)
+        except Exception:
+            reduced = None
+        state = reduced[2] if isinstance(reduced, tuple) and len(reduced) > 2 else None
+        children = state.values() if isinstance(state, dict) else ()
+    memory = mapped = 0
+    for child in children:
+        child_memory, child_mapped = _array_bytes(child, seen)
+        memory += child_memory
+        mapped += child_mapped
+    return memory, mapped
+
+def _load(path, spec):
+    if spec["loader"] == "torch_state_dict":
+        import torch
+        # mmap keeps the tensor storage in the file instead of copying it
+        return torch.load(path, map_location="cpu", weights_only=True, mmap=True)
+    return joblib.load(path, mmap_mode="r" if spec.get("mmap") else None)
+
+class ModelRegistry:
+    """
+    Loads each model artifact once per process.
+
+    Artifacts are keyed by path, so a new version is loaded alongside the
+    old one and sessions switch over as they resolve it. Load time and the
+    size of each artifact's arrays are kept for stats().
+    """
+
+    def __init__(self, model_dir=MODEL_DIR):
+        self.model_dir = model_dir
+        self._lock = threading.Lock()
+        self._loaded = {}
+
+    def get(self, name, version=None):
+        """
+        Load a model, or return the copy already held.
+
+        Returns:
+            LoadedModel: The artifact and its load statistics
+        """
+        version, path = resolve_model(name, version, self.model_dir)
+        with self._lock:
+            if path not in self._loaded:
+                started = time.perf_counter()
+                model = _load(path, MODEL_SPECS[name])
+                load_seconds = time.perf_counter() - started
+                memory_bytes, mapped_bytes = _array_bytes(model)
+                self._loaded[path] = LoadedModel(
+                    name=name,
+                    version=version,
+                    path=path,
+                    model=model,
+                    load_seconds=load_seconds,
+                    file_bytes=os.path.getsize(path),
+                    memory_bytes=memory_bytes,
+                    mapped_bytes=mapped_bytes,
+                    loaded_at=datetime.now(),
+                )
+            return self._loaded[path]
+
+    def stats(self):
+        """
+        Load time and memory of every artifact held.
+
+        Returns:
+            list: One dict per artifact with name, version, path, load_seconds,
+            file_bytes, memory_bytes, mapped_bytes and loaded_at
+        """
+        with self._lock:
+            return [
+                {key: value for key, value in vars(loaded).items() if key != "model"}
+                for loaded in self._loaded.values()
+            ]
+
+@st.cache_resource
+def get_model_registry():
+    """Process-wide registry shared by every session."""
+    return ModelRegistry()
+
+def load_model(name, version=None):
+    """The model artifact for name and version; see ModelRegistry.get."""
+    return get_model_registry().get(name, version).model
+
+def load_model_with_version(name, version=None):
+    """(model, version, path) for name and version; see ModelRegistry.get."""
+    loaded = get_model_registry().get(name, version)
+    return loaded.model, loaded.version, loaded.path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List model artifacts and time their loading")
+    parser.add_argument("names", nargs="*", default=list(MODEL_SPECS))
+    args = parser.parse_args()
+
+    registry = ModelRegistry()
+    for name in args.names:
+        versions = available_versions(name)
+        if versions:
+            print(f"{name}: versions {', '.join(versions)}")
+        try:
+            registry.get(name)
+        except Exception as e:
+            print(f"{name}: not loaded ({e})")
+    for row in registry.stats():
+        print(f"{row['name']} [{row['version']}] {row['load_seconds']:.3f}s, "
+              f"file {row['file_bytes'] / 1e6:.1f} MB, in memory {row['memory_bytes'] / 1e6:.1f} MB, "
+              f"mapped {row['mapped_bytes'] / 1e6:.1f} MB")
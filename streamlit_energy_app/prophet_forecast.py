@@ -1,12 +1,11 @@
 import streamlit as st
 from require_login import require_login
-from db import load_energy_data
+from energy_repository import load_energy_range
+from time_ranges import TIME_RANGE_OPTIONS, resolve_time_range
+from model_registry import load_model
 import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
-from datetime import datetime, timedelta
-import joblib
-import os
 
 def prophet_forecast_page():
     require_login()
@@ -18,13 +17,11 @@ def prophet_forecast_page():
 
     # Load the Prophet model
     try:
-        model_path = "new_models/prophet_model.pkl"
-        if not os.path.exists(model_path):
-            st.error("Prophet model file not found. Please ensure the model is trained and saved correctly.")
-            return
-            
-        model = joblib.load(model_path)
+        model = load_model("prophet")
         st.success("Prophet model loaded successfully!")
+    except FileNotFoundError:
+        st.error("Prophet model file not found. Please ensure the model is trained and saved correctly.")
+        return
     except Exception as e:
         st.error(f"Error loading the model: {str(e)}")
         return
@@ -35,7 +32,7 @@ def prophet_forecast_page():
     with col1:
         time_range = st.selectbox(
             "Choose a time range",
-            ["Last 24 hours", "Last 7 days", "Last 30 days", "Last 90 days", "All time"],
+            TIME_RANGE_OPTIONS,
             index=4  # Default to "All time"
         )
     
@@ -49,23 +46,13 @@ def prophet_forecast_page():
             help="Select how many days ahead you want to forecast"
         )
 
-    # Load and filter data
-    df = load_energy_data()
+    # Load data for the selected range
+    start_time, end_time = resolve_time_range(time_range)
+    df = load_energy_range(start_time, end_time)
     if df.empty:
         st.warning("No energy data available.")
         return
 
-    # Apply time filter
-    now = datetime.now()
-    if time_range == "Last 24 hours":
-        df = df[df['timestamp'] >= now - timedelta(days=1)]
-    elif time_range == "Last 7 days":
-        df = df[df['timestamp'] >= now - timedelta(days=7)]
-    elif time_range == "Last 30 days":
-        df = df[df['timestamp'] >= now - timedelta(days=30)]
-    elif time_range == "Last 90 days":
-        df = df[df['timestamp'] >= now - timedelta(days=90)]
-
     # Prepare data for Prophet
     prophet_df = df.copy()
     prophet_df = prophet_df.rename(columns={'timestamp': 'ds', 'energy_wh': 'y'})
@@ -1,6 +1,6 @@
 import streamlit as st 
 from require_login import require_login 
-from db import load_energy_data 
+from rollups import ROLLUPS_MISSING_MESSAGE, load_rollups, rollups_built
 import plotly.graph_objects as go
 
 
@@ -13,14 +13,18 @@ def recommendations_page():
         Recommendations are generated using machine learning and expert knowledge.
     """)
 
-    # Load energy data
-    df = load_energy_data()
-    if df.empty:
+    # Load hourly and daily rollups; no raw readings are needed here
+    if not rollups_built():
+        st.warning(ROLLUPS_MISSING_MESSAGE)
+        return
+    hourly = load_rollups("hour")
+    if hourly.empty:
         st.warning("No energy data available.")
         return
 
     # Calculate daily consumption
-    daily_consumption = df.set_index('timestamp').resample('D')['energy_wh'].sum().reset_index()
+    daily_consumption = load_rollups("day")[["timestamp", "sum"]]
+    daily_consumption = daily_consumption.rename(columns={"sum": "energy_wh"})
     
     # Generate recommendations
     recommendations = []
@@ -56,9 +60,11 @@ def recommendations_page():
         })
     
     # 3) Night-time usage
-    df['hour'] = df['timestamp'].dt.hour
-    night_usage = df[df['hour'].between(22, 5)]['energy_wh'].mean()
-    day_usage = df[df['hour'].between(6, 21)]['energy_wh'].mean()
+    hourly['hour'] = hourly['timestamp'].dt.hour
+    night = hourly[hourly['hour'].between(22, 5)]
+    day = hourly[hourly['hour'].between(6, 21)]
+    night_usage = night['sum'].sum() / night['count'].sum() if not night.empty else float('nan')
+    day_usage = day['sum'].sum() / day['count'].sum() if not day.empty else float('nan')
     
     if night_usage > day_usage * 0.5:
         recommendations.append({
@@ -95,10 +101,10 @@ def recommendations_page():
     st.plotly_chart(fig, use_container_width=True)
     
     # Hourly consumption heatmap
-    hourly_consumption = df.pivot_table(
-        values='energy_wh',
-        index=df['timestamp'].dt.hour,
-        columns=df['timestamp'].dt.date,
+    hourly_consumption = hourly.pivot_table(
+        values='mean',
+        index=hourly['timestamp'].dt.hour,
+        columns=hourly['timestamp'].dt.date,
         aggfunc='mean'
     )
     
@@ -1,11 +1,9 @@
 import streamlit as st
 from require_login import require_login
-from db import load_energy_data, get_db, get_alerts_collection
-import pandas as pd
+from energy_repository import load_energy_range, aggregate_energy_data
+from score_store import load_scoring_model, score_readings
+from time_ranges import TIME_RANGE_OPTIONS, resolve_time_range
 import plotly.graph_objects as go
-from datetime import datetime, timedelta
-import joblib
-import os
 
 def reports_page():
     require_login()
@@ -19,55 +17,39 @@ def reports_page():
     st.markdown("### Select Time Range")
     time_range = st.selectbox(
         "Choose a time range",
-        ["Last 24 hours", "Last 7 days", "Last 30 days", "Last 90 days", "All time"],
+        TIME_RANGE_OPTIONS,
         index=4  # Default to "All time"
     )
 
-    # Load data
-    df = load_energy_data()
+    # Load data for the selected range
+    start_time, end_time = resolve_time_range(time_range)
+    df = load_energy_range(start_time, end_time)
     if df.empty:
         st.warning("No energy data available.")
         return
 
-    # Apply time filter
-    now = datetime.now()
-    if time_range == "Last 24 hours":
-        df = df[df['timestamp'] >= now - timedelta(days=1)]
-    elif time_range == "Last 7 days":
-        df = df[df['timestamp'] >= now - timedelta(days=7)]
-    elif time_range == "Last 30 days":
-        df = df[df['timestamp'] >= now - timedelta(days=30)]
-    elif time_range == "Last 90 days":
-        df = df[df['timestamp'] >= now - timedelta(days=90)]
-
-    # Calculate daily statistics
-    daily_stats = df.set_index('timestamp').resample('D').agg({
-        'energy_wh': ['sum', 'mean', 'min', 'max', 'std']
-    }).reset_index()
+    # Calculate daily statistics on the server
+    daily_stats = aggregate_energy_data(start_time, end_time, "day", ("sum", "mean", "min", "max", "std"))
     daily_stats.columns = ['Date', 'Total Energy (Wh)', 'Average Energy (Wh)', 
                          'Minimum Energy (Wh)', 'Maximum Energy (Wh)', 'Standard Deviation (Wh)']
 
     # Detect anomalies using Isolation Forest
     try:
-        model_path = "new_models/IF_model.joblib"
-        if not os.path.exists(model_path):
+        try:
+            model, model_version, model_path = load_scoring_model("isolation_forest_report")
+        except FileNotFoundError:
             st.error("Anomaly detection model not found.")
             return
             
-        model = joblib.load(model_path)
-        # Create DataFrame with proper feature name
-        data_df = pd.DataFrame({
-            'energy_wh': df['energy_wh'].values
-        })
-        predictions = model.predict(data_df)
-        scores = model.score_samples(data_df)
-        
-        # Convert scores to anomaly scores (higher is more anomalous)
-        anomaly_scores = -scores
+        # Persisted decision_function scores; only unscored readings hit the model
+        progress_bar = st.progress(0.0, text="Scoring readings...")
+        df = score_readings(df, model, model_version, model_path=model_path,
+                            progress=progress_bar.progress)
+        progress_bar.empty()
         
-        # Add predictions and scores to dataframe
-        df['is_anomaly'] = predictions == -1
-        df['anomaly_score'] = anomaly_scores
+        # Convert to score_samples-based anomaly scores (higher is more anomalous)
+        df['is_anomaly'] = df['anomaly'] == -1
+        df['anomaly_score'] = -(df['anomaly_score'] + model.offset_)
         
         # Calculate anomaly statistics
         total_anomalies = df['is_anomaly'].sum()
@@ -0,0 +1,373 @@
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from db import (
+    ENERGY_BUCKET_GRANULARITY,
+    ENERGY_STORAGE_MODE,
+    get_energy_bucket_collection,
+    get_energy_collection,
+    get_energy_profile_collection,
+    get_rollup_collection,
+    get_rollup_state_collection,
+)
+from energy_buckets import bucket_start, unwind_stages
+
+# Rollup granularities from finest to coarsest. Each level is rebuilt from
+# the one before it; the hourly level is rebuilt from the per-sensor hours
+# (SENSOR_LEVEL), which are rebuilt from raw readings.
+ROLLUP_LEVELS = ["hour", "day", "month"]
+SENSOR_LEVEL = "sensor_hour"
+
+# Bumped when the rollup document layout changes, so the next refresh
+# rebuilds every level (v2 replaced sumsq with mean and m2, v3 added the
+# per-sensor hours)
+ROLLUP_STATE_ID = "energy_rollups_v3"
+
+# Weeks of hourly rollups the hour-of-week profiles are built from
+PROFILE_WEEKS = int(os.getenv("ENERGY_PROFILE_WEEKS", 8))
+
+def _bucket_start(ts, granularity):
+    if granularity == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    if granularity == "day":
+        return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    return ts.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+def _bucket_end(start, granularity):
+    if granularity == "hour":
+        return start + timedelta(hours=1)
+    if granularity == "day":
+        return start + timedelta(days=1)
+    return (pd.Timestamp(start) + pd.offsets.MonthBegin(1)).to_pydatetime()
+
+def _bucket_ranges(starts, granularity):
+    """Collapse bucket starts into as few contiguous [start, end) ranges as possible."""
+    ranges = []
+    for start in sorted(set(starts)):
+        end = _bucket_end(start, granularity)
+        if ranges and ranges[-1][1] == start:
+            ranges[-1][1] = end
+        else:
+            ranges.append([start, end])
+    return ranges
+
+def _range_match(field, ranges):
+    if not ranges:
+        return {}
+    return {"$or": [{field: {"$gte": start, "$lt": end}} for start, end in ranges]}
+
+def _storage_prefilter(ranges):
+    """Select the storage buckets overlapping the given reading ranges."""
+    if ranges is None:
+        return {}
+    return {"$or": [
+        {"bucket_start": {"$gte": bucket_start(start), "$lt": end}} for start, end in ranges
+    ]}
+
+def combine_moments(parts):
+    """
+    Aggregation expression merging {count, mean, m2} parts into one.
+
+    m2 is the sum of squared deviations from the mean. Parts are folded
+    with the pairwise update of Chan et al., which, unlike sumsq - sum²/n,
+    does not lose precision when the spread is small next to the mean.
+
+    Args:
+        parts (str): Expression for an array of {count, mean, m2} documents
+
+    Returns:
+        dict: Expression for the merged {count, mean, m2} document
+    """
+    return {"$reduce": {
+        "input": parts,
+        "initialValue": {"count": 0, "mean": 0, "m2": 0},
+        "in": {"$let": {
+            "vars": {
+                "count": {"$add": ["$$value.count", "$$this.count"]},
+                "delta": {"$subtract": ["$$this.mean", "$$value.mean"]},
+            },
+            "in": {
+                "count": "$$count",
+                "mean": {"$add": ["$$value.mean", {"$divide": [
+                    {"$multiply": ["$$delta", "$$this.count"]}, "$$count"]}]},
+                "m2": {"$add": ["$$value.m2", "$$this.m2", {"$divide": [
+                    {"$multiply": ["$$delta", "$$delta", "$$value.count", "$$this.count"]}, "$$count"]}]},
+            },
+        }},
+    }}
+
+def sample_std(m2="$m2", count="$count"):
+    """Aggregation expression for the sample std from m2 and count, null below two readings."""
+    return {"$cond": [
+        {"$gt": [count, 1]},
+        {"$sqrt": {"$divide": [{"$max": [0, m2]}, {"$subtract": [count, 1]}]}},
+        None,
+    ]}
+
+def _merge_parts_stages():
+    """Stages turning a $group's pushed 'parts' into 'mean' and 'm2'."""
+    return [
+        {"$set": {"moments": combine_moments("$parts")}},
+        {"$set": {"mean": "$moments.mean", "m2": "$moments.m2"}},
+        {"$unset": ["parts", "moments"]},
+    ]
+
+def _sensor_hourly_pipeline(ranges=None):
+    """
+    Group raw readings in the given [start, end) ranges (all when None) into
+    per-sensor hourly rollup documents, keyed by {sensor_id, start}.
+    """
+    match = {} if ranges is None else _range_match("timestamp", ranges)
+    stages = []
+    if ENERGY_STORAGE_MODE == "bucketed":
+        stages = [{"$match": _storage_prefilter(ranges)}, *unwind_stages()]
+    return stages + [
+        {"$match": match},
+        {"$group": {
+            "_id": {
+                "sensor_id": {"$ifNull": ["$sensor_id", None]},
+                "start": {"$dateTrunc": {"date": "$timestamp", "unit": "hour"}},
+            },
+            "sum": {"$sum": "$energy_wh"},
+            "count": {"$sum": 1},
+            "min": {"$min": "$energy_wh"},
+            "max": {"$max": "$energy_wh"},
+            "std": {"$stdDevPop": "$energy_wh"},
+        }},
+        {"$set": {
+            "sensor_id": "$_id.sensor_id",
+            "start": "$_id.start",
+            "mean": {"$divide": ["$sum", "$count"]},
+            "m2": {"$multiply": ["$std", "$std", "$count"]},
+        }},
+        {"$unset": "std"},
+    ]
+
+def _coarser_pipeline(match, granularity, start_field="$_id"):
+    """Group finer rollup documents (or per-sensor hours, by start_field) into the next granularity."""
+    return [
+        {"$match": match},
+        {"$group": {
+            "_id": {"$dateTrunc": {"date": start_field, "unit": granularity}},
+            "sum": {"$sum": "$sum"},
+            "count": {"$sum": "$count"},
+            "min": {"$min": "$min"},
+            "max": {"$max": "$max"},
+            "parts": {"$push": {"count": "$count", "mean": "$mean", "m2": "$m2"}},
+        }},
+        *_merge_parts_stages(),
+    ]
+
+def _merge_stage(granularity):
+    return {"$merge": {
+        "into": get_rollup_collection(granularity).name,
+        "on": "_id",
+        "whenMatched": "replace",
+        "whenNotMatched": "insert",
+    }}
+
+def _readings_collection():
+    if ENERGY_STORAGE_MODE == "bucketed":
+        return get_energy_bucket_collection()
+    return get_energy_collection()
+
+def _checkpoint_field():
+    """Field in the state document holding the last change marker processed."""
+    return "last_updated_at" if ENERGY_STORAGE_MODE == "bucketed" else "last_id"
+
+def _touched_since(readings, checkpoint):
+    """
+    Find what changed since the checkpoint.
+
+    Flat readings are immutable, so new _ids identify the touched hours.
+    Storage buckets are updated in place, so their updated_at is used and a
+    touched bucket marks all of its hours.
+
+    Returns:
+        tuple: (marker for the checkpoint or None when there is no data,
+        touched bucket starts, granularity of those starts)
+    """
+    if ENERGY_STORAGE_MODE == "bucketed":
+        field, unit = "updated_at", ENERGY_BUCKET_GRANULARITY
+        group_key = "$bucket_start"
+    else:
+        field, unit = "_id", "hour"
+        group_key = {"$dateTrunc": {"date": "$timestamp", "unit": "hour"}}
+
+    newest = readings.find_one({}, {field: 1}, sort=[(field, -1)])
+    if newest is None:
+        return None, [], unit
+    marker = newest[field]
+    last = checkpoint.get(_checkpoint_field())
+    if last is None:
+        return marker, None, unit
+    if last == marker:
+        return marker, [], unit
+    touched = readings.aggregate([
+        {"$match": {field: {"$gt": last, "$lte": marker}}},
+        {"$group": {"_id": group_key}},
+    ], allowDiskUse=True)
+    return marker, [row["_id"] for row in touched], unit
+
+def refresh_rollups():
+    """
+    Bring the hourly, daily and monthly rollups up to date.
+
+    Only buckets touched by readings inserted since the last run are
+    recomputed, and each touched bucket is rebuilt in full from the level
+    below it, so late readings are handled the same way as new ones. The
+    first run rebuilds everything.
+
+    Returns:
+        dict: Number of buckets rewritten per granularity
+    """
+    readings = _readings_collection()
+    state = get_rollup_state_collection()
+
+    checkpoint = state.find_one({"_id": ROLLUP_STATE_ID}) or {}
+    marker, touched_starts, unit = _touched_since(readings, checkpoint)
+    if marker is None or touched_starts == []:
+        return {level: 0 for level in ROLLUP_LEVELS}
+
+    counts = {}
+    if touched_starts is None:
+        # First run: rebuild every level from scratch
+        readings.aggregate(_sensor_hourly_pipeline() + [_merge_stage(SENSOR_LEVEL)], allowDiskUse=True)
+        get_rollup_collection(SENSOR_LEVEL).aggregate(
+            _coarser_pipeline({}, "hour", "$start") + [_merge_stage("hour")], allowDiskUse=True)
+        finer = "hour"
+        for granularity in ROLLUP_LEVELS[1:]:
+            get_rollup_collection(finer).aggregate(
+                _coarser_pipeline({}, granularity) + [_merge_stage(granularity)], allowDiskUse=True)
+            finer = granularity
+        for granularity in ROLLUP_LEVELS:
+            counts[granularity] = get_rollup_collection(granularity).estimated_document_count()
+    else:
+        hour_ranges = _bucket_ranges(touched_starts, unit)
+        readings.aggregate(_sensor_hourly_pipeline(hour_ranges) + [_merge_stage(SENSOR_LEVEL)],
+                           allowDiskUse=True)
+        get_rollup_collection(SENSOR_LEVEL).aggregate(
+            _coarser_pipeline(_range_match("start", hour_ranges), "hour", "$start") + [_merge_stage("hour")],
+            allowDiskUse=True)
+        counts["hour"] = sum(int((end - start) / timedelta(hours=1)) for start, end in hour_ranges)
+
+        touched_buckets = touched_starts
+        finer = "hour"
+        for granularity in ROLLUP_LEVELS[1:]:
+            touched_buckets = sorted({_bucket_start(ts, granularity) for ts in touched_buckets})
+            ranges = _bucket_ranges(touched_buckets, granularity)
+            if ranges:
+                get_rollup_collection(finer).aggregate(
+                    _coarser_pipeline(_range_match("_id", ranges), granularity) + [_merge_stage(granularity)],
+                    allowDiskUse=True)
+            counts[granularity] = len(touched_buckets)
+            finer = granularity
+
+    state.update_one(
+        {"_id": ROLLUP_STATE_ID},
+        {"$set": {_checkpoint_field(): marker, "updated_at": datetime.now()}},
+        upsert=True
+    )
+    refresh_energy_profiles()
+    return counts
+
+def _profile_pipeline(since):
+    """
+    Pool per-sensor hourly rollups by sensor and hour of week (0 = Monday
+    00:00) into reading-level mean and std.
+    """
+    return [
+        {"$match": {"start": {"$gte": since}}},
+        {"$group": {
+            "_id": {
+                "sensor_id": "$sensor_id",
+                "hour_of_week": {"$add": [
+                    {"$multiply": [{"$subtract": [{"$isoDayOfWeek": "$start"}, 1]}, 24]},
+                    {"$hour": "$start"},
+                ]},
+            },
+            "sum": {"$sum": "$sum"},
+            "count": {"$sum": "$count"},
+            "parts": {"$push": {"count": "$count", "mean": "$mean", "m2": "$m2"}},
+        }},
+        *_merge_parts_stages(),
+        {"$set": {
+            "sensor_id": "$_id.sensor_id",
+            "hour_of_week": "$_id.hour_of_week",
+            "std": sample_std(),
+            "updated_at": "$$NOW",
+        }},
+        # Replaces the collection, so sensors that stopped reporting drop out
+        {"$out": get_energy_profile_collection().name},
+    ]
+
+def refresh_energy_profiles(weeks=PROFILE_WEEKS):
+    """
+    Rebuild the per-sensor hour-of-week baselines from the last `weeks`
+    weeks of per-sensor hourly rollups.
+
+    Runs on the server over at most 168 * weeks rollup documents per sensor
+    and writes 168 profile documents per sensor, so its cost does not
+    depend on how many readings there are.
+    """
+    since = _bucket_start(datetime.now(), "hour") - timedelta(weeks=weeks)
+    get_rollup_collection(SENSOR_LEVEL).aggregate(_profile_pipeline(since), allowDiskUse=True)
+
+@st.cache_data(ttl = 300)
+def load_energy_profiles():
+    """
+    Per-sensor hour-of-week baselines as arrays indexed by hour of week (0 = Monday 00:00).
+
+    Returns:
+        dict: sensor_id -> (mean, std) float64 arrays of length 168, NaN for
+        hours without data
+    """
+    profiles = {}
+    for doc in get_energy_profile_collection().find({}, {"sensor_id": 1, "hour_of_week": 1, "mean": 1, "std": 1}):
+        mean, std = profiles.setdefault(doc.get("sensor_id"), (np.full(168, np.nan), np.full(168, np.nan)))
+        mean[int(doc["hour_of_week"])] = doc["mean"]
+        if doc.get("std") is not None:
+            std[int(doc["hour_of_week"])] = doc["std"]
+    return profiles
+
+# Shown by pages reading rollups before the first refresh has run
+ROLLUPS_MISSING_MESSAGE = ("Energy rollups have not been built yet. Enable the scheduler "
+                           "(EMADS_SCHEDULER=app or `python scheduler.py run`) or run "
+                           "`python rollups.py` once.")
+
+@st.cache_data(ttl = 60)
+def rollups_built():
+    """Whether refresh_rollups has completed for the current rollup layout"""
+    return get_rollup_state_collection().find_one({"_id": ROLLUP_STATE_ID}, {"_id": 1}) is not None
+
+@st.cache_data(ttl = 60)
+def load_rollups(granularity, start_time=None, end_time=None):
+    """
+    Read rollup buckets in [start_time, end_time).
+
+    Returns:
+        pd.DataFrame: 'timestamp' (bucket start), 'sum', 'count', 'min',
+        'max', 'mean', 'm2' (sum of squared deviations from the mean), plus
+        the derived sample 'std'
+    """
+    if granularity not in ROLLUP_LEVELS:
+        raise ValueError(f"Unknown rollup granularity: {granularity}")
+    match = {}
+    if start_time is not None:
+        match.setdefault("_id", {})["$gte"] = start_time
+    if end_time is not None:
+        match.setdefault("_id", {})["$lt"] = end_time
+
+    rows = list(get_rollup_collection(granularity).find(match).sort("_id", 1))
+    df = pd.DataFrame(rows, columns=["_id", "sum", "count", "min", "max", "mean", "m2"])
+    df = df.rename(columns={"_id": "timestamp"})
+    df["timestamp"] = pd.to_datetime(df["timestamp"])
+    df["std"] = np.sqrt(df["m2"].clip(lower=0) / (df["count"] - 1)).where(df["count"] > 1)
+    return df
+
+if __name__ == "__main__":
+    print(refresh_rollups())
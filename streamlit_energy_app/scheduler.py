@@ -0,0 +1,362 @@
+import argparse
+import importlib
+import logging
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+import streamlit as st
+from pymongo.errors import DuplicateKeyError
+
+from db import get_job_locks_collection, get_job_runs_collection
+
+logger = logging.getLogger(__name__)
+
+# Scheduled jobs. 'cron' is a five-field cron spec (minute hour day month
+# weekday) in local time and can be overridden with EMADS_CRON_<NAME>;
+# 'target' is 'module:function', imported when the job first runs. 'lease'
+# bounds how long a replica that died mid-run keeps the job locked; a live
+# run renews it every lease / 3 (see run_job), however long it takes.
+JOBS = {
+    "alert_checks": {
+        "cron": "*/5 * * * *",
+        "target": "alerts:run_alert_checks",
+        "lease": timedelta(minutes=10),
+    },
+    "rollups": {
+        "cron": "*/15 * * * *",
+        "target": "rollups:refresh_rollups",
+        "lease": timedelta(minutes=15),
+    },
+    "energy_snapshot": {
+        "cron": "30 0 * * *",          # Daily 00:30
+        "target": "energy_snapshot:compact_snapshot",
+        "lease": timedelta(hours=1),
+    },
+    "score_cleanup": {
+        "cron": "0 4 * * *",           # Daily 04:00
+        "target": "score_store:drop_stale_scores",
+        "lease": timedelta(minutes=30),
+    },
+    "weekly_report": {
+        "cron": "0 7 * * 1",           # Mondays 07:00
+        "target": "weekly_report:generate_weekly_report",
+        "lease": timedelta(minutes=30),
+    },
+    "retraining": {
+        "cron": "0 3 * * 0",           # Sundays 03:00
+        "target": "training_jobs:run_scheduled_training",
+        "lease": timedelta(hours=2),
+    },
+}
+
+# A slot missed by more than this (e.g. every replica was down) is skipped
+MISFIRE_GRACE = timedelta(minutes=10)
+POLL_SECONDS = 30
+
+# "app" runs the scheduler inside every Streamlit process; leave it "off"
+# when `python scheduler.py run` is deployed instead
+SCHEDULER_MODE = os.getenv("EMADS_SCHEDULER", "off")
+
+def _parse_field(field, low, high):
+    values = set()
+    for part in field.split(","):
+        part, _, step = part.partition("/")
+        step = int(step) if step else 1
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start, end = (int(value) for value in part.split("-"))
+        else:
+            start = int(part)
+            end = high if step > 1 else start
+        if start < low or end > high or start > end or step < 1:
+            raise ValueError(f"Cron field out of range: {field!r}")
+        values.update(range(start, end + 1, step))
+    return frozenset(values)
+
+class CronSpec:
+    """
+    A five-field cron spec: minute, hour, day of month, month, day of week.
+
+    Fields accept '*', numbers, ranges, lists and '/step'. Days of week run
+    from 0 (Sunday) to 6, with 7 also meaning Sunday. As in cron, when both
+    day fields are restricted a day matches either of them.
+    """
+
+    def __init__(self, spec):
+        fields = spec.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron spec needs 5 fields: {spec!r}")
+        self.spec = spec
+        self.minutes = _parse_field(fields[0], 0, 59)
+        self.hours = _parse_field(fields[1], 0, 23)
+        self.days = _parse_field(fields[2], 1, 31)
+        self.months = _parse_field(fields[3], 1, 12)
+        self.weekdays = frozenset(day % 7 for day in _parse_field(fields[4], 0, 7))
+        self.any_day = fields[2] == "*"
+        self.any_weekday = fields[4] == "*"
+
+    def _day_matches(self, dt):
+        if dt.month not in self.months:
+            return False
+        day = dt.day in self.days
+        weekday = (dt.weekday() + 1) % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def matches(self, dt):
+        return self._day_matches(dt) and dt.hour in self.hours and dt.minute in self.minutes
+
+    def previous(self, now, horizon=timedelta(days=366 * 5)):
+        """Latest matching minute at or before now, or None within the horizon"""
+        dt = now.replace(second=0, microsecond=0)
+        limit = dt - horizon
+        while dt > limit:
+            if not self._day_matches(dt):
+                dt = dt.replace(hour=23, minute=59) - timedelta(days=1)
+            elif dt.hour not in self.hours:
+                dt = dt.replace(minute=59) - timedelta(hours=1)
+            elif dt.minute not in self.minutes:
+                dt -= timedelta(minutes=1)
+            else:
+                return dt
+        return None
+
+    def next(self, now, horizon=timedelta(days=366 * 5)):
+        """Earliest matching minute after now, or None within the horizon"""
+        dt = now.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = dt + horizon
+        while dt < limit:
+            if not self._day_matches(dt):
+                dt = (dt + timedelta(days=1)).replace(hour=0, minute=0)
+            elif dt.hour not in self.hours:
+                dt = (dt + timedelta(hours=1)).replace(minute=0)
+            elif dt.minute not in self.minutes:
+                dt += timedelta(minutes=1)
+            else:
+                return dt
+        return None
+
+def job_cron(name, job):
+    """Cron spec of a job, after the EMADS_CRON_<NAME> override"""
+    return CronSpec(os.getenv(f"EMADS_CRON_{name.upper()}", job["cron"]))
+
+def default_owner():
+    """Identity of this process in job_locks"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+def acquire_lease(name, slot, owner, lease):
+    """
+    Claim a job's slot for this process.
+
+    The lock document holds the last slot claimed and a lease. A slot is
+    claimed only when it is newer than the last one and the lease has
+    expired, in a single atomic update, so each slot runs on exactly one
+    replica even when all of them poll at once. A replica that dies
+    mid-run holds the job until its lease runs out.
+
+    Returns:
+        bool: True when this process now holds the job
+    """
+    now = datetime.now()
+    try:
+        get_job_locks_collection().find_one_and_update(
+            {"_id": name, "slot": {"$lt": slot}, "lease_until": {"$lte": now}},
+            {"$set": {"slot": slot, "owner": owner, "acquired_at": now, "lease_until": now + lease}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # The document exists but another replica holds it or took this slot
+        return False
+    return True
+
+def release_lease(name, owner):
+    """End this process's lease on a job so the next slot can be claimed"""
+    get_job_locks_collection().update_one(
+        {"_id": name, "owner": owner},
+        {"$set": {"lease_until": datetime.now()}}
+    )
+
+def renew_lease(name, owner, lease):
+    """
+    Extend this process's lease on a job.
+
+    Returns:
+        bool: False when the lease is no longer held by this process
+    """
+    result = get_job_locks_collection().update_one(
+        {"_id": name, "owner": owner},
+        {"$set": {"lease_until": datetime.now() + lease}}
+    )
+    return bool(result.matched_count)
+
+def _heartbeat(name, owner, lease, stop):
+    """Renew the lease every lease / 3 until stop is set"""
+    while not stop.wait(lease.total_seconds() / 3):
+        try:
+            if not renew_lease(name, owner, lease):
+                logger.warning("Scheduled job %s lost its lease to another replica", name)
+                return
+        except Exception:
+            # Keep trying; the lease has two more intervals to run
+            logger.exception("Lease renewal for %s failed", name)
+
+def run_job(name, job, slot, owner):
+    """
+    Run one slot of a job if this process can claim it, and record the run.
+
+    While the job runs a heartbeat thread keeps extending the lease, so a
+    run that outlasts its lease is not started again by another replica.
+
+    Returns:
+        dict: The job_runs document, or None when another replica has the slot
+    """
+    if not acquire_lease(name, slot, owner, job["lease"]):
+        return None
+    runs = get_job_runs_collection()
+    run = {"job": name, "slot": slot, "owner": owner, "status": "running", "started_at": datetime.now()}
+    run["_id"] = runs.insert_one(dict(run)).inserted_id
+    stop_heartbeat = threading.Event()
+    threading.Thread(target=_heartbeat, args=(name, owner, job["lease"], stop_heartbeat),
+                     name=f"lease-{name}", daemon=True).start()
+    try:
+        module_name, func_name = job["target"].split(":")
+        func = getattr(importlib.import_module(module_name), func_name)
+        func(**job.get("kwargs", {}))
+        run["status"] = "succeeded"
+    except Exception as e:
+        run["status"] = "failed"
+        run["error"] = f"{type(e).__name__}: {e}"
+        logger.exception("Scheduled job %s failed", name)
+    finally:
+        stop_heartbeat.set()
+        run["finished_at"] = datetime.now()
+        run["duration_s"] = (run["finished_at"] - run["started_at"]).total_seconds()
+        runs.update_one({"_id": run["_id"]}, {"$set": {
+            key: run[key] for key in ("status", "finished_at", "duration_s", "error") if key in run
+        }})
+        release_lease(name, owner)
+    return run
+
+class Scheduler:
+    """
+    Polls the job specs and runs each due slot on a thread of its own.
+
+    Every replica may run a Scheduler; acquire_lease makes sure only one of
+    them runs a given slot. A job whose previous run is still going in this
+    process is not started again.
+    """
+
+    def __init__(self, jobs=JOBS, owner=None, poll_seconds=POLL_SECONDS):
+        self.jobs = {name: {**job, "cron": job_cron(name, job)} for name, job in jobs.items()}
+        self.owner = owner or default_owner()
+        self.poll_seconds = poll_seconds
+        self._seen = {}
+        self._running = set()
+        self._lock = threading.Lock()
+
+    def due(self, now=None):
+        """(name, slot) of every job with a slot this scheduler has not handled yet"""
+        now = now or datetime.now()
+        due = []
+        for name, job in self.jobs.items():
+            slot = job["cron"].previous(now)
+            if slot is None or now - slot > MISFIRE_GRACE or slot <= self._seen.get(name, datetime.min):
+                continue
+            due.append((name, slot))
+        return due
+
+    def _run(self, name, slot):
+        try:
+            run_job(name, self.jobs[name], slot, self.owner)
+        finally:
+            with self._lock:
+                self._running.discard(name)
+
+    def tick(self, now=None):
+        """Start the due jobs"""
+        for name, slot in self.due(now):
+            with self._lock:
+                if name in self._running:
+                    continue
+                self._running.add(name)
+            self._seen[name] = slot
+            threading.Thread(target=self._run, args=(name, slot),
+                             name=f"job-{name}", daemon=True).start()
+
+    def run(self, stop=None):
+        """Tick every poll_seconds until stop is set"""
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            try:
+                self.tick()
+            except Exception:
+                # A lost connection must not end the loop; the next tick retries
+                logger.exception("Scheduler tick failed")
+            stop.wait(self.poll_seconds)
+
+@st.cache_resource
+def start_scheduler():
+    """Start the in-process scheduler once per process when EMADS_SCHEDULER=app"""
+    if SCHEDULER_MODE != "app":
+        return None
+    scheduler = Scheduler()
+    threading.Thread(target=scheduler.run, name="emads-scheduler", daemon=True).start()
+    return scheduler
+
+def job_status(jobs=JOBS, recent=20):
+    """
+    Last run, mean duration of recent runs and next slot of every job.
+
+    Returns:
+        list: One dict per job
+    """
+    runs = get_job_runs_collection()
+    now = datetime.now()
+    rows = []
+    for name, job in jobs.items():
+        history = list(runs.find({"job": name}, sort=[("started_at", -1)], limit=recent))
+        durations = [run["duration_s"] for run in history if "duration_s" in run]
+        last = history[0] if history else {}
+        rows.append({
+            "job": name,
+            "cron": job_cron(name, job).spec,
+            "next_slot": job_cron(name, job).next(now),
+            "last_status": last.get("status"),
+            "last_started_at": last.get("started_at"),
+            "last_owner": last.get("owner"),
+            "last_duration_s": last.get("duration_s"),
+            "mean_duration_s": sum(durations) / len(durations) if durations else None,
+            "failures": sum(run["status"] == "failed" for run in history),
+        })
+    return rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run EMADS scheduled jobs")
+    parser.add_argument("command", choices=["run", "run-once", "status"])
+    parser.add_argument("job", nargs="?", choices=list(JOBS), help="Job for run-once")
+    parser.add_argument("--poll-seconds", type=int, default=POLL_SECONDS)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == "run":
+        Scheduler(poll_seconds=args.poll_seconds).run()
+    elif args.command == "run-once":
+        if args.job is None:
+            parser.error("run-once needs a job name")
+        run = run_job(args.job, JOBS[args.job], datetime.now().replace(second=0, microsecond=0),
+                      default_owner())
+        if run is None:
+            print(f"{args.job} is running elsewhere or already ran this minute.")
+        else:
+            print(f"{args.job}: {run['status']} in {run['duration_s']:.1f}s {run.get('error', '')}")
+    else:
+        for row in job_status():
+            mean = f"{row['mean_duration_s']:.1f}s" if row["mean_duration_s"] is not None else "-"
+            print(f"{row['job']} [{row['cron']}] next {row['next_slot']}, "
+                  f"last {row['last_status'] or 'never'} at {row['last_started_at']} "
+                  f"on {row['last_owner']}, mean {mean}, {row['failures']} failure(s) recently")
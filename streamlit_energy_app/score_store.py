@@ -0,0 +1,215 @@
+import hashlib
+import logging
+import pickle
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from anomaly_detection.parallel_scoring import parallel_decision_scores
+from anomaly_detection.quantile_sketch import TDigest
+from anomaly_detection.scoring import labels_from_scores
+from db import get_anomaly_scores_collection, get_score_sketch_collection
+from model_registry import get_model_registry
+
+logger = logging.getLogger(__name__)
+
+WRITE_BATCH_SIZE = 5000
+
+# Registry models whose scores are persisted here (anomalies and reports pages)
+SCORED_MODELS = ("isolation_forest", "isolation_forest_report")
+
+# Share of the most anomalous scores that fall in each severity level
+SEVERITY_QUANTILES = {"high": 0.005, "medium": 0.01, "low": 0.02}
+
+def model_version(model):
+    """Short hash of a fitted model's pickled state; changes whenever the model does"""
+    return hashlib.sha256(pickle.dumps(model)).hexdigest()[:16]
+
+@st.cache_resource
+def _artifact_version(path, _model):
+    return model_version(_model)
+
+def load_scoring_model(name="isolation_forest", version=None):
+    """
+    Load a model through the registry together with the version its scores are stored under.
+
+    Trained artifacts carry their version in the name; for the bundled file
+    the hash is computed once per process.
+
+    Returns:
+        tuple: (model, version, path)
+    """
+    loaded = get_model_registry().get(name, version)
+    if loaded.version != "bundled":
+        return loaded.model, loaded.version, loaded.path
+    return loaded.model, _artifact_version(loaded.path, loaded.model), loaded.path
+
+def score_readings(df, model, version, sensor_id=None, model_path=None, progress=None):
+    """
+    Attach Isolation Forest scores to readings, reusing persisted ones.
+
+    Scores live in the anomaly_scores collection, one document per reading
+    keyed by (model_version, sensor_id, timestamp, seq), where seq numbers
+    readings that share a timestamp. A stored score is reused when its
+    energy_wh still matches; missing or stale rows are scored and written
+    back, so each reading is scored once per model version. Scores of newly
+    scored readings in the combined series also feed the version's quantile
+    sketch (see update_score_sketch).
+
+    Args:
+        df (pd.DataFrame): Readings with 'timestamp' and 'energy_wh', sorted by timestamp
+        model: Fitted IsolationForest
+        version (str): model_version(model)
+        sensor_id (str): Sensor the readings belong to, or None for the combined series
+        model_path (str): joblib file holding model, shared by the scoring workers
+        progress (callable): Receives the completed fraction while scoring
+
+    Returns:
+        pd.DataFrame: A copy of df with 'anomaly_score' (decision_function, below
+        zero means anomalous) and 'anomaly' (-1 anomalous, 1 normal)
+    """
+    df = df.copy()
+    if df.empty:
+        df["anomaly_score"] = pd.Series(dtype="float64")
+        df["anomaly"] = pd.Series(dtype="int64")
+        return df
+
+    collection = get_anomaly_scores_collection()
+    seq = df.groupby("timestamp").cumcount().to_numpy()
+    energy = df["energy_wh"].to_numpy(dtype="float64")
+
+    stored = pd.DataFrame(
+        list(collection.find(
+            {
+                "model_version": version,
+                "sensor_id": sensor_id,
+                "timestamp": {"$gte": df["timestamp"].min(), "$lte": df["timestamp"].max()},
+            },
+            {"_id": 0, "timestamp": 1, "seq": 1, "energy_wh": 1, "score": 1}
+        )),
+        columns=["timestamp", "seq", "energy_wh", "score"]
+    )
+    keys = pd.DataFrame({"timestamp": df["timestamp"].to_numpy(), "seq": seq})
+    stored["timestamp"] = pd.to_datetime(stored["timestamp"])
+    stored["seq"] = stored["seq"].astype("int64")
+    matched = keys.merge(stored, on=["timestamp", "seq"], how="left")
+
+    scores = matched["score"].to_numpy(dtype="float64")
+    stored_energy = matched["energy_wh"].to_numpy(dtype="float64")
+    # A NaN reading whose NaN was scored is not a change
+    changed = (stored_energy != energy) & ~(np.isnan(stored_energy) & np.isnan(energy))
+    stale = np.isnan(scores) | changed
+    if stale.any():
+        scores[stale] = parallel_decision_scores(
+            model, energy[stale], model_path=model_path, progress=progress)
+        _write_scores(collection, version, sensor_id,
+                      df["timestamp"].to_numpy()[stale], seq[stale], energy[stale], scores[stale])
+        # Rescored rows were counted once already; only unseen readings are added
+        new_rows = matched["score"].isna().to_numpy()
+        if sensor_id is None and new_rows.any():
+            update_score_sketch(version, scores[new_rows])
+
+    df["anomaly_score"] = scores
+    df["anomaly"] = labels_from_scores(scores)
+    return df
+
+def _write_scores(collection, version, sensor_id, timestamps, seq, energy, scores):
+    scored_at = datetime.now()
+    operations = [
+        UpdateOne(
+            {"model_version": version, "sensor_id": sensor_id,
+             "timestamp": pd.Timestamp(ts).to_pydatetime(), "seq": int(s)},
+            {"$set": {"energy_wh": float(e), "score": float(score), "scored_at": scored_at}},
+            upsert=True
+        )
+        for ts, s, e, score in zip(timestamps, seq, energy, scores)
+    ]
+    for start in range(0, len(operations), WRITE_BATCH_SIZE):
+        collection.bulk_write(operations[start:start + WRITE_BATCH_SIZE], ordered=False)
+
+def update_score_sketch(version, scores, retries=5):
+    """
+    Fold newly computed scores into the model version's t-digest.
+
+    The stored digest is updated with optimistic concurrency: the new scores
+    are summarised in their own digest and merged into whatever is stored,
+    retrying if another process saved in between. Severity cutoffs are
+    recomputed on every save so readers only fetch a few numbers.
+
+    Returns:
+        bool: Whether the scores were saved; a warning is logged when every
+        retry lost the race and the scores are left out of the sketch
+    """
+    collection = get_score_sketch_collection()
+    delta = TDigest().update(scores)
+    for _ in range(retries):
+        doc = collection.find_one({"_id": version})
+        digest = delta if doc is None else TDigest.from_dict(doc["digest"]).merge(delta)
+        fields = {
+            "digest": digest.to_dict(),
+            "count": digest.count,
+            "cutoffs": {level: digest.quantile(q) for level, q in SEVERITY_QUANTILES.items()},
+            "updated_at": datetime.now(),
+        }
+        if doc is None:
+            try:
+                collection.insert_one({"_id": version, "revision": 1, **fields})
+                return True
+            except DuplicateKeyError:
+                continue
+        result = collection.update_one(
+            {"_id": version, "revision": doc["revision"]},
+            {"$set": fields, "$inc": {"revision": 1}}
+        )
+        if result.modified_count:
+            return True
+    logger.warning("Score sketch of model %s changed concurrently %d times; %d scores were not added",
+                   version, retries, len(scores))
+    return False
+
+@st.cache_data(ttl=60)
+def severity_cutoffs(version):
+    """
+    Score cutoffs for the 'high', 'medium' and 'low' severity levels.
+
+    A score at or below a cutoff is at least that severe. Cutoffs only apply
+    to scores of the model version whose sketch they come from.
+
+    Args:
+        version (str): Model version the scores being graded came from
+
+    Returns:
+        dict: Level -> cutoff, or None when that version has scored nothing yet
+    """
+    doc = get_score_sketch_collection().find_one({"_id": version}, {"cutoffs": 1})
+    return doc["cutoffs"] if doc else None
+
+def drop_stale_versions(versions):
+    """Delete scores written by any model version not in versions"""
+    return get_anomaly_scores_collection().delete_many(
+        {"model_version": {"$nin": list(versions)}}).deleted_count
+
+def drop_stale_scores(names=SCORED_MODELS):
+    """
+    Scheduled cleanup: keep only the scores of each scored model's current version.
+
+    Scores of every model share the anomaly_scores collection, so the
+    current version of each registry name in names is kept. Models whose
+    artifact is missing are skipped; nothing is deleted when none loads.
+
+    Returns:
+        int: Number of score documents deleted
+    """
+    versions = []
+    for name in names:
+        try:
+            versions.append(load_scoring_model(name)[1])
+        except FileNotFoundError:
+            continue
+    if not versions:
+        return 0
+    return drop_stale_versions(versions)
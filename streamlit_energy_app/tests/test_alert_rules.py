@@ -0,0 +1,81 @@
+import unittest
+import pandas as pd
+import numpy as np
+import sys
+import os
+from datetime import datetime, timedelta
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from alert_rules import ALERT_RULES, attach_baselines, evaluate_rules
+
+class TestAlertRules(unittest.TestCase):
+    def setUp(self):
+        """Two sensors with hourly readings over the last two days"""
+        self.now = datetime(2024, 1, 3)
+        timestamps = pd.date_range(self.now - timedelta(hours=47), periods=48, freq='h')
+        rng = np.random.default_rng(0)
+        frames = []
+        for sensor in ['s1', 's2']:
+            energy = 100 + rng.normal(0, 1, len(timestamps))
+            scores = np.full(len(timestamps), 0.1)
+            frames.append(pd.DataFrame({'sensor_id': sensor, 'timestamp': timestamps,
+                                        'energy_wh': energy, 'anomaly_score': scores}))
+        self.window = pd.concat(frames, ignore_index=True)
+
+    def test_quiet_window_has_no_alerts(self):
+        alerts = evaluate_rules(self.window, ALERT_RULES, self.now)
+        self.assertTrue(alerts.empty)
+
+    def test_spike_and_run_are_found_per_sensor(self):
+        s1 = self.window.index[self.window['sensor_id'] == 's1']
+        s2 = self.window.index[self.window['sensor_id'] == 's2']
+        self.window.loc[s1[40], 'energy_wh'] = 250.0      # +150%: high severity spike
+        self.window.loc[s2[30:33], 'anomaly_score'] = -0.2  # Three anomalies in a row
+        # A run split across sensors is not a run
+        self.window.loc[s1[-1], 'anomaly_score'] = -0.2
+        self.window.loc[s2[0], 'anomaly_score'] = -0.2
+
+        alerts = evaluate_rules(self.window, ALERT_RULES, self.now)
+        spikes = alerts[alerts['type'] == 'energy_spike']
+        self.assertEqual(len(spikes), 1)
+        self.assertEqual(spikes.iloc[0]['sensor_id'], 's1')
+        self.assertEqual(spikes.iloc[0]['severity'], 'high')
+
+        runs = alerts[alerts['type'] == 'consecutive_anomalies']
+        self.assertEqual(len(runs), 1)
+        self.assertEqual(runs.iloc[0]['sensor_id'], 's2')
+        self.assertEqual(runs.iloc[0]['count'], 3)
+        self.assertEqual(runs.iloc[0]['detected_at'], self.window.loc[s2[32], 'timestamp'])
+        self.assertIn('3 successive anomalies', runs.iloc[0]['message'])
+
+    def test_unusual_pattern_uses_hour_of_week_baseline(self):
+        mean = np.full(168, 100.0)
+        std = np.full(168, 5.0)
+        # Only s1 has a profile; s2 falls back to its own window
+        window = attach_baselines(self.window, {'s1': (mean, std)})
+        self.assertTrue(window.loc[window['sensor_id'] == 's2', 'baseline_mean'].isna().all())
+        s1 = window.index[window['sensor_id'] == 's1']
+        window.loc[s1[-2], 'energy_wh'] = 120.0      # 4 std above the baseline
+
+        alerts = evaluate_rules(window, ALERT_RULES, self.now)
+        unusual = alerts[alerts['type'] == 'unusual_pattern']
+        self.assertEqual(list(unusual['detected_at']), [window.loc[s1[-2], 'timestamp']])
+        self.assertAlmostEqual(unusual.iloc[0]['expected_mean'], 100.0)
+        self.assertAlmostEqual(unusual.iloc[0]['band'], 10.0)
+
+    def test_readings_without_sensor_form_their_own_sensor(self):
+        window = self.window.copy()
+        window['sensor_id'] = window['sensor_id'].where(window['sensor_id'] == 's1', None)
+        unnamed = window.index[window['sensor_id'].isna()]
+        window.loc[unnamed[40], 'energy_wh'] = 250.0
+        window.loc[unnamed[30:33], 'anomaly_score'] = -0.2
+
+        alerts = evaluate_rules(window, ALERT_RULES, self.now)
+        found = alerts[alerts['type'].isin(['energy_spike', 'consecutive_anomalies'])]
+        self.assertEqual(sorted(found['type']), ['consecutive_anomalies', 'energy_spike'])
+        self.assertTrue(found['sensor_id'].isna().all())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import unittest
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+import sys
+import os
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from alert_rules import ALERT_RULES
+from alert_worker import AlertWorker
+
+SPIKE_RULES = [rule for rule in ALERT_RULES if rule["type"] == "energy_spike"]
+
+# Replica set to run the change stream test against, e.g. a local
+# single-node set started with `mongod --replSet rs0` and rs.initiate()
+REPLICA_SET_URI = os.getenv("EMADS_TEST_REPLICA_SET_URI")
+
+def readings(start, values, sensor_id="s1"):
+    return [{"sensor_id": sensor_id, "timestamp": start + timedelta(minutes=15 * i), "energy_wh": value}
+            for i, value in enumerate(values)]
+
+class TestAlertWorker(unittest.TestCase):
+    def test_only_new_readings_raise_alerts(self):
+        worker = AlertWorker(rules=SPIKE_RULES)
+        start = datetime(2024, 1, 1)
+        # A spike in the first batch has been evaluated and is not reported again
+        first_new = worker.add_readings(readings(start, [100, 300, 100, 100]))
+        self.assertEqual(len(worker.evaluate(first_new)), 1)
+
+        batch = readings(start + timedelta(hours=1), [100, 250]) + \
+            readings(start + timedelta(hours=1), [50, 55], sensor_id="s2")
+        candidates = worker.evaluate(worker.add_readings(batch))
+        self.assertEqual(candidates["sensor_id"].tolist(), ["s1"])
+        self.assertAlmostEqual(candidates["pct_change"].iloc[0], 150.0)
+
+        # Replayed events are skipped
+        self.assertEqual(worker.add_readings(batch), {})
+        self.assertEqual(worker.processed, 8)
+        self.assertEqual(worker.watermark, start + timedelta(hours=1, minutes=15))
+
+    def test_late_readings_are_evaluated_once(self):
+        worker = AlertWorker(rules=SPIKE_RULES)
+        start = datetime(2024, 1, 1)
+        worker.add_readings(readings(start, [100, 100, 100, 100]))
+        # s2 lags behind s1; its window still ends at its own newest reading
+        late = [{"_id": "late-1", "sensor_id": "s1", "timestamp": start + timedelta(minutes=20),
+                 "energy_wh": 300},
+                {"_id": "s2-1", "sensor_id": "s2", "timestamp": start - timedelta(hours=30),
+                 "energy_wh": 50},
+                {"_id": "s2-2", "sensor_id": "s2", "timestamp": start - timedelta(hours=29),
+                 "energy_wh": 120}]
+        candidates = worker.evaluate(worker.add_readings(late))
+        self.assertEqual(sorted(candidates["sensor_id"]), ["s1", "s2"])
+        self.assertEqual(worker.add_readings(late), {})
+
+    @unittest.skipUnless(REPLICA_SET_URI, "EMADS_TEST_REPLICA_SET_URI is not set")
+    def test_change_stream_alerts_and_checkpoint(self):
+        from db import get_alerts_collection, get_detector_state_collection, get_energy_collection, get_mongo_client
+
+        os.environ["MONGO_URI"] = REPLICA_SET_URI
+        os.environ["MONGO_DB"] = f"emads_test_{uuid.uuid4().hex[:8]}"
+        get_mongo_client.clear()
+        try:
+            get_energy_collection().insert_many(readings(datetime.now() - timedelta(hours=2), [100, 100]))
+            worker = AlertWorker(rules=SPIKE_RULES, max_await_ms=200)
+            stop = threading.Event()
+            thread = threading.Thread(target=worker.run, args=(stop,))
+            thread.start()
+            time.sleep(1)
+            get_energy_collection().insert_many(readings(datetime.now() - timedelta(minutes=30), [100, 400]))
+
+            deadline = time.monotonic() + 10
+            while time.monotonic() < deadline and not get_alerts_collection().count_documents({}):
+                time.sleep(0.1)
+            stop.set()
+            thread.join(timeout=10)
+
+            alerts = list(get_alerts_collection().find())
+            self.assertEqual([alert["type"] for alert in alerts], ["energy_spike"])
+            checkpoint = get_detector_state_collection().find_one({"_id": "alert_worker"})
+            self.assertIsNotNone(checkpoint["resume_token"])
+            self.assertIsNotNone(checkpoint["watermark"])
+        finally:
+            get_mongo_client().drop_database(os.environ["MONGO_DB"])
+
+if __name__ == '__main__':
+    unittest.main()
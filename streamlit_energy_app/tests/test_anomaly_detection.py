@@ -114,6 +114,13 @@ class TestAnomalyDetection(unittest.TestCase):
         self.assertIn(result_df.loc[200, 'severity'], ['high', 'medium', 'low'])
         self.assertIn(result_df.loc[300, 'severity'], ['high', 'medium', 'low'])
 
+    def test_isolation_forest_detection_is_pure(self):
+        """Test scoring leaves the input frame untouched"""
+        df = self.test_data.copy()
+        detect_anomalies(df, self.model)
+
+        self.assertListEqual(list(df.columns), list(self.test_data.columns))
+
     def test_combined_detection(self):
         """Test combined anomaly detection methods"""
         # Run all detection methods
@@ -0,0 +1,62 @@
+import unittest
+import bson
+import numpy as np
+from datetime import datetime, timedelta
+import sys
+import os
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from columnar import decode_energy_batch
+
+class TestDecodeEnergyBatch(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """Build projected energy documents as the server would return them"""
+        start = datetime(2024, 1, 1)
+        cls.docs = [
+            {'timestamp': start + timedelta(minutes=i), 'energy_wh': i * 0.5}
+            for i in range(100)
+        ]
+        cls.expected_ts = np.array([d['timestamp'] for d in cls.docs], dtype='datetime64[ns]')
+        cls.expected_energy = np.array([d['energy_wh'] for d in cls.docs])
+
+    def _raw(self, docs):
+        return b''.join(bson.encode(doc) for doc in docs)
+
+    def test_fixed_layout(self):
+        """Test the structured-dtype path for date/double documents"""
+        timestamps, energy = decode_energy_batch(self._raw(self.docs))
+
+        self.assertEqual(timestamps.dtype, np.dtype('datetime64[ns]'))
+        np.testing.assert_array_equal(timestamps, self.expected_ts)
+        np.testing.assert_array_equal(energy, self.expected_energy)
+
+    def test_reversed_field_order(self):
+        """Test documents stored with energy_wh before timestamp"""
+        docs = [{'energy_wh': d['energy_wh'], 'timestamp': d['timestamp']} for d in self.docs]
+        timestamps, energy = decode_energy_batch(self._raw(docs))
+
+        np.testing.assert_array_equal(timestamps, self.expected_ts)
+        np.testing.assert_array_equal(energy, self.expected_energy)
+
+    def test_mixed_types_fall_back(self):
+        """Test integer readings fall back to full BSON decoding"""
+        docs = self.docs[:-1] + [{'timestamp': self.docs[-1]['timestamp'], 'energy_wh': 49}]
+        timestamps, energy = decode_energy_batch(self._raw(docs))
+
+        np.testing.assert_array_equal(timestamps, self.expected_ts)
+        self.assertEqual(energy.dtype, np.dtype('float64'))
+        self.assertEqual(energy[-1], 49.0)
+
+    def test_missing_fields_fall_back(self):
+        """Test documents without energy_wh become NaN and ones without a timestamp are skipped"""
+        docs = self.docs[:-2] + [{'timestamp': self.docs[-2]['timestamp']}, {'energy_wh': 1.0}]
+        timestamps, energy = decode_energy_batch(self._raw(docs))
+
+        np.testing.assert_array_equal(timestamps, self.expected_ts[:-1])
+        self.assertTrue(np.isnan(energy[-1]))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+from unittest import mock
+import bson
+import numpy as np
+from datetime import datetime, timedelta
+import sys
+import os
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import energy_buckets
+from energy_buckets import bucket_match, fetch_bucketed_columns
+
+class BucketCollection:
+    """Serves bucket documents the way find_raw_batches would"""
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find_raw_batches(self, query, projection, sort=None):
+        docs = [{'timestamp': d['timestamp'], 'energy_wh': d['energy_wh']} for d in self.docs]
+        return [b''.join(bson.encode(doc) for doc in docs)]
+
+class TestEnergyBuckets(unittest.TestCase):
+    def test_bucket_match_widens_lower_bound(self):
+        """Test a watermark inside an hour selects that hour's bucket"""
+        watermark = datetime(2024, 1, 1, 10, 30)
+        end = datetime(2024, 1, 2)
+        match = bucket_match({'sensor_id': 's1', 'timestamp': {'$gt': watermark, '$lt': end}}, 'hour')
+
+        self.assertEqual(match, {
+            'sensor_id': 's1',
+            'bucket_start': {'$gte': datetime(2024, 1, 1, 10), '$lt': end},
+        })
+
+    def test_fetch_filters_and_sorts(self):
+        """Test readings are cut to the exact range and sorted across buckets"""
+        start = datetime(2024, 1, 1)
+        hour_a = [start + timedelta(minutes=m) for m in range(0, 60, 15)]
+        hour_b = [start + timedelta(hours=1, minutes=m) for m in (30, 0, 45, 15)]
+        collection = BucketCollection([
+            {'timestamp': hour_a, 'energy_wh': [1.0, 2.0, 3.0, 4.0]},
+            {'timestamp': hour_b, 'energy_wh': [7.0, 5.0, 8.0, 6.0]},
+        ])
+
+        timestamps, energy = fetch_bucketed_columns(
+            collection, {'timestamp': {'$gt': hour_a[1], '$lt': start + timedelta(hours=1, minutes=45)}})
+
+        expected = np.array(hour_a[2:] + sorted(hour_b)[:3], dtype='datetime64[ns]')
+        np.testing.assert_array_equal(timestamps, expected)
+        np.testing.assert_array_equal(energy, [3.0, 4.0, 5.0, 6.0, 7.0])
+
+    def test_migration_upserts_sensorless_buckets(self):
+        """Test readings without sensor_id are kept out of the $merge and upserted instead"""
+        bucket = {'sensor_id': None, 'bucket_start': datetime(2024, 1, 1), 'count': 2}
+
+        class Readings:
+            pipelines = []
+
+            def aggregate(self, pipeline, allowDiskUse=False):
+                self.pipelines.append(pipeline)
+                return [] if '$merge' in pipeline[-1] else [bucket]
+
+        buckets = mock.Mock()
+        buckets.name = 'energy_buckets'
+        readings = Readings()
+        with mock.patch.object(energy_buckets, 'get_energy_collection', return_value=readings), \
+                mock.patch.object(energy_buckets, 'get_energy_bucket_collection', return_value=buckets):
+            energy_buckets.migrate_flat_to_buckets('hour')
+
+        merged, upserted = readings.pipelines
+        self.assertEqual(merged[0]['$match'], {'sensor_id': {'$ne': None}})
+        self.assertEqual(upserted[0]['$match'], {'sensor_id': None})
+        operations = buckets.bulk_write.call_args.args[0]
+        self.assertEqual(len(operations), 1)
+        operation = operations[0]
+        self.assertEqual(operation._filter, {'sensor_id': None, 'bucket_start': datetime(2024, 1, 1)})
+        self.assertTrue(operation._upsert)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+import numpy as np
+import pandas as pd
+from datetime import datetime
+import sys
+import os
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from energy_store import EnergySeriesStore
+
+class TestEnergySeriesStore(unittest.TestCase):
+    def setUp(self):
+        """Create a small store that has to grow while appending"""
+        self.store = EnergySeriesStore(initial_capacity=4)
+        self.dates = pd.date_range(start='2024-01-01', periods=10, freq='h')
+
+    def test_append_grows_in_place(self):
+        """Test appends beyond the initial capacity keep every reading"""
+        self.store.append(self.dates[:3].values, np.arange(3))
+        self.store.append(self.dates[3:].values, np.arange(3, 10))
+
+        df = self.store.to_frame()
+        self.assertEqual(len(self.store), 10)
+        self.assertTrue((df['timestamp'].values == self.dates.values).all())
+        self.assertEqual(df['energy_wh'].tolist(), list(map(float, range(10))))
+        self.assertEqual(self.store.watermark, datetime(2024, 1, 1, 9))
+
+    def test_to_frame_range_is_half_open(self):
+        """Test range slicing includes the start and excludes the end"""
+        self.store.append(self.dates.values, np.arange(10))
+
+        df = self.store.to_frame(datetime(2024, 1, 1, 2), datetime(2024, 1, 1, 5))
+        self.assertEqual(df['energy_wh'].tolist(), [2.0, 3.0, 4.0])
+
+    def test_frame_is_independent_of_store(self):
+        """Test returned frames do not alias the store's arrays"""
+        self.store.append(self.dates.values, np.arange(10))
+
+        df = self.store.to_frame()
+        df.loc[0, 'energy_wh'] = -1
+        self.assertEqual(self.store.to_frame().loc[0, 'energy_wh'], 0.0)
+
+    def test_refresh_keeps_readings_at_the_watermark(self):
+        """Test a reading sharing the watermark's timestamp that arrives later is picked up once"""
+        rows = [('s1', self.dates[0], 1.0), ('s1', self.dates[1], 2.0)]
+
+        class Collection:
+            def distinct(self, field):
+                return sorted({row[0] for row in rows})
+
+        def fetch(collection, query, expected=None):
+            start = query.get('timestamp', {}).get('$gte')
+            selected = [row for row in rows
+                        if row[0] == query['sensor_id'] and (start is None or row[1] >= start)]
+            return (np.array([row[1] for row in selected], dtype='datetime64[ns]'),
+                    np.array([row[2] for row in selected], dtype='float64'))
+
+        store = EnergySeriesStore(initial_capacity=4, fetch=fetch)
+        store.refresh(Collection(), force=True)
+        revision = store.revision
+        # Another sensor's reading at the same timestamp, then a newer one
+        rows.append(('s2', self.dates[1], 5.0))
+        rows.append(('s1', self.dates[2], 3.0))
+
+        self.assertEqual(store.refresh(Collection(), force=True), 2)
+        self.assertEqual(store.to_frame()['energy_wh'].tolist(), [1.0, 2.0, 5.0, 3.0])
+        self.assertEqual(store.to_frame(sensor_id='s2')['energy_wh'].tolist(), [5.0])
+        self.assertGreater(store.revision, revision)
+        # Nothing new: the same readings are not appended twice
+        revision = store.revision
+        self.assertEqual(store.refresh(Collection(), force=True), 0)
+        self.assertEqual(len(store), 4)
+        self.assertEqual(store.revision, revision)
+
+    def test_reset_clears_watermark(self):
+        """Test reset empties the store"""
+        self.store.append(self.dates.values, np.arange(10))
+        self.store.reset()
+
+        self.assertEqual(len(self.store), 0)
+        self.assertIsNone(self.store.watermark)
+
+if __name__ == '__main__':
+    unittest.main()
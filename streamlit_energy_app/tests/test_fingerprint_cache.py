@@ -0,0 +1,43 @@
+import unittest
+import pandas as pd
+import sys
+import os
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fingerprint_cache import cache_by_fingerprint, dataset_fingerprint
+
+calls = []
+
+@cache_by_fingerprint
+def total_energy(df, scale=1.0, _label=None):
+    calls.append(_label)
+    return df['energy_wh'].sum() * scale
+
+class TestFingerprintCache(unittest.TestCase):
+    def setUp(self):
+        calls.clear()
+        self.df = pd.DataFrame({'energy_wh': [1.0, 2.0, 3.0]})
+
+    def test_without_fingerprint_runs_every_time(self):
+        self.assertEqual(total_energy(self.df), 6.0)
+        self.assertEqual(total_energy(self.df), 6.0)
+        self.assertEqual(len(calls), 2)
+
+    def test_fingerprint_replaces_the_frame_in_the_key(self):
+        fingerprint = dataset_fingerprint('range-a', 'watermark-1', 'model-x')
+        self.assertEqual(total_energy(self.df, fingerprint=fingerprint), 6.0)
+        # Same fingerprint: cached result, the (different) frame is not looked at
+        other = pd.DataFrame({'energy_wh': [10.0]})
+        self.assertEqual(total_energy(other, _label='ignored', fingerprint=fingerprint), 6.0)
+        self.assertEqual(len(calls), 1)
+
+        # Small arguments are still part of the key
+        self.assertEqual(total_energy(self.df, scale=2.0, fingerprint=fingerprint), 12.0)
+        new_fingerprint = dataset_fingerprint('range-a', 'watermark-2', 'model-x')
+        self.assertEqual(total_energy(other, fingerprint=new_fingerprint), 10.0)
+        self.assertEqual(len(calls), 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+import tempfile
+import numpy as np
+import joblib
+import sys
+import os
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sklearn.ensemble import IsolationForest
+from model_registry import ModelRegistry, available_versions, versioned_path
+
+class TestModelRegistry(unittest.TestCase):
+    def setUp(self):
+        self.model_dir = tempfile.mkdtemp()
+        rng = np.random.default_rng(0)
+        self.model = IsolationForest(n_estimators=20, random_state=42).fit(rng.normal(100, 10, (500, 1)))
+        joblib.dump(self.model, os.path.join(self.model_dir, "IF_model.joblib"))
+        joblib.dump(self.model, versioned_path("isolation_forest", "abc123", self.model_dir))
+
+    def test_versioned_artifact_is_loaded_once_and_memory_mapped(self):
+        registry = ModelRegistry(self.model_dir)
+        loaded = registry.get("isolation_forest", "abc123")
+        self.assertIs(registry.get("isolation_forest", "abc123"), loaded)
+        self.assertEqual(loaded.version, "abc123")
+        self.assertGreater(loaded.mapped_bytes, 0)
+        np.testing.assert_array_equal(loaded.model.predict([[100.0], [1000.0]]),
+                                      self.model.predict([[100.0], [1000.0]]))
+
+        stats = registry.stats()
+        self.assertEqual(len(stats), 1)
+        self.assertGreater(stats[0]["file_bytes"], 0)
+        self.assertNotIn("model", stats[0])
+
+    def test_resolution(self):
+        registry = ModelRegistry(self.model_dir)
+        self.assertEqual(registry.get("isolation_forest_report").version, "bundled")
+        self.assertEqual(available_versions("isolation_forest", self.model_dir), ["abc123"])
+        with self.assertRaises(FileNotFoundError):
+            registry.get("isolation_forest", "missing")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+import unittest
+import numpy as np
+import pandas as pd
+import sys
+import os
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from anomaly_detection.online_detector import RollingZScoreDetector
+
+class TestRollingZScoreDetector(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """Hourly readings with a few spikes"""
+        rng = np.random.default_rng(3)
+        cls.values = rng.normal(1000, 100, 3000)
+        cls.values[[500, 1500, 2500]] *= 3
+        series = pd.Series(cls.values)
+        mean = series.rolling(window=24).mean()
+        std = series.rolling(window=24).std()
+        cls.expected_z = ((series - mean) / std).to_numpy()
+
+    def test_matches_pandas_rolling(self):
+        """Test streamed z-scores match a full rolling recomputation"""
+        result = RollingZScoreDetector(window=24, std_threshold=4).update_many(self.values)
+
+        np.testing.assert_allclose(result['z_score'], self.expected_z, rtol=1e-9, equal_nan=True)
+        self.assertTrue(result.loc[[500, 1500, 2500], 'statistical_anomaly'].all())
+
+    def test_resume_from_checkpoint(self):
+        """Test a detector restored from its state continues identically"""
+        detector = RollingZScoreDetector(window=24, std_threshold=4)
+        detector.update_many(self.values[:1000])
+        resumed = RollingZScoreDetector.from_state(detector.to_state())
+        result = resumed.update_many(self.values[1000:])
+
+        np.testing.assert_allclose(result['z_score'], self.expected_z[1000:], rtol=1e-9)
+
+if __name__ == '__main__':
+    unittest.main()
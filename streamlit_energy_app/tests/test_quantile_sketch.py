@@ -0,0 +1,47 @@
+import unittest
+import numpy as np
+import sys
+import os
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from anomaly_detection.quantile_sketch import TDigest
+
+class TestTDigest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """Scores with a small anomalous cluster in the lower tail"""
+        rng = np.random.default_rng(7)
+        cls.scores = rng.permutation(np.concatenate([
+            rng.normal(0.1, 0.05, 200000),
+            rng.normal(-0.2, 0.05, 4000),
+        ]))
+
+    def assertRankClose(self, digest, q):
+        estimate = digest.quantile(q)
+        self.assertAlmostEqual((self.scores <= estimate).mean(), q, delta=q * 0.05)
+
+    def test_streaming_updates(self):
+        """Test tail quantiles stay accurate when fed in batches"""
+        digest = TDigest()
+        for batch in np.array_split(self.scores, 40):
+            digest.update(batch)
+
+        self.assertEqual(digest.count, len(self.scores))
+        self.assertLess(len(digest.means), 400)
+        for q in (0.005, 0.01, 0.02):
+            self.assertRankClose(digest, q)
+
+    def test_merge_and_round_trip(self):
+        """Test merged digests and serialised digests agree with a single one"""
+        half = len(self.scores) // 2
+        merged = TDigest().update(self.scores[:half]).merge(TDigest().update(self.scores[half:]))
+        restored = TDigest.from_dict(merged.to_dict())
+
+        self.assertRankClose(merged, 0.005)
+        self.assertEqual(restored.quantile(0.01), merged.quantile(0.01))
+        self.assertTrue(np.isnan(TDigest().quantile(0.5)))
+
+if __name__ == '__main__':
+    unittest.main()
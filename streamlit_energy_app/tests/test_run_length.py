@@ -0,0 +1,48 @@
+import unittest
+import numpy as np
+import pandas as pd
+import sys
+import os
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from anomaly_detection.run_length import run_lengths, mark_runs, longest_run, run_events
+
+class TestRunLength(unittest.TestCase):
+    def setUp(self):
+        self.mask = np.array([1, 1, 0, 1, 1, 1, 0, 0, 1, 1, 1, 1], dtype=bool)
+
+    def test_run_lengths(self):
+        """Test runs are labelled with exclusive ends, including one touching the end"""
+        starts, ends, lengths = run_lengths(self.mask)
+        np.testing.assert_array_equal(starts, [0, 3, 8])
+        np.testing.assert_array_equal(ends, [2, 6, 12])
+        np.testing.assert_array_equal(lengths, [2, 3, 4])
+
+    def test_mark_runs_matches_loop(self):
+        """Test mark_runs flags the same points as the running-count loop"""
+        rng = np.random.default_rng(0)
+        mask = rng.random(5000) < 0.6
+        expected = np.zeros(len(mask), dtype=bool)
+        count = 0
+        for i, flag in enumerate(mask):
+            count = count + 1 if flag else 0
+            if count >= 5:
+                expected[i - 4:i + 1] = True
+
+        np.testing.assert_array_equal(mark_runs(mask, 5), expected)
+
+    def test_events(self):
+        """Test the event table and longest run"""
+        timestamps = pd.date_range('2024-01-01', periods=len(self.mask), freq='h')
+        events = run_events(self.mask, timestamps, min_length=3)
+
+        self.assertEqual(events['length'].tolist(), [3, 4])
+        self.assertEqual(events['end_index'].tolist(), [5, 11])
+        self.assertEqual(events.loc[1, 'start_time'], timestamps[8])
+        self.assertEqual(longest_run(self.mask), 4)
+        self.assertEqual(longest_run(np.zeros(3, dtype=bool)), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+from datetime import datetime, timedelta
+import sys
+import os
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scheduler import CronSpec, Scheduler
+
+class TestScheduler(unittest.TestCase):
+    def test_cron_previous_and_next(self):
+        weekly = CronSpec("0 7 * * 1")
+        now = datetime(2024, 5, 15, 12, 34, 56)     # A Wednesday
+        self.assertEqual(weekly.previous(now), datetime(2024, 5, 13, 7, 0))
+        self.assertEqual(weekly.next(now), datetime(2024, 5, 20, 7, 0))
+
+        every_five = CronSpec("*/5 * * * *")
+        self.assertEqual(every_five.previous(now), datetime(2024, 5, 15, 12, 30))
+        self.assertEqual(every_five.next(datetime(2024, 5, 15, 23, 57)), datetime(2024, 5, 16, 0, 0))
+
+        # Both day fields restricted: either one matches
+        either = CronSpec("0 0 1 * 0")
+        self.assertEqual(either.next(now), datetime(2024, 5, 19, 0, 0))
+        self.assertIsNone(CronSpec("0 0 30 2 *").next(now, horizon=timedelta(days=800)))
+        with self.assertRaises(ValueError):
+            CronSpec("60 * * * *")
+
+    def test_due_slots_are_handled_once(self):
+        scheduler = Scheduler(jobs={
+            "checks": {"cron": "*/5 * * * *", "target": "x:y", "lease": timedelta(minutes=1)},
+            "report": {"cron": "0 7 * * 1", "target": "x:y", "lease": timedelta(minutes=1)},
+        }, owner="test")
+        now = datetime(2024, 5, 13, 7, 2)
+        self.assertEqual(scheduler.due(now), [("checks", datetime(2024, 5, 13, 7, 0)),
+                                              ("report", datetime(2024, 5, 13, 7, 0))])
+        scheduler._seen = dict(scheduler.due(now))
+        self.assertEqual(scheduler.due(now + timedelta(minutes=2)), [])
+        # Only slots not handled yet are due
+        self.assertEqual(scheduler.due(now + timedelta(minutes=4)),
+                         [("checks", datetime(2024, 5, 13, 7, 5))])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import unittest
+from unittest import mock
+import sys
+import os
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import score_store
+
+class FakeScores:
+    """Just enough of a collection for drop_stale_versions"""
+
+    def __init__(self, versions):
+        self.docs = [{"model_version": version} for version in versions]
+
+    def delete_many(self, query):
+        keep = query["model_version"]["$nin"]
+        deleted = [doc for doc in self.docs if doc["model_version"] not in keep]
+        self.docs = [doc for doc in self.docs if doc["model_version"] in keep]
+        return mock.Mock(deleted_count=len(deleted))
+
+class TestScoreStore(unittest.TestCase):
+    def test_cleanup_keeps_current_version_of_every_scored_model(self):
+        scores = FakeScores(["if-old", "if-new", "if-new", "report-v1"])
+        versions = {"isolation_forest": "if-new", "isolation_forest_report": "report-v1"}
+        with mock.patch.object(score_store, "get_anomaly_scores_collection", return_value=scores), \
+                mock.patch.object(score_store, "load_scoring_model",
+                                  side_effect=lambda name: (None, versions[name], None)):
+            self.assertEqual(score_store.drop_stale_scores(), 1)
+        self.assertEqual(sorted(doc["model_version"] for doc in scores.docs),
+                         ["if-new", "if-new", "report-v1"])
+
+if __name__ == '__main__':
+    unittest.main()
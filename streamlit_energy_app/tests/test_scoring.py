@@ -0,0 +1,47 @@
+import unittest
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import IsolationForest
+import sys
+import os
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from anomaly_detection.scoring import decision_scores, score_and_label
+from anomaly_detection.parallel_scoring import parallel_decision_scores
+
+class TestScoring(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """Fit models with and without feature names"""
+        rng = np.random.default_rng(42)
+        cls.energy = np.concatenate([rng.normal(1000, 100, 2000), [3000, 50, 2800]])
+        cls.model = IsolationForest(contamination=0.01, random_state=42).fit(cls.energy.reshape(-1, 1))
+        cls.named_model = IsolationForest(contamination=0.01, random_state=42).fit(
+            pd.DataFrame({'energy_wh': cls.energy}))
+
+    def test_matches_decision_function_and_predict(self):
+        """Test chunked single-pass scoring matches the two sklearn calls"""
+        scores, labels = score_and_label(self.model, self.energy, chunk_size=300)
+
+        np.testing.assert_allclose(scores, self.model.decision_function(self.energy.reshape(-1, 1)))
+        np.testing.assert_array_equal(labels, self.model.predict(self.energy.reshape(-1, 1)))
+
+    def test_feature_names(self):
+        """Test models fitted on a DataFrame get named features"""
+        expected = self.named_model.decision_function(pd.DataFrame({'energy_wh': self.energy}))
+        np.testing.assert_allclose(decision_scores(self.named_model, self.energy), expected)
+
+    def test_parallel_scores_in_order(self):
+        """Test pooled scoring reassembles chunks in input order and reports progress"""
+        progress = []
+        scores = parallel_decision_scores(self.model, self.energy, workers=2, chunk_size=500,
+                                          min_rows=0, progress=progress.append)
+
+        np.testing.assert_array_equal(scores, decision_scores(self.model, self.energy))
+        self.assertEqual(progress[-1], 1.0)
+        self.assertEqual(len(progress), 5)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,33 @@
+import unittest
+import tempfile
+import numpy as np
+import joblib
+import sys
+import os
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from training_jobs import train_isolation_forest, training_sample, write_artifact
+
+class TestTrainingJobs(unittest.TestCase):
+    def test_training_sample_is_bounded_and_ordered(self):
+        energy = np.arange(10000, dtype='float64')
+        sample = training_sample(energy, max_samples=500)
+        self.assertEqual(len(sample), 500)
+        self.assertTrue(np.all(np.diff(sample) > 0))
+        np.testing.assert_array_equal(training_sample(energy[:100], max_samples=500), energy[:100])
+
+    def test_artifact_is_versioned(self):
+        rng = np.random.default_rng(0)
+        model = train_isolation_forest(rng.normal(100, 10, 2000))
+        with tempfile.TemporaryDirectory() as model_dir:
+            path, version = write_artifact(model, model_dir)
+            self.assertEqual(os.path.basename(path), f"isolation_forest_{version}.joblib")
+            self.assertEqual(os.listdir(model_dir), [os.path.basename(path)])
+            loaded = joblib.load(path)
+            np.testing.assert_array_equal(loaded.predict([[100.0], [1000.0]]),
+                                          model.predict([[100.0], [1000.0]]))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta
+
+# Relative ranges offered by the page selectors, newest data last
+TIME_RANGES = {
+    "Last 24 hours": timedelta(days=1),
+    "Last 7 days": timedelta(days=7),
+    "Last 30 days": timedelta(days=30),
+    "Last 90 days": timedelta(days=90),
+    "All time": None,
+}
+
+TIME_RANGE_OPTIONS = list(TIME_RANGES)
+
+def floor_to_minute(ts):
+    """Truncate a datetime to the start of its minute."""
+    return ts.replace(second=0, microsecond=0)
+
+def floor_to_hour(ts):
+    """Truncate a datetime to the start of its hour."""
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+def resolve_time_range(label, now=None):
+    """
+    Resolve a relative range label to stable [start, end) boundaries.
+
+    The end is snapped up to the next minute boundary, so every rerun within
+    the same minute resolves to identical values and hits the same cache
+    entries.
+
+    Args:
+        label (str): One of TIME_RANGE_OPTIONS
+        now (datetime): Reference time, defaults to datetime.now()
+
+    Returns:
+        tuple: (start, end) where start is None for "All time"
+    """
+    if label not in TIME_RANGES:
+        raise ValueError(f"Unknown time range: {label}")
+    now = now or datetime.now()
+    end = floor_to_minute(now) + timedelta(minutes=1)
+    span = TIME_RANGES[label]
+    start = end - span if span is not None else None
+    return start, end
+
+def split_range(start, end):
+    """
+    Split a [start, end) range into a stable prefix and a short tail.
+
+    The prefix runs from the hour containing start to the hour containing
+    end, so it stays the same for a whole hour while start and end slide
+    forward minute by minute. The tail covers the rest of the current hour.
+
+    Returns:
+        tuple: (prefix_start, prefix_end, tail_start, tail_end)
+    """
+    prefix_start = floor_to_hour(start) if start is not None else None
+    prefix_end = floor_to_hour(end)
+    return prefix_start, prefix_end, prefix_end, end
@@ -0,0 +1,86 @@
+import argparse
+
+from pymongo.errors import BulkWriteError
+
+from db import (
+    ENERGY_TIMESERIES_GRANULARITY,
+    energy_timeseries_options,
+    get_db,
+    get_energy_collection,
+    get_energy_collection_type,
+    server_supports_timeseries,
+)
+
+def migrate_to_timeseries(granularity=ENERGY_TIMESERIES_GRANULARITY, batch_size=10000, drop_backup=False):
+    """
+    Convert the existing regular energy_data collection to a time-series collection.
+
+    Time-series collections cannot be renamed, so the regular collection is
+    renamed to <name>_flat_backup first, a time-series collection is created
+    under the original name and the documents are copied across in timestamp
+    order. Original _ids are kept so snapshot and rollup checkpoints stay valid.
+
+    Returns:
+        int: Number of documents copied
+    """
+    db = get_db()
+    name = get_energy_collection().name
+    existing = get_energy_collection_type()
+    if existing == "timeseries":
+        print(f"{name} is already a time-series collection.")
+        return 0
+    if not server_supports_timeseries():
+        raise RuntimeError("Time-series collections need MongoDB 5.0 or newer")
+
+    backup_name = f"{name}_flat_backup"
+    if existing is not None:
+        db[name].rename(backup_name)
+    try:
+        db.create_collection(name, timeseries=energy_timeseries_options(granularity))
+    except Exception:
+        if existing is not None:
+            db[backup_name].rename(name)
+        raise
+
+    if existing is None:
+        return 0
+
+    target = db[name]
+    copied = 0
+    batch = []
+    for doc in db[backup_name].find().sort("timestamp", 1).batch_size(batch_size):
+        batch.append(doc)
+        if len(batch) == batch_size:
+            copied += _insert_batch(target, batch)
+            batch = []
+    if batch:
+        copied += _insert_batch(target, batch)
+
+    expected = db[backup_name].count_documents({})
+    if copied != expected:
+        raise RuntimeError(f"Copied {copied} of {expected} documents; {backup_name} was kept")
+    if drop_backup:
+        db[backup_name].drop()
+    return copied
+
+def _insert_batch(collection, batch):
+    try:
+        return len(collection.insert_many(batch, ordered=False).inserted_ids)
+    except BulkWriteError as e:
+        return e.details["nInserted"]
+
+if __name__ == "__main__":
+    from indexes import ensure_indexes
+
+    parser = argparse.ArgumentParser(description="Convert energy_data to a MongoDB time-series collection")
+    parser.add_argument("--granularity", choices=["seconds", "minutes", "hours"],
+                        default=ENERGY_TIMESERIES_GRANULARITY)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--drop-backup", action="store_true", help="Drop the regular collection after copying")
+    args = parser.parse_args()
+
+    copied = migrate_to_timeseries(args.granularity, args.batch_size, args.drop_backup)
+    print(f"Copied {copied} documents.")
+    for name, messages in ensure_indexes().items():
+        for message in messages:
+            print(f"[{name}] index error: {message}")
@@ -0,0 +1,195 @@
+import argparse
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+import joblib
+import numpy as np
+from pymongo.errors import DuplicateKeyError
+from sklearn.ensemble import IsolationForest
+
+from db import get_training_jobs_collection
+from energy_repository import load_energy_data
+from model_registry import MODEL_DIR, versioned_path
+from score_store import model_version
+
+# Train on a sliding window of recent readings, subsampled to a fixed size;
+# the forest only looks at 256 rows per tree, so more rows add little.
+TRAINING_WINDOW_DAYS = int(os.getenv("IF_TRAINING_WINDOW_DAYS", 90))
+TRAINING_MAX_SAMPLES = int(os.getenv("IF_TRAINING_MAX_SAMPLES", 200_000))
+
+# Cores used by a training run; the default leaves the rest to the app
+TRAINING_N_JOBS = int(os.getenv("IF_TRAINING_N_JOBS", 1))
+
+# A job still marked active after this long is assumed to have died
+STALE_JOB_AFTER = timedelta(hours=2)
+
+def training_sample(energy, max_samples=TRAINING_MAX_SAMPLES, seed=42):
+    """Uniform sample of at most max_samples readings, kept in time order"""
+    energy = np.asarray(energy, dtype="float64")
+    if len(energy) <= max_samples:
+        return energy
+    rng = np.random.default_rng(seed)
+    return energy[np.sort(rng.choice(len(energy), max_samples, replace=False))]
+
+def train_isolation_forest(energy, n_jobs=TRAINING_N_JOBS):
+    """Fit the Isolation Forest used by the anomalies page"""
+    model = IsolationForest(
+        n_estimators=200,      # Increased number of trees for better accuracy
+        contamination=0.005,   # 0.5% expected anomalies
+        random_state=42,       # For reproducibility
+        n_jobs=n_jobs,
+        max_samples='auto'
+    )
+    return model.fit(np.asarray(energy, dtype="float64").reshape(-1, 1))
+
+def write_artifact(model, model_dir=MODEL_DIR):
+    """
+    Save a model under a name that includes its version.
+
+    The file is written next to its final name and renamed into place, so a
+    reader never sees a partial artifact.
+
+    Returns:
+        tuple: (path, version)
+    """
+    version = model_version(model)
+    os.makedirs(model_dir, exist_ok=True)
+    path = versioned_path("isolation_forest", version, model_dir)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    joblib.dump(model, tmp_path)
+    os.replace(tmp_path, path)
+    return path, version
+
+def create_training_job(window_days=TRAINING_WINDOW_DAYS, max_samples=TRAINING_MAX_SAMPLES):
+    """
+    Record a queued training job, unless one is already queued or running.
+
+    At most one job carries active=True; a unique partial index on that
+    field makes concurrent requests from several sessions collapse into one.
+
+    Returns:
+        tuple: (job_id, created) where created is False for an existing job
+    """
+    collection = get_training_jobs_collection()
+    now = datetime.now()
+    collection.update_many(
+        {"active": True, "created_at": {"$lt": now - STALE_JOB_AFTER}},
+        {"$set": {"status": "failed", "error": "abandoned", "finished_at": now},
+         "$unset": {"active": ""}}
+    )
+    job = {
+        "status": "queued",
+        "active": True,
+        "window_days": window_days,
+        "max_samples": max_samples,
+        "created_at": now,
+    }
+    try:
+        return collection.insert_one(job).inserted_id, True
+    except DuplicateKeyError:
+        existing = collection.find_one({"active": True}, {"_id": 1})
+        return (existing["_id"] if existing else None), False
+
+def run_training_job(job_id):
+    """
+    Train, save and publish a model for a queued job.
+
+    The job document records progress; on success it holds the artifact
+    path and model version, which model_registry.resolve_model picks up.
+
+    Returns:
+        dict: The finished job document
+    """
+    collection = get_training_jobs_collection()
+    job = collection.find_one_and_update(
+        {"_id": job_id},
+        {"$set": {"status": "running", "started_at": datetime.now()}},
+        return_document=True
+    )
+    started = time.perf_counter()
+    try:
+        end_time = datetime.now()
+        start_time = end_time - timedelta(days=job["window_days"])
+        df = load_energy_data(start_time, end_time)
+        if df.empty:
+            raise ValueError("No energy readings in the training window")
+        energy = training_sample(df["energy_wh"].to_numpy(), job["max_samples"])
+        model = train_isolation_forest(energy)
+        path, version = write_artifact(model)
+        fields = {
+            "status": "succeeded",
+            "model_path": path,
+            "model_version": version,
+            "training_rows": len(energy),
+            "window_rows": len(df),
+        }
+    except Exception as e:
+        fields = {"status": "failed", "error": str(e)}
+    fields.update({"finished_at": datetime.now(), "duration_s": time.perf_counter() - started})
+    return collection.find_one_and_update(
+        {"_id": job_id},
+        {"$set": fields, "$unset": {"active": ""}},
+        return_document=True
+    )
+
+def start_training_job(window_days=TRAINING_WINDOW_DAYS, max_samples=TRAINING_MAX_SAMPLES,
+                       background=True):
+    """
+    Queue a training job and run it, by default on a background thread.
+
+    Returns:
+        ObjectId: The new job, or the one already in progress
+    """
+    job_id, created = create_training_job(window_days, max_samples)
+    if created:
+        if background:
+            threading.Thread(target=run_training_job, args=(job_id,),
+                             name=f"if-training-{job_id}", daemon=True).start()
+        else:
+            run_training_job(job_id)
+    return job_id
+
+def run_scheduled_training(window_days=TRAINING_WINDOW_DAYS, max_samples=TRAINING_MAX_SAMPLES):
+    """
+    Queue and run a training job in the calling thread, for the scheduler.
+
+    A job already queued or running elsewhere is left to finish.
+
+    Raises:
+        RuntimeError: When the job fails, so the scheduled run is recorded as failed
+
+    Returns:
+        ObjectId: The job that ran, or the one already in progress
+    """
+    job_id, created = create_training_job(window_days, max_samples)
+    if created:
+        job = run_training_job(job_id)
+        if job["status"] != "succeeded":
+            raise RuntimeError(f"Training job {job_id} failed: {job.get('error')}")
+    return job_id
+
+def latest_job():
+    """Most recently created training job, or None"""
+    return get_training_jobs_collection().find_one({}, sort=[("created_at", -1)])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the anomaly detection Isolation Forest")
+    parser.add_argument("command", choices=["train", "status"])
+    parser.add_argument("--window-days", type=int, default=TRAINING_WINDOW_DAYS)
+    parser.add_argument("--max-samples", type=int, default=TRAINING_MAX_SAMPLES)
+    args = parser.parse_args()
+
+    if args.command == "train":
+        job_id = start_training_job(args.window_days, args.max_samples, background=False)
+        job = get_training_jobs_collection().find_one({"_id": job_id})
+    else:
+        job = latest_job()
+    if job is None:
+        print("No training jobs.")
+    else:
+        print(f"Job {job['_id']}: {job['status']}")
+        for field in ("model_version", "model_path", "training_rows", "duration_s", "error"):
+            if field in job:
+                print(f"  {field}: {job[field]}")
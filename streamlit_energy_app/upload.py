@@ -1,10 +1,10 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import joblib
 import plotly.express as px
-
-MODEL_PATH = "models/isolation_forest_model.joblib"
+from anomaly_detection.run_length import longest_run
+from anomaly_detection.scoring import score_and_label
+from model_registry import load_model
 
 
 def upload_and_analyze():
@@ -30,15 +30,15 @@ def upload_and_analyze():
 
     # 3) Load model
     try:
-        if_model = joblib.load(MODEL_PATH)
-    except FileNotFoundError:
-        st.error(f"Model file not found at {MODEL_PATH}")
+        if_model = load_model("isolation_forest")
+    except FileNotFoundError as e:
+        st.error(str(e))
         return
 
     # 4) Predict anomalies
-    X = user_df[["energy_wh"]]
-    user_df["anomaly_flag"]  = if_model.predict(X) == -1
-    user_df["anomaly_score"] = if_model.decision_function(X)
+    scores, labels = score_and_label(if_model, user_df["energy_wh"].values)
+    user_df["anomaly_flag"]  = labels == -1
+    user_df["anomaly_score"] = scores
 
     # 5) Summary metrics
     total     = len(user_df)
@@ -46,15 +46,13 @@ def upload_and_analyze():
     rate      = anomalies / total if total else 0.0
 
     # Longest consecutive anomalies
-    runs       = (user_df["anomaly_flag"] != user_df["anomaly_flag"].shift()).cumsum()
-    consec_sum = user_df.groupby(runs)["anomaly_flag"].sum()
-    longest_run = int(consec_sum.max()) if not consec_sum.empty else 0
+    max_run = longest_run(user_df["anomaly_flag"])
 
     c1, c2, c3, c4 = st.columns(4)
     c1.metric("Total Rows", f"{total}")
     c2.metric("Anomalies", f"{anomalies}")
     c3.metric("Anomaly Rate", f"{rate:.2%}")
-    c4.metric("Max Consecutive", f"{longest_run}")
+    c4.metric("Max Consecutive", f"{max_run}")
 
     # 6) Time‑series chart
     st.subheader("Your Data: Energy & Anomalies")